@@ -0,0 +1,5 @@
+# Benchmarks for the movies_parser project.
+#
+# Run from the project directory (next to scrapy.cfg), for example:
+#
+#     python -m benchmarks.bench_frontier
@@ -0,0 +1,64 @@
+# Fixed per-domain concurrency vs the adaptive AIMD limiter, against a stub
+# wiki and a stub IMDb that each serve only a limited number of requests at
+# once and answer the rest with 429 + Retry-After. The two stubs run on
+# different host names (127.0.0.1 and localhost), so they get separate
+# downloader slots like ru.wikipedia.org and www.imdb.com.
+#
+#     python -m benchmarks.bench_adaptive [--wiki-capacity 12] [--imdb-capacity 3]
+
+import argparse
+
+from benchmarks import stub_imdb
+from benchmarks.crawl import project_settings, run_crawls
+from benchmarks.stub_throttle import Throttle
+from benchmarks.stub_wiki import StubWikiTree, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--films', type=int, default=100, help='films per year')
+    parser.add_argument('--wiki-capacity', type=int, default=12)
+    parser.add_argument('--imdb-capacity', type=int, default=3)
+    parser.add_argument('--retry-after', type=int, default=1, help='seconds')
+    args = parser.parse_args()
+
+    modes = [
+        ('fixed x16', {'ADAPTIVE_CONCURRENCY_ENABLED': False, 'CONCURRENT_REQUESTS_PER_DOMAIN': 16}),
+        ('adaptive', {'ADAPTIVE_CONCURRENCY_ENABLED': True}),
+    ]
+    throttles = []
+    jobs = []
+    servers = []
+    for _ in modes:
+        wiki_throttle = Throttle(args.wiki_capacity, args.retry_after)
+        imdb_throttle = Throttle(args.imdb_capacity, args.retry_after)
+        throttles.append((wiki_throttle, imdb_throttle))
+        tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films,
+                            page_size=200, latency=0.05, throttle=wiki_throttle)
+        wiki, root_url = serve(tree)
+        imdb, imdb_url = stub_imdb.serve(stub_imdb.StubImdb(latency=0.1, throttle=imdb_throttle))
+        servers += [wiki, imdb]
+        jobs.append({'BENCH_HOST_MAP': {'https://www.imdb.com': imdb_url.replace('127.0.0.1', 'localhost')},
+                     'start_url': root_url})
+
+    try:
+        results = run_crawls([
+            (project_settings(IMDB_ENRICHMENT='chain', BENCH_HOST_MAP=job.pop('BENCH_HOST_MAP'), **overrides), job)
+            for job, (_, overrides) in zip(jobs, modes)
+        ])
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    for (label, _), (wiki_throttle, imdb_throttle), stats in zip(modes, throttles, results):
+        elapsed = stats.get('elapsed_time_seconds', 0.0)
+        items = stats.get('item_scraped_count', 0)
+        print('%-10s %5d items in %6.2fs  %6.1f items/sec  429s: wiki %4d imdb %4d  windows: %s' % (
+            label, items, elapsed, items / elapsed if elapsed else 0.0,
+            wiki_throttle.rejected, imdb_throttle.rejected,
+            {key.split('/')[-1]: value for key, value in stats.items() if key.startswith('adaptive/concurrency/')}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# HTML category scraping (movies) vs MediaWiki API ingestion (movies_api) on
+# the same stub tree: requests, bytes and time per crawl, and a check that
+# both produce the same items.
+#
+#     python -m benchmarks.bench_api [--years 10] [--films 600] [--latency 0.02]
+
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks import stub_api
+from benchmarks.crawl import LocalMoviesApiSpider, LocalMoviesSpider, project_settings, run_crawls
+from benchmarks.stub_wiki import StubWikiTree, serve
+
+
+def read_items(path):
+    with open(path, encoding='utf-8') as f:
+        return sorted(f.read().splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--films', type=int, default=600, help='films per year')
+    parser.add_argument('--latency', type=float, default=0.02, help='stub response delay, seconds')
+    args = parser.parse_args()
+
+    # page_size=200 — как у настоящих страниц категорий
+    tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films,
+                        page_size=200, latency=args.latency)
+    wiki, root_url = serve(tree)
+    api, api_url = stub_api.serve(tree)
+
+    out = tempfile.mkdtemp()
+    fields = ['title', 'genre', 'director', 'country', 'year', 'imdb', 'imdb_id', 'page_id']
+    modes = [
+        ('html', LocalMoviesSpider, {'start_url': root_url}),
+        ('api', LocalMoviesApiSpider, {'api_url': api_url}),
+    ]
+    jobs = []
+    for mode, spidercls, kwargs in modes:
+        settings = project_settings(
+            IMDB_ENRICHMENT='off',
+            ITEM_PIPELINES={'movies_parser.pipelines.MoviesParserPipeline': 300},
+            OUTPUT_FORMAT='jsonl', OUTPUT_FIELDS=fields,
+            OUTPUT_PATH=os.path.join(out, mode + '.jsonl'),
+        )
+        jobs.append((settings, kwargs, spidercls))
+    try:
+        results = run_crawls(jobs)
+    finally:
+        wiki.shutdown()
+        api.shutdown()
+
+    for (mode, _, _), stats in zip(modes, results):
+        elapsed = stats.get('elapsed_time_seconds', 0.0)
+        items = stats.get('item_scraped_count', 0)
+        print('%-4s %6d items %6d requests %8.1f MB in %6.2fs  %8.1f items/sec' % (
+            mode, items, stats.get('downloader/request_count', 0),
+            stats.get('downloader/response_bytes', 0) / 2 ** 20, elapsed,
+            items / elapsed if elapsed else 0.0))
+
+    html, api_items = (read_items(os.path.join(out, mode + '.jsonl')) for mode, _, _ in modes)
+    if html == api_items:
+        print('items identical (%d)' % len(html))
+    else:
+        diff = set(html) ^ set(api_items)
+        print('items differ: %d rows, e.g. %s' % (len(diff), json.dumps(sorted(diff)[:2], ensure_ascii=False)))
+
+
+if __name__ == '__main__':
+    main()
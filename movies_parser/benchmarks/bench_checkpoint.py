@@ -0,0 +1,125 @@
+# Crawl checkpoints against the local stubs: an uninterrupted crawl, the same
+# crawl with CHECKPOINT_PATH, and a checkpointed crawl that is killed
+# (SIGKILL, no shutdown) after --kill-after seconds and resumed with
+# CHECKPOINT_RESUME. The resumed output has to hold the films of the
+# uninterrupted crawl; the table shows the cost of checkpointing and how
+# many requests the restart repeated compared with starting over.
+#
+#     python -m benchmarks.bench_checkpoint [--years 4] [--films 300] [--latency 0.01]
+#                                           [--kill-after 8] [--interval 2]
+
+import argparse
+import csv
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import stub_imdb
+from benchmarks.stub_wiki import StubWikiTree, serve
+
+FIELDS = ['title', 'genre', 'director', 'country', 'year', 'imdb', 'imdb_id']
+
+
+def crawl_child(config):
+    """Процесс-краулер: один краул, stats в JSON"""
+    from benchmarks.crawl import project_settings, run_crawls
+
+    settings = project_settings(
+        IMDB_ENRICHMENT='chain', BENCH_HOST_MAP={'https://www.imdb.com': config['imdb_url']},
+        ITEM_PIPELINES={'movies_parser.pipelines.DedupPipeline': 200,
+                        'movies_parser.pipelines.MoviesParserPipeline': 300},
+        OUTPUT_PATH=config['output'], OUTPUT_FIELDS=FIELDS, OUTPUT_BATCH_SIZE=100, **config['settings'])
+    stats, = run_crawls([(settings, {'start_url': config['start_url']})])
+    print(json.dumps({key: value for key, value in stats.items() if isinstance(value, (int, float))}))
+
+
+def start_child(config):
+    return subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_checkpoint', '--child', json.dumps(config)],
+                            stdout=subprocess.PIPE, text=True)
+
+
+def run_child(config):
+    start = time.monotonic()
+    process = start_child(config)
+    output = process.communicate()[0]
+    if process.returncode:
+        raise RuntimeError('crawl failed')
+    return json.loads(output.strip().splitlines()[-1]), time.monotonic() - start
+
+
+def read_films(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return [tuple(row[field] for field in FIELDS) for row in csv.DictReader(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--films', type=int, default=300, help='films per year')
+    parser.add_argument('--latency', type=float, default=0.01, help='stub response delay, seconds')
+    parser.add_argument('--kill-after', type=float, default=8.0, help='seconds before the crawl is killed')
+    parser.add_argument('--interval', type=float, default=2.0, help='CHECKPOINT_INTERVAL')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return crawl_child(json.loads(args.child))
+
+    workdir = tempfile.mkdtemp(prefix='bench_checkpoint_')
+    log = os.path.join(workdir, 'checkpoint.log')
+    tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films, page_size=200,
+                        latency=args.latency)
+    wiki, root_url = serve(tree)
+    imdb, imdb_url = stub_imdb.serve(stub_imdb.StubImdb(latency=args.latency))
+    base = {'start_url': root_url, 'imdb_url': imdb_url}
+    checkpointed = {'CHECKPOINT_PATH': log, 'CHECKPOINT_INTERVAL': args.interval}
+    print('%d films, IMDB_ENRICHMENT=chain, latency %.3fs, CHECKPOINT_INTERVAL %.1fs' % (
+        tree.total_films, args.latency, args.interval))
+    print('%-26s %7s %10s %9s %11s' % ('run', 'films', 'requests', 'time', 'films/sec'))
+    try:
+        output = os.path.join(workdir, 'plain.csv')
+        stats, elapsed = run_child(dict(base, output=output, settings={}))
+        expected = sorted(read_films(output))
+        requests = stats.get('downloader/request_count', 0)
+        print('%-26s %7d %10d %8.1fs %11.1f' % ('uninterrupted', len(expected), requests, elapsed,
+                                                len(expected) / elapsed))
+
+        output = os.path.join(workdir, 'checkpointed.csv')
+        stats, elapsed = run_child(dict(base, output=output, settings=checkpointed))
+        films = read_films(output)
+        assert sorted(films) == expected
+        print('%-26s %7d %10d %8.1fs %11.1f  (%d commits, %.1f KB logged)' % (
+            'with checkpoints', len(films), stats.get('downloader/request_count', 0), elapsed,
+            len(films) / elapsed, stats.get('checkpoint/syncs', 0), stats.get('checkpoint/bytes', 0) / 1024))
+
+        output = os.path.join(workdir, 'resumed.csv')
+        start = time.monotonic()
+        process = start_child(dict(base, output=output, settings=checkpointed))
+        time.sleep(args.kill_after)
+        process.send_signal(signal.SIGKILL)
+        process.wait()
+        killed_at = time.monotonic() - start
+        log_size = os.path.getsize(log)
+        killed_films = len(read_films(output)) if os.path.exists(output) else 0
+        stats, elapsed = run_child(dict(base, output=output, settings=dict(checkpointed, CHECKPOINT_RESUME=True)))
+        films = read_films(output)
+        repeated = len(films) - len(set(films))
+        assert sorted(set(films)) == expected, 'resumed output is missing films'
+        print('%-26s %7d %10s %8.1fs %11s  (%d films on disk, log %.1f KB)' % (
+            'killed', killed_films, '-', killed_at, '-', killed_films, log_size / 1024))
+        print('%-26s %7d %10d %8.1fs %11s  (%d pages, %d IMDb lookups restored)' % (
+            'resumed', len(films), stats.get('downloader/request_count', 0), elapsed, '-',
+            stats.get('checkpoint/restored_pages', 0), stats.get('checkpoint/restored_rows', 0)))
+        print('resumed output: %d films, %d written twice; the restart requested %d pages '
+              '(a fresh crawl needs %d)' % (len(set(films)), repeated,
+                                            stats.get('downloader/request_count', 0), requests))
+    finally:
+        wiki.shutdown()
+        imdb.shutdown()
+
+
+if __name__ == '__main__':
+    main()
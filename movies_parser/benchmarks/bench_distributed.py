@@ -0,0 +1,123 @@
+# Distributed crawl against the local stubs: the same tree crawled by one
+# ordinary process and by 1, 2 and 4 workers sharing a SqliteSharedFrontier.
+# Every worker runs in its own process and writes its own output shard; the
+# shards are merged and checked to hold exactly the films of the ordinary
+# crawl. The table shows wall time, films/sec and how the pages were split
+# between the workers.
+#
+# With --latency the stubs answer every request after that many seconds and
+# --concurrency caps each process's requests per domain, as politeness
+# limits do on a real site; that is the case several nodes are for. The stub
+# servers run in this process, so on a machine with few cores the workers
+# and the stubs compete for the same CPU.
+#
+#     python -m benchmarks.bench_distributed [--years 4] [--films 300] [--workers 1,2,4]
+#                                            [--latency 0.02] [--concurrency 8]
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import stub_imdb
+from benchmarks.stub_wiki import StubWikiTree, serve
+from movies_parser.distributed import SqliteSharedFrontier, merge_shards, shard_files
+
+FIELDS = ['title', 'genre', 'director', 'country', 'year', 'imdb', 'imdb_id']
+
+
+def crawl_child(config):
+    """Процесс-воркер: один краул, stats в JSON"""
+    from benchmarks.crawl import project_settings, run_crawls
+
+    settings = project_settings(
+        IMDB_ENRICHMENT='chain', BENCH_HOST_MAP={'https://www.imdb.com': config['imdb_url']},
+        ITEM_PIPELINES={'movies_parser.pipelines.DedupPipeline': 200,
+                        'movies_parser.pipelines.MoviesParserPipeline': 300},
+        OUTPUT_PATH=config['output'], OUTPUT_FIELDS=FIELDS,
+        CONCURRENT_REQUESTS_PER_DOMAIN=config['concurrency'], ADAPTIVE_MAX_CONCURRENCY=config['concurrency'],
+        **config['settings'])
+    stats, = run_crawls([(settings, {'start_url': config['start_url']})])
+    print(json.dumps({key: value for key, value in stats.items() if isinstance(value, (int, float))}))
+
+
+def run_workers(names, config):
+    """Запустить воркеров параллельно, вернуть (stats по воркерам, время)"""
+    start = time.monotonic()
+    processes = []
+    for name in names:
+        child = dict(config, settings=dict(config['settings']))
+        if name is not None:
+            child['settings'].update(DISTRIBUTED_ENABLED=True, DISTRIBUTED_WORKER=name)
+        processes.append(subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.bench_distributed', '--child', json.dumps(child)],
+            stdout=subprocess.PIPE, text=True))
+    outputs = [process.communicate()[0] for process in processes]
+    elapsed = time.monotonic() - start
+    if any(process.returncode for process in processes):
+        raise RuntimeError('a worker failed')
+    return [json.loads(output.strip().splitlines()[-1]) for output in outputs], elapsed
+
+
+def read_films(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return sorted(tuple(row[field] for field in FIELDS) for row in csv.DictReader(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--films', type=int, default=300, help='films per year')
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--latency', type=float, default=0.0, help='stub response delay, seconds')
+    parser.add_argument('--concurrency', type=int, default=32, help='requests per domain in each process')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return crawl_child(json.loads(args.child))
+
+    workdir = tempfile.mkdtemp(prefix='bench_distributed_')
+    shared_path = os.path.join(workdir, 'shared.db')
+    tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films, page_size=200)
+    tree.latency = args.latency
+    wiki, root_url = serve(tree)
+    imdb, imdb_url = stub_imdb.serve(stub_imdb.StubImdb())
+    config = {'start_url': root_url, 'imdb_url': imdb_url, 'concurrency': args.concurrency,
+              'settings': {'DISTRIBUTED_PATH': shared_path}}
+    print('%d films, IMDB_ENRICHMENT=chain, latency %.3fs, %d requests per domain per process' % (
+        tree.total_films, args.latency, args.concurrency))
+    print('%-10s %7s %9s %11s %9s  %s' % ('mode', 'films', 'time', 'films/sec', 'speedup', 'pages per worker'))
+    try:
+        output = os.path.join(workdir, 'single.csv')
+        stats, elapsed = run_workers([None], dict(config, output=output))
+        expected = read_films(output)
+        baseline = len(expected) / elapsed
+        print('%-10s %7d %8.1fs %11.1f %8.2fx  %d' % (
+            'single', len(expected), elapsed, baseline, 1.0, stats[0].get('response_received_count', 0)))
+
+        for workers in (int(n) for n in args.workers.split(',')):
+            backend = SqliteSharedFrontier(shared_path)
+            backend.reset()
+            backend.close()
+            names = ['w%d' % n for n in range(workers)]
+            output = os.path.join(workdir, 'distributed%d.csv' % workers)
+            stats, elapsed = run_workers(names, dict(config, output=output))
+            rows, duplicates = merge_shards(shard_files(output, names), output, 'csv', FIELDS)
+            films = read_films(output)
+            assert films == expected, 'merged output differs from the single-process crawl'
+            pages = [worker.get('distributed/claimed', 0) for worker in stats]
+            print('%-10s %7d %8.1fs %11.1f %8.2fx  %s (skew %.2f, %d duplicates merged)' % (
+                '%d worker%s' % (workers, 's' if workers > 1 else ''), rows, elapsed, rows / elapsed,
+                rows / elapsed / baseline, '/'.join(map(str, pages)),
+                max(pages) / (sum(pages) / len(pages)) if sum(pages) else 0.0, duplicates))
+    finally:
+        wiki.shutdown()
+        imdb.shutdown()
+
+
+if __name__ == '__main__':
+    main()
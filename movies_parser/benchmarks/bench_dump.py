@@ -0,0 +1,66 @@
+# Offline ingestion from a synthetic ruwiki multistream dump (stub_dump) with
+# 1, 2, 4, ... worker processes: pages/sec, compressed MB/s and the speedup
+# over one worker. Every run must produce the same films, one per film
+# article of the stub tree. The job is CPU-bound (bz2 + XML + wikitext), so
+# the speedup is bounded by the number of cores.
+#
+#     python -m benchmarks.bench_dump [--years 10] [--films 200] [--noise 20] [--workers 1,2,4]
+
+import argparse
+import csv
+import os
+import tempfile
+
+from benchmarks.crawl import project_settings
+from benchmarks.stub_dump import write_dump
+from benchmarks.stub_wiki import StubWikiTree
+from movies_parser.dump import ingest
+
+FIELDS = ['title', 'genre', 'director', 'country', 'year', 'imdb', 'imdb_id', 'page_id']
+
+
+def read_films(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return sorted(tuple(row[field] for field in FIELDS) for row in csv.DictReader(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--films', type=int, default=200, help='films per year')
+    parser.add_argument('--noise', type=int, default=20, help='non-film pages per film article')
+    parser.add_argument('--text-kb', type=float, default=2.0, help='text of a non-film article, KB')
+    parser.add_argument('--workers', default='1,2,4')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_dump_')
+    tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films)
+    dump = os.path.join(workdir, 'ruwiki-stub-pages-articles-multistream.xml.bz2')
+    _, pages, streams = write_dump(tree, dump, args.noise, int(args.text_kb * 1024))
+    print('cores: %d; dump %.1f MB, %d pages in %d streams, %d films' % (
+        os.cpu_count(), os.path.getsize(dump) / 2 ** 20, pages, streams, tree.total_films))
+    print('%-10s %7s %9s %11s %9s %9s' % ('workers', 'films', 'time', 'pages/sec', 'MB/s', 'speedup'))
+
+    expected = None
+    baseline = None
+    for workers in (int(n) for n in args.workers.split(',')):
+        output = os.path.join(workdir, 'films%d.csv' % workers)
+        settings = project_settings(
+            ITEM_PIPELINES={'movies_parser.pipelines.DedupPipeline': 200,
+                            'movies_parser.pipelines.MoviesParserPipeline': 300},
+            OUTPUT_PATH=output, OUTPUT_FIELDS=FIELDS)
+        stats = ingest(dump, settings, workers=workers)
+        films = read_films(output)
+        assert len(films) == tree.total_films, 'expected %d films, got %d' % (tree.total_films, len(films))
+        if expected is None:
+            expected = films
+        assert films == expected, 'output differs between worker counts'
+        elapsed = stats['elapsed_time_seconds']
+        rate = stats['dump/pages'] / elapsed
+        baseline = baseline or rate
+        print('%-10d %7d %8.2fs %11.1f %9.1f %8.2fx' % (
+            workers, len(films), elapsed, rate, stats['dump/bytes'] / elapsed / 2 ** 20, rate / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# End-to-end items/sec with IMDb ratings chained per film (IMDB_ENRICHMENT =
+# "chain") vs Wikipedia items emitted right away and rated from the ratings
+# dataset ("dataset"), against the local stub wiki and stub IMDb servers.
+#
+#     python -m benchmarks.bench_enrichment [--imdb-latency 0.2] [--imdb-kb 500]
+
+import argparse
+import gzip
+import os
+import tempfile
+
+from benchmarks import stub_imdb
+from benchmarks.crawl import project_settings, run_crawls
+from benchmarks.stub_wiki import StubWikiTree, film_imdb_id, serve
+
+
+def write_ratings(path, tree):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write('tconst\taverageRating\tnumVotes\n')
+        for year in tree.years:
+            for n in range(tree.films_per_year):
+                tt = film_imdb_id(year, n)
+                f.write('%s\t%.1f\t1000\n' % (tt, stub_imdb.rating(tt)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--films', type=int, default=100, help='films per year')
+    parser.add_argument('--imdb-latency', type=float, default=0.2, help='stub IMDb delay, seconds')
+    parser.add_argument('--imdb-kb', type=int, default=500, help='stub IMDb page size, KB')
+    args = parser.parse_args()
+
+    tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films,
+                        page_size=200, latency=0.02)
+    wiki, root_url = serve(tree)
+    imdb, imdb_url = stub_imdb.serve(stub_imdb.StubImdb(args.imdb_latency, args.imdb_kb * 1024))
+
+    ratings_path = os.path.join(tempfile.mkdtemp(), 'title.ratings.tsv.gz')
+    write_ratings(ratings_path, tree)
+
+    common = {
+        'BENCH_HOST_MAP': {'https://www.imdb.com': imdb_url},
+        'ITEM_PIPELINES': {'movies_parser.pipelines.ImdbRatingsPipeline': 200},
+        'IMDB_RATINGS_PATH': ratings_path,
+    }
+    modes = ['chain', 'dataset']
+    jobs = [(project_settings(IMDB_ENRICHMENT=mode, **common), {'start_url': root_url}) for mode in modes]
+    try:
+        results = run_crawls(jobs)
+    finally:
+        wiki.shutdown()
+        imdb.shutdown()
+
+    for mode, stats in zip(modes, results):
+        elapsed = stats.get('elapsed_time_seconds', 0.0)
+        items = stats.get('item_scraped_count', 0)
+        print('%-8s %6d items %6d requests %8.1f MB in %6.2fs  %8.1f items/sec' % (
+            mode, items, stats.get('downloader/request_count', 0),
+            stats.get('downloader/response_bytes', 0) / 2 ** 20, elapsed,
+            items / elapsed if elapsed else 0.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Pages/sec of the category crawl against a local stub of the Wikipedia
+# category tree, comparing:
+#
+#   baseline spider  - the traversal of the original MoviesSpider (commit
+#                      04b7405, BaselineSpider below): class-level visited
+#                      set and queue, the root fans out, every other page
+#                      requests one page from the queue
+#   single chain     - the current spider with FRONTIER_MAX_IN_FLIGHT = 1
+#   fan-out frontier - the current spider with the default frontier
+#
+# IMDb enrichment is off, so only Wikipedia pages are crawled. The baseline
+# spider's film parsing is left out (it always chained an IMDb request), so
+# it does less work per film page than the current spider and its number is
+# an upper bound for the old code.
+#
+#     python -m benchmarks.bench_frontier [--years 10] [--films 100] [--latency 0.02]
+
+import argparse
+from collections import deque
+
+import scrapy
+
+from benchmarks.crawl import project_settings, run_crawls, pages_per_sec
+from benchmarks.stub_wiki import StubWikiTree, serve
+
+
+class BaselineSpider(scrapy.Spider):
+    """Обход категорий из исходного MoviesSpider как есть: parse/parse_bfs, общая очередь на класс"""
+    name = 'movies_baseline'
+
+    visited = set()
+    queue = deque()
+
+    def start_requests(self):
+        yield scrapy.Request(url=self.start_url, callback=self.parse, headers={'User-Agent': 'Mozilla/5.0'})
+
+    def parse(self, response):
+        links = response.css('.mw-category-group a::attr(href)').getall()
+        for link in links:
+            url = response.urljoin(link)
+            if url not in self.visited:
+                self.queue.append(url)
+                self.visited.add(url)
+
+        while self.queue:
+            next_url = self.queue.popleft()
+            yield scrapy.Request(next_url, callback=self.parse_bfs)
+
+    def parse_bfs(self, response):
+        # Разбор фильма (и запрос на IMDb) не нужен: меряем только обход
+        response.css('.infobox')
+
+        new_links = response.css('.mw-category-group a::attr(href)').getall()
+        for link in new_links:
+            url = response.urljoin(link)
+            if url not in self.visited:
+                self.queue.append(url)
+                self.visited.add(url)
+
+        if self.queue:
+            next_url = self.queue.popleft()
+            yield scrapy.Request(next_url, callback=self.parse_bfs)
+
+        next_page_href = response.css('#mw-pages a').xpath('./text()[.="Следующая страница"]/../@href').extract_first()
+        if next_page_href:
+            yield response.follow(next_page_href, callback=self.parse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--films', type=int, default=100, help='films per year')
+    parser.add_argument('--latency', type=float, default=0.02, help='stub response delay, seconds')
+    args = parser.parse_args()
+
+    tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films,
+                        page_size=50, latency=args.latency)
+    server, root_url = serve(tree)
+
+    modes = [('baseline spider', None, BaselineSpider), ('single chain', 1, None), ('fan-out frontier', None, None)]
+    jobs = []
+    for _, in_flight, spidercls in modes:
+        overrides = {'IMDB_ENRICHMENT': 'off'}
+        if in_flight is not None:
+            overrides['FRONTIER_MAX_IN_FLIGHT'] = in_flight
+        job = (project_settings(**overrides), {'start_url': root_url})
+        jobs.append(job + (spidercls,) if spidercls else job)
+
+    try:
+        results = run_crawls(jobs)
+    finally:
+        server.shutdown()
+
+    for (label, _, _), stats in zip(modes, results):
+        print('%-18s %6d pages in %6.2fs  %8.1f pages/sec' % (
+            label, stats.get('response_received_count', 0),
+            stats.get('elapsed_time_seconds', 0.0), pages_per_sec(stats)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Per-page infobox extraction time over the saved article fixtures:
+# the old per-row CSS selector loop from parse_movie vs InfoboxExtractor.
+# Both variants work on an already parsed page, and their outputs are
+# checked to be identical before timing.
+#
+#     python -m benchmarks.bench_infobox [--repeat 300]
+
+import argparse
+import os
+import re
+import timeit
+
+from scrapy.http import HtmlResponse
+
+from movies_parser.infobox import InfoboxExtractor
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'articles')
+
+
+def load_fixtures(directory=FIXTURES):
+    responses = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.html'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                url = 'https://ru.wikipedia.org/wiki/' + name[:-len('.html')]
+                responses.append(HtmlResponse(url=url, body=f.read(), encoding='utf-8'))
+    return responses
+
+
+def legacy_extract(response):
+    """Разбор инфобокса, как он был в parse_movie до InfoboxExtractor"""
+    infobox = response.css('table.infobox')
+    if not infobox:
+        return None
+    title_parts = response.css('h1#firstHeading ::text').getall()
+    title = ''.join(title_parts).strip() if title_parts else None
+    director, genre, country, year = [], [], [], []
+    for row in infobox[0].css('tr'):
+        header = row.css('th::text').extract_first()
+        header_genre = row.css('th a::text').extract_first()
+        if not header_genre:
+            header_genre = row.css('th::text').extract_first()
+        if header and 'Режиссёр' in header:
+            director.extend(c.strip() for c in row.css('td *::text').getall() if c.strip())
+        if header_genre and 'Жанр' in header_genre:
+            genre_list = [g.strip() for g in row.css('td a::text').getall() if g.strip()]
+            if not genre_list:
+                genre_list = [g.strip() for g in row.css('td *::text').getall() if g.strip()]
+            genre.extend(genre_list)
+        if header and ('Страна' in header or 'Страны' in header):
+            country.extend(c.strip() for c in row.css('td *::text').getall() if c.strip())
+        if header and ('Год' in header or 'Дата Выхода' in header or 'Дата выхода' in header or 'Премьера' in header):
+            year.extend(c.strip() for c in row.css('td *::text').getall() if c.strip())
+    has_imdb = bool(response.css('th a[title="Internet Movie Database"]'))
+    imdb_link = None
+    if has_imdb:
+        imdb_link = response.css('td a::attr(href)').re_first(r'https://www.imdb.com/title/tt\d+/')
+    return {'title': title, 'director': director, 'genre': genre, 'country': country,
+            'year': year, 'has_imdb': has_imdb, 'imdb_link': imdb_link}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    extractor = InfoboxExtractor()
+    responses = load_fixtures()
+    for response in responses:
+        response.selector  # дерево строим заранее, меряем только разбор инфобокса
+        assert extractor.extract(response.selector.root) == legacy_extract(response), response.url
+
+    print('%-28s %12s %12s %8s' % ('fixture', 'selectors', 'single-pass', 'speedup'))
+    for response in responses:
+        old = timeit.timeit(lambda: legacy_extract(response), number=args.repeat) / args.repeat
+        new = timeit.timeit(lambda: extractor.extract(response.selector.root), number=args.repeat) / args.repeat
+        print('%-28s %10.1fus %10.1fus %7.1fx' % (
+            re.sub(r'^.*/', '', response.url), old * 1e6, new * 1e6, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# The IMDb leg of IMDB_ENRICHMENT = "chain" with and without the JSON-LD
+# cutoff (movies_parser.jsonld), against the local stub wiki and a stub IMDb
+# serving large title pages (--imdb-kb), plain and gzip-encoded.
+#
+# First the per-page parse cost on the recorded IMDb fixtures and on a stub
+# page: DOM + XPath + json.loads of the whole block (the old parse_imdb) vs
+# the byte scan. Then one crawl per mode, each in its own process: bytes
+# downloaded, wall time and process CPU time; all modes must write the same
+# films with the same ratings.
+#
+#     python -m benchmarks.bench_jsonld [--years 4] [--films 100] [--imdb-kb 500] [--imdb-latency 0.0]
+
+import argparse
+import csv
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from scrapy.http import HtmlResponse
+
+from benchmarks import stub_imdb
+from benchmarks.stub_wiki import StubWikiTree, serve
+from movies_parser.jsonld import jsonld_block, rating
+
+FIELDS = ['title', 'genre', 'director', 'country', 'year', 'imdb', 'imdb_id']
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'imdb')
+
+
+def dom_rating(body):
+    """Как parse_imdb до JsonLdCutoff: DOM, XPath и json.loads всего блока"""
+    response = HtmlResponse('https://www.imdb.com/title/tt0000001/', body=body, encoding='utf-8')
+    script = response.xpath('//script[@type="application/ld+json"]/text()').get()
+    return json.loads(script).get('aggregateRating', {}).get('ratingValue')
+
+
+def scan_rating(body):
+    return rating(jsonld_block(body))
+
+
+def time_parse(parse, body, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        parse(body)
+    return (time.process_time() - start) / rounds
+
+
+def parse_table(imdb_kb, rounds):
+    pages = [(os.path.basename(path), open(path, 'rb').read()) for path in sorted(glob.glob(FIXTURES + '/*.html'))]
+    pages.append(('stub %d KB' % imdb_kb, stub_imdb.render_title(
+        'tt1990001', '<div>' + 'x' * imdb_kb * 1024 + '</div>').encode('utf-8')))
+    print('%-20s %9s %12s %12s %9s' % ('page', 'size', 'DOM+json', 'byte scan', 'speedup'))
+    for name, body in pages:
+        assert dom_rating(body) == scan_rating(body)
+        dom = time_parse(dom_rating, body, rounds)
+        scan = time_parse(scan_rating, body, rounds * 10)
+        print('%-20s %7.0fKB %10.1fus %10.1fus %8.0fx' % (name, len(body) / 1024, dom * 1e6, scan * 1e6, dom / scan))
+
+
+def crawl_child(config):
+    """Процесс-краулер: один краул, stats и CPU процесса в JSON"""
+    from benchmarks.crawl import project_settings, run_crawls
+
+    settings = project_settings(
+        IMDB_ENRICHMENT='chain', BENCH_HOST_MAP={'https://www.imdb.com': config['imdb_url']},
+        ITEM_PIPELINES={'movies_parser.pipelines.MoviesParserPipeline': 300},
+        OUTPUT_PATH=config['output'], OUTPUT_FIELDS=FIELDS, **config['settings'])
+    stats, = run_crawls([(settings, {'start_url': config['start_url']})])
+    stats = {key: value for key, value in stats.items() if isinstance(value, (int, float))}
+    stats['cpu_seconds'] = time.process_time()
+    print(json.dumps(stats))
+
+
+def run_child(config):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_jsonld', '--child', json.dumps(config)],
+                            stdout=subprocess.PIPE, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def read_films(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return sorted(tuple(row[field] for field in FIELDS) for row in csv.DictReader(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--films', type=int, default=100, help='films per year')
+    parser.add_argument('--imdb-kb', type=int, default=500, help='stub IMDb page size, KB')
+    parser.add_argument('--imdb-latency', type=float, default=0.0, help='stub IMDb delay, seconds')
+    parser.add_argument('--min-kb', type=int, default=64, help='IMDB_CUTOFF_MIN_BYTES, KB')
+    parser.add_argument('--rounds', type=int, default=50, help='rounds of the parse benchmark')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return crawl_child(json.loads(args.child))
+
+    parse_table(args.imdb_kb, args.rounds)
+    print()
+
+    workdir = tempfile.mkdtemp(prefix='bench_jsonld_')
+    tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films, page_size=200)
+    wiki, root_url = serve(tree)
+    servers = [wiki]
+    print('%d films, IMDb pages %d KB, IMDb latency %.3fs' % (tree.total_films, args.imdb_kb, args.imdb_latency))
+    print('%-18s %7s %11s %9s %9s %9s %9s' % ('mode', 'films', 'downloaded', 'time', 'CPU', 'stopped',
+                                              'finished'))
+    expected = None
+    try:
+        for encoding in ('plain', 'gzip'):
+            imdb, imdb_url = stub_imdb.serve(stub_imdb.StubImdb(
+                args.imdb_latency, args.imdb_kb * 1024, gzip=encoding == 'gzip'))
+            servers.append(imdb)
+            for cutoff in (False, True):
+                output = os.path.join(workdir, '%s-%s.csv' % (encoding, cutoff))
+                stats = run_child({'start_url': root_url, 'imdb_url': imdb_url, 'output': output,
+                                   'settings': {'IMDB_CUTOFF_ENABLED': cutoff,
+                                                'IMDB_CUTOFF_MIN_BYTES': args.min_kb * 1024}})
+                films = read_films(output)
+                expected = expected or films
+                assert films == expected, 'films differ between modes'
+                assert all(film[FIELDS.index('imdb')] for film in films), 'missing ratings'
+                print('%-18s %7d %9.1fMB %8.1fs %8.1fs %9d %9d' % (
+                    '%s, %s' % (encoding, 'cutoff' if cutoff else 'full page'), len(films),
+                    stats.get('downloader/response_bytes', 0) / 2 ** 20, stats.get('elapsed_time_seconds', 0.0),
+                    stats['cpu_seconds'], stats.get('imdb_cutoff/stopped', 0),
+                    stats.get('imdb_cutoff/finished', 0)))
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
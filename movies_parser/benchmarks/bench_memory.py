@@ -0,0 +1,99 @@
+# Peak RSS of a large crawl against the local stubs, with the frontier in
+# memory, on disk (FRONTIER_STORE = "disk") and on disk with
+# MEMORY_TARGET_MB. Every crawl runs in its own process, so its peak RSS is
+# its own; the stub servers run in this one. A second table shows how much
+# memory the frontier itself (queue + visited keys) takes for --urls URLs.
+#
+#     python -m benchmarks.bench_memory [--years 5] [--films 1000] [--target-mb 120] [--urls 1000000]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import stub_imdb
+from benchmarks.stub_wiki import StubWikiTree, serve
+
+
+def crawl_child(config):
+    """Процесс-краулер: прогнать один краул, напечатать stats в JSON"""
+    from benchmarks.crawl import project_settings, run_crawls
+
+    settings = project_settings(IMDB_ENRICHMENT='chain', BENCH_HOST_MAP={'https://www.imdb.com': config['imdb_url']},
+                                **config['settings'])
+    stats, = run_crawls([(settings, {'start_url': config['start_url']})])
+    print(json.dumps({key: value for key, value in stats.items() if isinstance(value, (int, float))}))
+
+
+def frontier_child(config):
+    """Процесс для замера самого фронтира: N URL в очередь и в visited"""
+    from movies_parser.frontier import Frontier, current_rss, peak_rss
+    from movies_parser.seen import page_key
+
+    before = current_rss()
+    frontier = Frontier(config['path'])
+    start = time.monotonic()
+    for n in range(config['urls']):
+        url = 'https://ru.wikipedia.org/wiki/%D0%A4%D0%B8%D0%BB%D1%8C%D0%BC_' + str(n)
+        frontier.visited.add(page_key(url))
+        frontier.queue.append(url)
+    elapsed = time.monotonic() - start
+    print(json.dumps({'rss_growth': current_rss() - before, 'peak_rss': peak_rss(), 'elapsed': elapsed}))
+    frontier.close()
+
+
+def run_child(kind, config):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_memory', '--child', kind, json.dumps(config)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--films', type=int, default=1000, help='films per year')
+    parser.add_argument('--target-mb', type=int, default=120, help='MEMORY_TARGET_MB of the third mode')
+    parser.add_argument('--urls', type=int, default=1000000, help='URLs for the frontier-only table (0 skips it)')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        kind, config = args.child
+        return (crawl_child if kind == 'crawl' else frontier_child)(json.loads(config))
+
+    workdir = tempfile.mkdtemp(prefix='bench_memory_')
+    path = os.path.join(workdir, 'frontier.db')
+    modes = [
+        ('memory', {}),
+        ('disk', {'FRONTIER_STORE': 'disk', 'FRONTIER_STORE_PATH': path}),
+        ('disk+target', {'FRONTIER_STORE': 'disk', 'FRONTIER_STORE_PATH': path,
+                         'MEMORY_TARGET_MB': args.target_mb}),
+    ]
+    tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films, page_size=200)
+    wiki, root_url = serve(tree)
+    imdb, imdb_url = stub_imdb.serve(stub_imdb.StubImdb())
+    print('%d films, IMDB_ENRICHMENT=chain' % tree.total_films)
+    print('%-12s %8s %10s %12s %14s' % ('frontier', 'items', 'time', 'items/sec', 'peak RSS'))
+    try:
+        for label, settings in modes:
+            stats = run_child('crawl', {'start_url': root_url, 'imdb_url': imdb_url, 'settings': settings})
+            elapsed = stats.get('elapsed_time_seconds', 0.0)
+            items = stats.get('item_scraped_count', 0)
+            print('%-12s %8d %9.1fs %12.1f %11d MB' % (
+                label, items, elapsed, items / elapsed if elapsed else 0.0, stats.get('memory/peak_rss_mb', 0)))
+    finally:
+        wiki.shutdown()
+        imdb.shutdown()
+
+    if args.urls:
+        print()
+        print('%-12s %10s %14s %10s' % ('frontier', 'urls', 'RSS growth', 'time'))
+        for label, store_path in (('memory', None), ('disk', path)):
+            result = run_child('frontier', {'urls': args.urls, 'path': store_path})
+            print('%-12s %10d %11.1f MB %9.1fs' % (label, args.urls, result['rss_growth'] / 2 ** 20, result['elapsed']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Crawl throughput with parsing on the reactor thread vs in process pools of
+# each --workers size, against the local stub wiki serving large article
+# pages; every pool run reports its speedup over the reactor thread and must
+# scrape the same number of items. The speedup depends on the number of
+# cores; on a single core the pool only adds IPC, which is why
+# PARSE_POOL_SIZE is 0 by default. IMDb enrichment is off, so only Wikipedia
+# pages are crawled.
+#
+#     python -m benchmarks.bench_offload [--workers 2,4] [--page-kb 300]
+
+import argparse
+import os
+
+from benchmarks.crawl import project_settings, run_crawls, pages_per_sec
+from benchmarks.stub_wiki import StubWikiTree, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--films', type=int, default=100, help='films per year')
+    parser.add_argument('--page-kb', type=int, default=300, help='filler per article page, KB')
+    parser.add_argument('--workers', default='2,4', help='pool sizes to compare, comma-separated')
+    args = parser.parse_args()
+
+    tree = StubWikiTree(years=range(1990, 1990 + args.years), films_per_year=args.films,
+                        page_size=200, filler_bytes=args.page_kb * 1024)
+    server, root_url = serve(tree)
+
+    sizes = [int(n) for n in args.workers.split(',')]
+    modes = [('reactor thread', 0)] + [('process pool x%d' % size, size) for size in sizes]
+    jobs = [(project_settings(PARSE_POOL_SIZE=size, IMDB_ENRICHMENT='off'), {'start_url': root_url}) for _, size in modes]
+    try:
+        results = run_crawls(jobs)
+    finally:
+        server.shutdown()
+
+    print('cores: %d' % os.cpu_count())
+    base = pages_per_sec(results[0])
+    for (label, _), stats in zip(modes, results):
+        assert stats.get('item_scraped_count') == results[0].get('item_scraped_count'), label
+        print('%-20s %6d pages %6d items in %6.2fs  %8.1f pages/sec  %5.2fx' % (
+            label, stats.get('response_received_count', 0), stats.get('item_scraped_count', 0),
+            stats.get('elapsed_time_seconds', 0.0), pages_per_sec(stats), pages_per_sec(stats) / base))
+
+
+if __name__ == '__main__':
+    main()
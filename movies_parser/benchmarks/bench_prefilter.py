@@ -0,0 +1,101 @@
+# parse_bfs CPU time with and without the byte-level prefilter, over a mix of
+# the recorded pages: film articles, the category listing, and non-film
+# articles (the film articles with their infobox removed, so the size and
+# markup of the page stay realistic). The items and requests of both modes
+# are checked to be identical before timing.
+#
+#     python -m benchmarks.bench_prefilter [--non-film 0.3] [--pages 600]
+
+import argparse
+import time
+
+from lxml import html as lxml_html
+from scrapy.http import HtmlResponse, Request
+
+from benchmarks.fixture_server import FixtureSite
+from benchmarks.suite import make_spider
+from movies_parser.seen import page_key
+
+WIKI_URL = 'https://ru.wikipedia.org/wiki/'
+
+
+def strip_infobox(body):
+    """Та же статья без карточки фильма"""
+    tree = lxml_html.fromstring(body)
+    for table in tree.xpath('//table[contains(@class, "infobox")]'):
+        table.getparent().remove(table)
+    return lxml_html.tostring(tree, encoding='utf-8', doctype='<!DOCTYPE html>')
+
+
+def make_pages(site, non_film, total):
+    """[(тип, url, тело, category)] в пропорции: non_film — доля статей без инфобокса"""
+    kinds = {
+        'film': [(body, False) for body in site.articles],
+        'non-film': [(strip_infobox(body), False) for body in site.articles],
+        'category': [(site.render_category(0), True)],
+    }
+    # На страницу категории приходится ~200 статей, как в реальном дереве
+    categories = max(1, total // 200)
+    non_films = int((total - categories) * non_film)
+    counts = {'category': categories, 'non-film': non_films, 'film': total - categories - non_films}
+    pages = []
+    for kind, count in counts.items():
+        for n in range(count):
+            body, category = kinds[kind][n % len(kinds[kind])]
+            pages.append((kind, WIKI_URL + '%s_%d' % (kind, n), body, category))
+    return pages
+
+
+def run(spider, pages):
+    """Прогнать parse_bfs по страницам; вернуть (результаты, CPU по типам страниц)"""
+    outputs = []
+    cpu = {}
+    for kind, url, body, category in pages:
+        spider.visited.clear()
+        spider.queue.clear()
+        spider.in_flight = 1
+        response = HtmlResponse(url=url, body=body, encoding='utf-8',
+                                request=Request(url, meta={'category': category, 'page_key': page_key(url)}))
+        start = time.process_time()
+        results = list(spider.parse_bfs(response))
+        cpu[kind] = cpu.get(kind, 0.0) + time.process_time() - start
+        outputs.append([result.url if isinstance(result, Request) else result for result in results])
+    return outputs, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--non-film', type=float, default=0.3, help='share of non-film articles')
+    parser.add_argument('--pages', type=int, default=600)
+    args = parser.parse_args()
+
+    site = FixtureSite()
+    pages = make_pages(site, args.non_film, args.pages)
+    full = make_spider(IMDB_ENRICHMENT='off', PREFILTER_ENABLED=False)
+    filtered = make_spider(IMDB_ENRICHMENT='off', PREFILTER_ENABLED=True)
+    assert run(full, pages)[0] == run(filtered, pages)[0]
+
+    # Лучший из трёх прогонов для каждого режима
+    cpu_full = min((run(full, pages)[1] for _ in range(3)), key=lambda cpu: sum(cpu.values()))
+    cpu_filtered = min((run(filtered, pages)[1] for _ in range(3)), key=lambda cpu: sum(cpu.values()))
+    counts = {kind: sum(1 for page in pages if page[0] == kind) for kind in cpu_full}
+
+    print('%-10s %6s %14s %14s' % ('pages', 'count', 'full parse', 'prefilter'))
+    for kind, count in counts.items():
+        print('%-10s %6d %11.3f ms %11.3f ms' % (
+            kind, count, cpu_full[kind] / count * 1000, cpu_filtered[kind] / count * 1000))
+    total_full, total_filtered = sum(cpu_full.values()), sum(cpu_filtered.values())
+    print('CPU: %.3fs -> %.3fs (%.1f%% saved)' % (total_full, total_filtered,
+                                                 100.0 * (1 - total_filtered / total_full)))
+
+    # То же, что паук пишет в stats в конце краула
+    spider = make_spider(IMDB_ENRICHMENT='off', PREFILTER_ENABLED=True)
+    run(spider, pages)
+    spider.report_prefilter()
+    stats = spider.crawler.stats
+    print('crawl stats: prefilter/rejected_ratio %s, prefilter/cpu_saved_seconds %s (lower bound)' % (
+        stats.get_value('prefilter/rejected_ratio'), stats.get_value('prefilter/cpu_saved_seconds')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Year-sharded crawl (movies_parser.shards) against the local stubs: one
+# ordinary process from the root category, then the year shards run 1, 2, 4
+# at a time, each shard in its own process with its own output partition,
+# and the partitions k-way merged. The merged output has to hold exactly the
+# films of the ordinary crawl; the report shows every shard's time and the
+# skew (slowest / mean shard time).
+#
+# The stub years are --step apart, so decades hold different numbers of
+# years and the shards are unequal, as on the real site. As in
+# bench_distributed, --latency and --concurrency model a politeness-limited
+# site; on a machine with few cores the shards and the stubs share the CPU.
+#
+#     python -m benchmarks.bench_shards [--years 10] [--step 4] [--films 100] [--workers 1,2,4]
+#                                       [--latency 0.05] [--concurrency 4] [--by decade]
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import stub_imdb
+from benchmarks.stub_wiki import StubWikiTree, serve
+from movies_parser.distributed import merge_runs, run_path, shard_path
+from movies_parser.shards import group_years, print_report, run_shards, year_categories
+
+FIELDS = ['title', 'genre', 'director', 'country', 'year', 'imdb', 'imdb_id']
+
+
+def crawl_child(config):
+    """Процесс-шард: один краул, stats в JSON"""
+    from benchmarks.crawl import project_settings, run_crawls
+
+    settings = project_settings(
+        IMDB_ENRICHMENT='chain', BENCH_HOST_MAP={'https://www.imdb.com': config['imdb_url']},
+        ITEM_PIPELINES={'movies_parser.pipelines.DedupPipeline': 200,
+                        'movies_parser.pipelines.MoviesParserPipeline': 300},
+        OUTPUT_PATH=config['output'], OUTPUT_FIELDS=FIELDS,
+        CONCURRENT_REQUESTS_PER_DOMAIN=config['concurrency'], ADAPTIVE_MAX_CONCURRENCY=config['concurrency'],
+        SHARD_START_URLS=config['urls'])
+    stats, = run_crawls([(settings, {'start_url': config['start_url']})])
+    print(json.dumps({key: value for key, value in stats.items() if isinstance(value, (int, float))}))
+
+
+def start_child(config):
+    return subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_shards', '--child', json.dumps(config)],
+                            stdout=subprocess.DEVNULL)
+
+
+def read_films(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return sorted(tuple(row[field] for field in FIELDS) for row in csv.DictReader(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--step', type=int, default=4, help='years between stub year categories')
+    parser.add_argument('--films', type=int, default=100, help='films per year')
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--by', choices=('decade', 'year'), default='decade')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub response delay, seconds')
+    parser.add_argument('--concurrency', type=int, default=4, help='requests per domain in each process')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return crawl_child(json.loads(args.child))
+
+    workdir = tempfile.mkdtemp(prefix='bench_shards_')
+    tree = StubWikiTree(years=range(1950, 1950 + args.years * args.step, args.step), films_per_year=args.films,
+                        page_size=200, latency=args.latency)
+    wiki, root_url = serve(tree)
+    imdb, imdb_url = stub_imdb.serve(stub_imdb.StubImdb(latency=args.latency))
+    base = {'start_url': root_url, 'imdb_url': imdb_url, 'concurrency': args.concurrency}
+    try:
+        shards = group_years(year_categories(root_url), args.by)
+        print('%d films in %d years, %d shards by %s; latency %.3fs, %d requests per domain per process' % (
+            tree.total_films, len(tree.years), len(shards), args.by, args.latency, args.concurrency))
+
+        output = os.path.join(workdir, 'single.csv')
+        start = time.monotonic()
+        process = start_child(dict(base, output=output, urls=[]))
+        process.wait()
+        single = time.monotonic() - start
+        expected = read_films(output)
+        print('single process: %d films in %.1fs (%.1f films/sec)\n' % (len(expected), single, len(expected) / single))
+
+        for workers in (int(n) for n in args.workers.split(',')):
+            output = os.path.join(workdir, 'sharded%d.csv' % workers)
+
+            def start(name, urls):
+                return start_child(dict(base, output=shard_path(output, name), urls=urls))
+
+            started = time.monotonic()
+            report = run_shards(shards, start, output, workers)
+            rows, duplicates = merge_runs([run_path(output, name) for name, _ in shards], output, 'csv', FIELDS)
+            elapsed = time.monotonic() - started
+            assert read_films(output) == expected, 'merged output differs from the single-process crawl'
+            print('%d at a time:' % workers)
+            print_report(report, elapsed, rows, duplicates, output)
+            print('speedup over one process: %.2fx\n' % (single / elapsed))
+    finally:
+        wiki.shutdown()
+        imdb.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Helpers to run MoviesSpider in-process against local stub servers.
+
+from scrapy.settings import Settings
+from scrapy.utils.reactor import install_reactor
+
+from movies_parser.spiders.movies import MoviesSpider
+from movies_parser.spiders.movies_api import MoviesApiSpider
+
+BENCH_SETTINGS = {
+    'ROBOTSTXT_OBEY': False,
+    'LOG_LEVEL': 'WARNING',
+    'TELNETCONSOLE_ENABLED': False,
+    'ITEM_PIPELINES': {},
+    # Стаб-вики ссылается на настоящий www.imdb.com: без BENCH_HOST_MAP рейтинги не запрашиваем
+    'IMDB_ENRICHMENT': 'off',
+    'BENCH_HOST_MAP': {},
+}
+
+
+def project_settings(**overrides):
+    settings = Settings()
+    settings.setmodule('movies_parser.settings', priority='project')
+    settings.update(BENCH_SETTINGS, priority='cmdline')
+    middlewares = settings.getdict('DOWNLOADER_MIDDLEWARES')
+    middlewares['benchmarks.crawl.RewriteHostMiddleware'] = 50
+    settings.set('DOWNLOADER_MIDDLEWARES', middlewares, priority='cmdline')
+    settings.update(overrides, priority='cmdline')
+    return settings
+
+
+class RewriteHostMiddleware:
+    """Перенаправить запросы к реальным хостам (www.imdb.com) на стаб-серверы из BENCH_HOST_MAP"""
+
+    def __init__(self, host_map):
+        self.host_map = host_map
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.getdict('BENCH_HOST_MAP'))
+
+    def process_request(self, request, spider):
+        for prefix, target in self.host_map.items():
+            if request.url.startswith(prefix):
+                return request.replace(url=target + request.url[len(prefix):])
+        return None
+
+
+class LocalMoviesSpider(MoviesSpider):
+    """MoviesSpider без ограничения по доменам, для стаб-серверов на localhost"""
+    name = 'movies_local'
+    allowed_domains = None
+
+
+class LocalMoviesApiSpider(MoviesApiSpider):
+    """MoviesApiSpider без ограничения по доменам"""
+    name = 'movies_api_local'
+    allowed_domains = None
+
+
+def run_crawls(jobs):
+    """Последовательно прогнать краулы [(settings, spider_kwargs[, spider_class])], вернуть их stats"""
+    settings = jobs[0][0]
+    install_reactor(settings['TWISTED_REACTOR'])
+
+    from twisted.internet import defer, reactor
+    from scrapy.crawler import CrawlerRunner
+
+    results = []
+
+    @defer.inlineCallbacks
+    def run():
+        try:
+            for job in jobs:
+                job_settings, kwargs = job[:2]
+                spidercls = job[2] if len(job) > 2 else LocalMoviesSpider
+                runner = CrawlerRunner(job_settings)
+                crawler = runner.create_crawler(spidercls)
+                yield runner.crawl(crawler, **kwargs)
+                results.append(crawler.stats.get_stats())
+        finally:
+            reactor.stop()
+
+    reactor.callWhenRunning(run)
+    reactor.run()
+    return results
+
+
+def pages_per_sec(stats):
+    elapsed = stats.get('elapsed_time_seconds') or 0.0
+    return stats.get('response_received_count', 0) / elapsed if elapsed else 0.0
@@ -0,0 +1,105 @@
+# Local HTTP server over the recorded fixtures (benchmarks/fixtures):
+#   - /wiki/<recorded category> serves the recorded category page category_pages
+#     times over: the film links of page N get a "__pN" suffix, so every page
+#     lists new films, and the "Следующая страница" link points to page N+1
+#   - any other /wiki/<title> serves one of the recorded film articles
+#   - /title/ttNNNNNNN/ serves the recorded IMDb page for that tt-ID
+# Unknown categories and tt-IDs get 404, like missing pages on the real sites.
+
+import os
+import re
+import threading
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+CATEGORY = 'Категория:Фильмы_1979_года'
+# Ссылки на статьи: без двоеточия, т.е. не категории и не служебные страницы
+FILM_HREF_RE = re.compile(r'href="/wiki/([^"?#:]+)"')
+NEXT_RE = re.compile(r'\(<a href="[^"]*"[^>]*>Следующая страница</a>\)')
+PREV_RE = re.compile(r'\(<a href="[^"]*"[^>]*>Предыдущая страница</a>\)')
+TITLE_RE = re.compile(r'^/title/(tt\d+)/$')
+
+
+def load_directory(name):
+    """{имя файла без .html: содержимое} для одной папки фикстур"""
+    directory = os.path.join(FIXTURES, name)
+    result = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.html'):
+            with open(os.path.join(directory, filename), 'rb') as f:
+                result[filename[:-len('.html')]] = f.read()
+    return result
+
+
+class FixtureSite:
+    """Записанные страницы и число страниц категории, которое из них собирается"""
+
+    def __init__(self, category_pages=10):
+        self.category_pages = category_pages
+        self.category = load_directory('categories')['filmy_1979_goda'].decode('utf-8')
+        self.articles = list(load_directory('articles').values())
+        self.imdb = load_directory('imdb')
+
+    @property
+    def films_per_page(self):
+        return len(set(FILM_HREF_RE.findall(self.category)))
+
+    def render_category(self, page):
+        category_path = '/wiki/' + quote(CATEGORY, safe=':')
+        html = FILM_HREF_RE.sub(lambda m: 'href="/wiki/%s__p%d"' % (m.group(1), page), self.category)
+        if page + 1 < self.category_pages:
+            html = NEXT_RE.sub('(<a href="%s?page=%d">Следующая страница</a>)' % (category_path, page + 1), html)
+        else:
+            html = NEXT_RE.sub('', html)
+        if page > 0:
+            html = PREV_RE.sub('(<a href="%s?page=%d">Предыдущая страница</a>)' % (category_path, page - 1), html)
+        else:
+            html = PREV_RE.sub('', html)
+        return html.encode('utf-8')
+
+    def render(self, path, query):
+        match = TITLE_RE.match(path)
+        if match:
+            return self.imdb.get(match.group(1))
+        if not path.startswith('/wiki/'):
+            return None
+        title = unquote(path[len('/wiki/'):])
+        if title == CATEGORY:
+            page = int(parse_qs(query).get('page', ['0'])[0])
+            return self.render_category(page) if page < self.category_pages else None
+        if title.startswith('Категория:'):
+            return None
+        # Статья выбирается по названию, чтобы один URL всегда отдавал одно и то же
+        return self.articles[zlib.crc32(title.encode('utf-8')) % len(self.articles)]
+
+
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            data = site.render(parts.path, parts.query)
+            if data is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(site, host='127.0.0.1', port=0):
+    """Запустить сервер фикстур в фоновом потоке, вернуть (server, base_url, start_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(site))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = 'http://%s:%d' % (host, server.server_address[1])
+    return server, base_url, base_url + '/wiki/' + quote(CATEGORY, safe=':')
@@ -0,0 +1,56 @@
+# Record (or re-record) benchmark fixtures from the live sites:
+#
+#     python -m benchmarks.record https://ru.wikipedia.org/wiki/Сталкер_(фильм) --name stalker
+#     python -m benchmarks.record https://www.imdb.com/title/tt0079944/
+#
+# Category pages go to fixtures/categories, IMDb title pages to
+# fixtures/imdb/<tt-ID>.html, everything else to fixtures/articles. The
+# fixture server expects the category page as categories/filmy_1979_goda.html.
+# Benchmark results are only comparable between runs on the same fixtures.
+
+import argparse
+import os
+import re
+import urllib.request
+from urllib.parse import unquote, urlsplit
+
+from movies_parser.enrichment import imdb_id
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+USER_AGENT = 'Mozilla/5.0 (movies_parser benchmark fixtures)'
+
+
+def fixture_path(url, name=None):
+    """Куда сохранить страницу: папка по типу страницы, имя — tt-ID или из URL"""
+    title = unquote(urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1])
+    tt = imdb_id(url)
+    if tt:
+        return os.path.join(FIXTURES, 'imdb', (name or tt) + '.html')
+    kind = 'categories' if title.startswith('Категория:') else 'articles'
+    return os.path.join(FIXTURES, kind, (name or re.sub(r'\W+', '_', title).strip('_').lower()) + '.html')
+
+
+def record(url, name=None):
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        body = response.read()
+    path = fixture_path(url, name)
+    with open(path, 'wb') as f:
+        f.write(body)
+    return path, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Save live pages as benchmark fixtures')
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--name', help='file name without .html (only with a single URL)')
+    args = parser.parse_args()
+    if args.name and len(args.urls) > 1:
+        parser.error('--name needs a single URL')
+    for url in args.urls:
+        path, size = record(url, args.name)
+        print('%s -> %s (%d bytes)' % (url, os.path.relpath(path), size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# Local stub of the ru.wikipedia.org MediaWiki API over the same StubWikiTree.
+#
+# Supports what MoviesApiSpider uses: generator=categorymembers with prop=info
+# and gcmcontinue paging, and prop=revisions with rvprop=ids|content for a
+# batch of pageids. With content_limit only that many pages per response get
+# their content; the rest of the batch comes without revisions plus an
+# rvcontinue, as when the real API hits its response size limit. Film wikitext carries the same values as the stub HTML
+# infobox, so both spiders must produce the same items.
+
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from benchmarks.stub_wiki import ROOT, film_imdb_id
+
+NS_MAIN = 0
+NS_CATEGORY = 14
+
+
+def year_category(year):
+    return 'Категория:Фильмы_%d_года' % year
+
+
+def film_page(tree, year, n):
+    title = 'Фильм %d %d' % (year, n)
+    return {'pageid': year * 1000 + n, 'ns': NS_MAIN, 'title': title,
+            'lastrevid': tree.revision(title.replace(' ', '_'))}
+
+
+def film_wikitext(tree, pageid):
+    year, n = divmod(pageid, 1000)
+    return ('{{Фильм\n'
+            '|РусНаз = Фильм %d %d\n'
+            '|Жанр = [[драма (жанр)|драма]], [[комедия]]\n'
+            '|Режиссёр = [[Иван Петров]]\n'
+            '|Страна = {{Флагификация|СССР}}<ref>Источник</ref>\n'
+            '|Год = [[%d год в кино|%d]]\n'
+            '|imdb_id = %s\n'
+            '}}\n'
+            '%s' % (year, n, year, year, film_imdb_id(year, n)[2:], tree.filler))
+
+
+def members(tree, category):
+    if category.replace(' ', '_') == ROOT:
+        return [{'pageid': year, 'ns': NS_CATEGORY, 'title': year_category(year).replace('_', ' ')}
+                for year in tree.years]
+    for year in tree.years:
+        if category.replace(' ', '_') == year_category(year):
+            return [film_page(tree, year, n) for n in range(tree.films_per_year)]
+    return []
+
+
+def query(tree, params, content_limit=None):
+    """Ответ api.php на запрос action=query (formatversion=2)"""
+    if params.get('generator') == 'categorymembers':
+        pages = members(tree, params['gcmtitle'])
+        limit = min(int(params.get('gcmlimit', 10)), 500)
+        start = int(params.get('gcmcontinue', 0))
+        data = {'batchcomplete': True, 'query': {'pages': pages[start:start + limit]}}
+        if start + limit < len(pages):
+            data['continue'] = {'gcmcontinue': str(start + limit), 'continue': 'gcmcontinue||'}
+        return data
+
+    if params.get('prop') == 'revisions':
+        pageids = sorted(int(p) for p in params['pageids'].split('|'))[:50]
+        start = int(params['rvcontinue'].split('|')[0]) if 'rvcontinue' in params else 0
+        pages = []
+        data = {'query': {'pages': pages}}
+        filled = 0
+        for pageid in pageids:
+            year, n = divmod(pageid, 1000)
+            if year not in tree.years or n >= tree.films_per_year:
+                pages.append({'pageid': pageid, 'missing': True})
+                continue
+            page = film_page(tree, year, n)
+            entry = {'pageid': pageid, 'ns': NS_MAIN, 'title': page['title']}
+            pages.append(entry)
+            if pageid < start or 'continue' in data:
+                continue
+            if content_limit is not None and filled == content_limit:
+                data['continue'] = {'rvcontinue': '%d|%d' % (pageid, page['lastrevid']), 'continue': '||'}
+                continue
+            entry['revisions'] = [{
+                'revid': page['lastrevid'],
+                'slots': {'main': {'contentmodel': 'wikitext', 'content': film_wikitext(tree, pageid)}},
+            }]
+            filled += 1
+        if 'continue' not in data:
+            data['batchcomplete'] = True
+        return data
+
+    return {'error': {'code': 'badparams', 'info': 'unsupported stub query'}}
+
+
+def make_handler(tree, content_limit=None):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if tree.latency:
+                threading.Event().wait(tree.latency)
+            parts = urlsplit(self.path)
+            if parts.path != '/w/api.php':
+                self.send_response(404)
+                self.end_headers()
+                return
+            params = {name: values[0] for name, values in parse_qs(parts.query).items()}
+            data = json.dumps(query(tree, params, content_limit), ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(tree, host='127.0.0.1', port=0, content_limit=None):
+    """Запустить стаб API в фоновом потоке, вернуть (server, api_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(tree, content_limit))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://%s:%d/w/api.php' % (host, server.server_address[1])
@@ -0,0 +1,96 @@
+# Synthetic ruwiki multistream dump over a StubWikiTree.
+#
+# write_dump() writes a …-pages-articles-multistream.xml.bz2 with the same
+# layout as the real one: a header stream with <siteinfo>, then bz2 streams
+# of pages_per_stream <page> elements each, then a closing stream, plus the
+# …-multistream-index.txt.bz2 with "offset:page_id:title" per page. Film
+# articles carry the stub_api wikitext (so the items match both spiders) and
+# a [[Категория:Фильмы NNNN года]] link; between them go articles without a
+# film category, redirects and category pages, as in the real dump, where
+# films are a few percent of all pages.
+
+import bz2
+import random
+from xml.sax.saxutils import escape
+
+from benchmarks.stub_api import NS_CATEGORY, NS_MAIN, film_page, film_wikitext
+
+HEADER = ('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" version="0.11" xml:lang="ru">\n'
+          '  <siteinfo>\n    <sitename>Википедия</sitename>\n    <dbname>ruwiki</dbname>\n'
+          '  </siteinfo>\n')
+FOOTER = '</mediawiki>\n'
+WORDS = ('город', 'река', 'страна', 'год', 'история', 'население', 'деятельность', 'участник', 'премия')
+
+
+def page_xml(page_id, ns, title, text, redirect=None):
+    redirect = '    <redirect title="%s" />\n' % escape(redirect, {'"': '&quot;'}) if redirect else ''
+    return ('  <page>\n    <title>%s</title>\n    <ns>%d</ns>\n    <id>%d</id>\n%s'
+            '    <revision>\n      <id>%d</id>\n      <model>wikitext</model>\n'
+            '      <text bytes="%d" xml:space="preserve">%s</text>\n    </revision>\n  </page>\n' % (
+                escape(title), ns, page_id, redirect, page_id * 10 + 1, len(text.encode('utf-8')), escape(text)))
+
+
+def other_pages(rng, start_id, count, text_bytes):
+    """Страницы, которые должны отсеяться: статьи вне категорий фильмов, редиректы, категории"""
+    for i in range(count):
+        page_id = start_id + i
+        kind = i % 4
+        if kind == 3:
+            yield page_xml(page_id, NS_MAIN, 'Перенаправление %d' % page_id,
+                           '#REDIRECT [[Статья %d]]' % page_id, redirect='Статья %d' % page_id)
+        elif kind == 2:
+            yield page_xml(page_id, NS_CATEGORY, 'Категория:Раздел %d' % page_id,
+                           '[[Категория:Фильмы по годам]]')
+        else:
+            words = []
+            size = 0
+            while size < text_bytes:
+                # Числа в тексте — чтобы bz2 сжимал его примерно как настоящие статьи
+                word = '%s %d' % (rng.choice(WORDS), rng.randrange(100000))
+                words.append(word)
+                size += len(word) * 2 + 1
+            yield page_xml(page_id, NS_MAIN, 'Статья %d' % page_id,
+                           "'''Статья %d''' — %s.\n\n[[Категория:Населённые пункты]]" % (page_id, ' '.join(words)))
+
+
+def iter_pages(tree, noise_per_film, text_bytes):
+    """(page_id, title, xml) в порядке page_id, как в дампе"""
+    rng = random.Random(0)
+    next_id = 10 ** 7
+    for year in tree.years:
+        for n in range(tree.films_per_year):
+            page = film_page(tree, year, n)
+            text = film_wikitext(tree, page['pageid']) + '\n[[Категория:Фильмы %d года]]' % year
+            yield page['pageid'], page['title'], page_xml(page['pageid'], NS_MAIN, page['title'], text)
+            for xml in other_pages(rng, next_id, noise_per_film, text_bytes):
+                yield next_id, None, xml
+                next_id += 1
+
+
+def write_dump(tree, path, noise_per_film=20, text_bytes=2000, pages_per_stream=100):
+    """Записать дамп и индекс; вернуть (путь к индексу, страниц, потоков)"""
+    assert path.endswith('-multistream.xml.bz2')
+    index_path = path[:-len('.xml.bz2')] + '-index.txt.bz2'
+    pages = streams = 0
+    with open(path, 'wb') as dump, bz2.open(index_path, 'wt', encoding='utf-8') as index:
+        dump.write(bz2.compress(HEADER.encode('utf-8')))
+        batch = []
+
+        def flush():
+            offset = dump.tell()
+            for page_id, title, _ in batch:
+                index.write('%d:%d:%s\n' % (offset, page_id, title or 'Страница %d' % page_id))
+            dump.write(bz2.compress(''.join(xml for _, _, xml in batch).encode('utf-8')))
+            batch.clear()
+
+        for page in iter_pages(tree, noise_per_film, text_bytes):
+            batch.append(page)
+            pages += 1
+            if len(batch) == pages_per_stream:
+                flush()
+                streams += 1
+        if batch:
+            flush()
+            streams += 1
+        dump.write(bz2.compress(FOOTER.encode('utf-8')))
+    return index_path, pages, streams
@@ -0,0 +1,88 @@
+# Local stub of IMDb title pages: /title/ttNNNNNNN/ with the JSON-LD block in
+# <head>, followed by a large body, served with a configurable delay. With
+# gzip=True the page is gzip-encoded for clients that accept it, as IMDb does.
+
+import gzip
+import json
+import random
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.stub_throttle import throttled
+
+TITLE_RE = re.compile(r'^/title/(tt\d+)/$')
+
+
+def rating(tt):
+    return round(5 + int(tt[2:]) % 50 / 10, 1)
+
+
+def render_title(tt, filler):
+    data = {
+        '@context': 'https://schema.org',
+        '@type': 'Movie',
+        'url': '/title/%s/' % tt,
+        'name': 'Film %s' % tt,
+        'aggregateRating': {'@type': 'AggregateRating', 'ratingCount': 1000, 'bestRating': 10,
+                            'worstRating': 1, 'ratingValue': rating(tt)},
+    }
+    return ('<!DOCTYPE html><html><head><title>%s - IMDb</title>'
+            '<script type="application/ld+json">%s</script></head>'
+            '<body><div id="__next">%s</div></body></html>' % (tt, json.dumps(data), filler))
+
+
+class StubImdb:
+    def __init__(self, latency=0.0, filler_bytes=0, throttle=None, gzip=False):
+        self.latency = latency
+        self.filler = '<div>' + 'x' * filler_bytes + '</div>'
+        self.throttle = throttle
+        self.gzip = gzip
+        if gzip:
+            # Сжимаемость как у настоящей разметки, а не строки из одних "x"
+            rng = random.Random(0)
+            self.filler = '<div>%s</div>' % ''.join(
+                '<span class="c%d">%d</span>' % (rng.randrange(50), rng.randrange(10 ** 6))
+                for _ in range(filler_bytes // 30))
+
+
+def make_handler(imdb):
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self):
+            if imdb.latency:
+                threading.Event().wait(imdb.latency)
+            match = TITLE_RE.match(self.path)
+            if not match:
+                self.send_response(404)
+                self.end_headers()
+                return
+            data = render_title(match.group(1), imdb.filler).encode('utf-8')
+            compress = imdb.gzip and 'gzip' in self.headers.get('Accept-Encoding', '')
+            if compress:
+                data = gzip.compress(data, 6)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            if compress:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # Клиент оборвал загрузку, получив начало страницы
+                pass
+
+        do_GET = throttled(respond, imdb.throttle)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(imdb, host='127.0.0.1', port=0):
+    """Запустить стаб IMDb в фоновом потоке, вернуть (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(imdb))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://%s:%d' % (host, server.server_address[1])
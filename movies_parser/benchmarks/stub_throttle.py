@@ -0,0 +1,48 @@
+# Server-side throttling for the stub servers: at most `capacity` requests
+# are served at once, the rest get 429 with Retry-After, the way Wikipedia
+# and IMDb push back on clients that send too much.
+
+import threading
+
+
+class Throttle:
+    def __init__(self, capacity, retry_after=1):
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.active = 0
+        self.rejected = 0
+        self.served = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.active >= self.capacity:
+                self.rejected += 1
+                return False
+            self.active += 1
+            self.served += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+
+    def reject(self, handler):
+        handler.send_response(429)
+        handler.send_header('Retry-After', str(self.retry_after))
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+
+
+def throttled(respond, throttle):
+    """Обернуть do_GET стаб-сервера: при превышении capacity — 429"""
+    def do_GET(handler):
+        if throttle is None:
+            return respond(handler)
+        if not throttle.acquire():
+            return throttle.reject(handler)
+        try:
+            return respond(handler)
+        finally:
+            throttle.release()
+    return do_GET
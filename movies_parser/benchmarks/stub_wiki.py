@@ -0,0 +1,145 @@
+# Local stub of the ru.wikipedia.org film category tree.
+#
+# The root category links to one subcategory per year, every year category
+# lists its films split across pages with a "Следующая страница" link,
+# and every film page carries an infobox shaped like the real one.
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+
+from benchmarks.stub_throttle import throttled
+
+ROOT = 'Категория:Фильмы_по_годам'
+
+
+def wiki_path(title):
+    return '/wiki/' + quote(title)
+
+
+def film_title(year, n):
+    return 'Фильм_%d_%d' % (year, n)
+
+
+def film_imdb_id(year, n):
+    return 'tt%07d' % (year * 1000 + n)
+
+
+def render_category(tree, year, page):
+    films = [film_title(year, n) for n in range(tree.films_per_year)]
+    # Та же статья под другим названием (редирект), как бывает в реальных категориях
+    if tree.alias_every:
+        films += [film_title(year, n) + '_(фильм)' for n in range(0, tree.films_per_year, tree.alias_every)]
+    start = page * tree.page_size
+    chunk = films[start:start + tree.page_size]
+    links = ''.join('<li><a href="%s">%s</a></li>' % (wiki_path(t), t) for t in chunk)
+    next_link = ''
+    if start + tree.page_size < len(films):
+        next_link = '<a href="%s?page=%d">Следующая страница</a>' % (
+            wiki_path('Категория:Фильмы_%d_года' % year), page + 1)
+    return ('<html><body><h1 id="firstHeading">Фильмы %d года</h1>'
+            '<div id="mw-pages">%s<div class="mw-category-group"><ul>%s</ul></div></div>'
+            '</body></html>' % (year, next_link, links))
+
+
+def render_root(tree):
+    links = ''.join('<li><a href="%s">%d</a></li>' % (wiki_path('Категория:Фильмы_%d_года' % y), y)
+                    for y in tree.years)
+    return ('<html><body><h1 id="firstHeading">Фильмы по годам</h1>'
+            '<div id="mw-subcategories"><div class="mw-category-group"><ul>%s</ul></div></div>'
+            '</body></html>' % links)
+
+
+def render_film(tree, title):
+    title = title.replace('_(фильм)', '')
+    _, year, n = title.rsplit('_', 2)
+    return ('<html><head><script>RLCONF={"wgArticleId":%d,"wgRevisionId":%d};</script></head>'
+            '<body><h1 id="firstHeading"><span>%s</span></h1>'
+            '<table class="infobox"><tbody>'
+            '<tr><th>Жанр</th><td><a href="/wiki/x">драма</a>, <a href="/wiki/y">комедия</a></td></tr>'
+            '<tr><th>Режиссёр</th><td><a href="/wiki/z">Иван Петров</a></td></tr>'
+            '<tr><th>Страна</th><td><span><a href="/wiki/c">СССР</a></span><sup>[1]</sup></td></tr>'
+            '<tr><th>Год</th><td><a href="/wiki/%s">%s</a></td></tr>'
+            '<tr><th><a title="Internet Movie Database">IMDb</a></th>'
+            '<td><a class="external text" href="https://www.imdb.com/title/%s/">ID %s</a></td></tr>'
+            '</tbody></table>'
+            '<p>%s</p></body></html>' % (int(year) * 1000 + int(n), tree.revision(title), title.replace('_', ' '),
+                                         year, year, film_imdb_id(int(year), int(n)), n, tree.filler))
+
+
+class StubWikiTree:
+    """Описание стаб-дерева категорий: годы, фильмы в году, размер страницы"""
+
+    def __init__(self, years=range(1990, 2000), films_per_year=50, page_size=200,
+                 latency=0.0, filler_bytes=0, alias_every=0, throttle=None):
+        self.years = list(years)
+        self.films_per_year = films_per_year
+        self.page_size = page_size
+        self.latency = latency
+        self.filler = 'x' * filler_bytes
+        self.alias_every = alias_every
+        # Ограничение сервера на одновременные запросы (stub_throttle.Throttle)
+        self.throttle = throttle
+        # Правки статей: title -> номер ревизии (по умолчанию 1)
+        self.revisions = {}
+
+    def revision(self, title):
+        return self.revisions.get(title, 1)
+
+    @property
+    def total_films(self):
+        return len(self.years) * self.films_per_year
+
+    def render(self, path, query):
+        title = unquote(path[len('/wiki/'):]) if path.startswith('/wiki/') else ''
+        if title == ROOT:
+            return render_root(self)
+        if title.startswith('Категория:Фильмы_') and title.endswith('_года'):
+            year = int(title.split('_')[1])
+            page = int(parse_qs(query).get('page', ['0'])[0])
+            return render_category(self, year, page)
+        if title.startswith('Фильм_'):
+            return render_film(self, title)
+        return None
+
+
+def make_handler(tree):
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self):
+            if tree.latency:
+                threading.Event().wait(tree.latency)
+            parts = urlsplit(self.path)
+            body = tree.render(parts.path, parts.query)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            etag = '"%d-%s"' % (tree.revision(unquote(parts.path[len('/wiki/'):])), parts.query)
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = throttled(respond, tree.throttle)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(tree, host='127.0.0.1', port=0):
+    """Запустить стаб-сервер в фоновом потоке, вернуть (server, root_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(tree))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root_url = 'http://%s:%d%s' % (host, server.server_address[1], wiki_path(ROOT))
+    return server, root_url
@@ -0,0 +1,302 @@
+# Benchmark suite over the recorded fixtures (benchmarks/fixtures), with
+# JSON results that can be compared between commits:
+#   - parse_movie, category page and parse_imdb pages/sec (HtmlResponse built
+#     from the fixture bytes every time, so the HTML parse is included)
+#   - ns per call of every cleaner, with warm and with cleared token caches
+#   - Python memory retained by 10k items from parse_movie (tracemalloc)
+#   - end-to-end crawl items/sec and pages/sec against the fixture server
+#     (benchmarks.fixture_server), IMDB_ENRICHMENT="chain"
+#
+#     python -m benchmarks.suite -o bench-before.json
+#     python -m benchmarks.suite -o bench-after.json --baseline bench-before.json
+#
+# With --baseline every result that is worse than the baseline by more than
+# --threshold (10% by default) is flagged and the exit status is 1. Timings
+# are the best of --rounds short rounds, run interleaved across all
+# benchmarks, and before comparing they are scaled by
+# the "calibration" loop of both runs, so a machine that is slower today
+# (shared CPU, frequency scaling) does not show up as a regression; --raw
+# compares the measured values as they are.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from scrapy.crawler import Crawler
+from scrapy.http import HtmlResponse, Request
+from scrapy.statscollectors import MemoryStatsCollector
+
+from benchmarks.crawl import project_settings, run_crawls
+from benchmarks.fixture_server import FixtureSite, load_directory, serve
+from movies_parser import cleaning
+from movies_parser.frontier import WikiRow
+from movies_parser.infobox import InfoboxExtractor
+from movies_parser.seen import page_key
+from movies_parser.spiders.movies import MoviesSpider
+
+WIKI_URL = 'https://ru.wikipedia.org/wiki/'
+TOKEN_CACHES = (cleaning.year_token, cleaning.director_token, cleaning.country_token, cleaning.genre_token)
+
+
+def make_spider(**overrides):
+    """MoviesSpider с настройками проекта, без движка: для вызова колбэков напрямую"""
+    settings = project_settings(**overrides)
+    crawler = Crawler(MoviesSpider, settings)
+    crawler.stats = MemoryStatsCollector(crawler)
+    return MoviesSpider.from_crawler(crawler)
+
+
+def article_responses(site):
+    """Функции, которые каждый раз строят свежий ответ по записанной статье"""
+    def factory(n, body):
+        url = WIKI_URL + 'Fixture_%d' % n
+        request = Request(url, meta={'page_key': page_key(url)})
+        return lambda: HtmlResponse(url=url, body=body, encoding='utf-8', request=request)
+    return [factory(n, body) for n, body in enumerate(site.articles)]
+
+
+def rate(func, count):
+    """Скорость одного раунда: count вызовов func в секунду"""
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - start)
+
+
+def calibration():
+    """ns на фиксированный кусок чистого Python: мерило скорости самой машины"""
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        total = 0
+        for i in range(10000):
+            total += len(str(i))
+        best = min(best, time.perf_counter_ns() - start)
+    return best
+
+
+def bench_parse_movie(site, args):
+    spider = make_spider(IMDB_ENRICHMENT='off')
+    responses = article_responses(site)
+
+    def run():
+        for make in responses:
+            for _ in spider.parse_movie(make()):
+                pass
+    return lambda: rate(run, args.pages // len(responses)) * len(responses)
+
+
+def bench_parse_category(site, args):
+    spider = make_spider()
+    body = site.render_category(0)
+    url = WIKI_URL + 'Категория:Фильмы_1979_года'
+
+    def run():
+        # Каждый раз как первый визит: фронтир пуст
+        spider.visited.clear()
+        spider.queue.clear()
+        spider.in_flight = 0
+        for _ in spider.parse(HtmlResponse(url=url, body=body, encoding='utf-8')):
+            pass
+    return lambda: rate(run, args.pages // 10)
+
+
+def bench_parse_imdb(site, args):
+    spider = make_spider()
+    pages = [('https://www.imdb.com/title/%s/' % tt, body, tt) for tt, body in site.imdb.items()]
+
+    def run():
+        for url, body, tt in pages:
+            # Строка статьи ждёт ответа в хранилище паука, как при обычном крауле
+            row_id = spider.pending.put(WikiRow(tt, '', '', '', '', tt, 1))
+            request = Request(url, meta={'pending_id': row_id})
+            for _ in spider.parse_imdb(HtmlResponse(url=url, body=body, encoding='utf-8', request=request)):
+                pass
+    return lambda: rate(run, args.pages // len(pages)) * len(pages)
+
+
+def bench_cleaner(values, cleaner, calls, cold):
+    """ns на вызов очистителя; cold — перед каждым вызовом кэши токенов сброшены,
+    как при первой встрече токенов на новых статьях"""
+    def sample():
+        if not cold:
+            start = time.perf_counter_ns()
+            for i in range(calls):
+                cleaner(values[i % len(values)])
+            return (time.perf_counter_ns() - start) / calls
+        total = 0
+        for i in range(calls // 10):
+            for cache in TOKEN_CACHES:
+                cache.cache_clear()
+            start = time.perf_counter_ns()
+            cleaner(values[i % len(values)])
+            total += time.perf_counter_ns() - start
+        return total / (calls // 10)
+    return sample
+
+
+def timing_benchmarks(site, args):
+    """{имя: (функция одного раунда, единица, что лучше)}"""
+    benchmarks = {
+        'calibration': (calibration, 'ns', 'lower'),
+        'parse_movie': (bench_parse_movie(site, args), 'pages/sec', 'higher'),
+        'parse_category': (bench_parse_category(site, args), 'pages/sec', 'higher'),
+        'parse_imdb': (bench_parse_imdb(site, args), 'pages/sec', 'higher'),
+    }
+    # Сырые значения из записанных статей, как их отдаёт InfoboxExtractor
+    extractor = InfoboxExtractor()
+    raw = [extractor.extract(make().selector.root) for make in article_responses(site)]
+    raw = [infobox for infobox in raw if infobox]
+    for field, cleaner in cleaning.CLEANERS.items():
+        values = [infobox[field] for infobox in raw]
+        for mode in ('warm', 'cold'):
+            benchmarks['cleaner_%s_%s' % (field, mode)] = (
+                bench_cleaner(values, cleaner, args.calls, mode == 'cold'), 'ns/call', 'lower')
+    return benchmarks
+
+
+def run_timings(benchmarks, rounds):
+    """Раунды идут вперемешку по всем замерам, и каждому берётся лучший раунд:
+    если машина притормозила на время, это задевает не один замер целиком"""
+    samples = {name: [] for name in benchmarks}
+    for _ in range(rounds):
+        for name, (sample, _, _) in benchmarks.items():
+            samples[name].append(sample())
+    return {name: ((max if better == 'higher' else min)(samples[name]), unit, better)
+            for name, (_, unit, better) in benchmarks.items()}
+
+
+def bench_memory(site, args):
+    """Память Python, которую занимают 10k items из parse_movie, и пик при их сборе"""
+    spider = make_spider(IMDB_ENRICHMENT='off')
+    responses = article_responses(site)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = []
+    for i in range(args.items):
+        items.extend(spider.parse_movie(responses[i % len(responses)]()))
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    scale = 10000 / len(items)
+    return {
+        'memory_per_10k_items': ((current - before) * scale, 'bytes', 'lower'),
+        'memory_peak_10k_items': ((peak - before) * scale, 'bytes', 'lower'),
+    }
+
+
+def bench_crawl(site, args):
+    """Краул против сервера фикстур; реактор запускается один раз, поэтому это последний замер"""
+    server, base_url, start_url = serve(site)
+    try:
+        settings = project_settings(
+            IMDB_ENRICHMENT='chain',
+            BENCH_HOST_MAP={'https://www.imdb.com': base_url},
+            # Статей и страниц IMDb всего по несколько, фильтр Scrapy отбросил бы повторы
+            DUPEFILTER_CLASS='scrapy.dupefilters.BaseDupeFilter',
+        )
+        stats, = run_crawls([(settings, {'start_url': start_url})])
+    finally:
+        server.shutdown()
+    elapsed = stats.get('elapsed_time_seconds') or 0.0
+    return {
+        'crawl_items_per_sec': (stats.get('item_scraped_count', 0) / elapsed if elapsed else 0.0, 'items/sec', 'higher'),
+        'crawl_pages_per_sec': (stats.get('response_received_count', 0) / elapsed if elapsed else 0.0, 'pages/sec', 'higher'),
+        'crawl_items': (stats.get('item_scraped_count', 0), 'items', 'higher'),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args):
+    site = FixtureSite(category_pages=args.category_pages)
+    results = run_timings(timing_benchmarks(site, args), args.rounds)
+    results.update(bench_memory(site, args))
+    if not args.skip_crawl:
+        results.update(bench_crawl(site, args))
+    return {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'fixtures': {name: sorted(load_directory(name)) for name in ('articles', 'categories', 'imdb')},
+        'results': {name: {'value': value, 'unit': unit, 'better': better}
+                    for name, (value, unit, better) in results.items()},
+    }
+
+
+def compare(current, baseline, threshold, normalize=True):
+    """[(имя, было, стало, изменение, регрессия)] по результатам, которые есть в обоих прогонах;
+    с normalize замеры времени пересчитываются на скорость машины по calibration"""
+    speed = 1.0
+    if normalize and 'calibration' in baseline['results']:
+        speed = current['results']['calibration']['value'] / baseline['results']['calibration']['value']
+    rows = []
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None or not old['value'] or name == 'calibration':
+            continue
+        value = result['value']
+        if result['unit'].endswith('/sec'):
+            value *= speed
+        elif result['unit'].startswith('ns'):
+            value /= speed
+        change = value / old['value'] - 1
+        worse = -change if result['better'] == 'higher' else change
+        rows.append((name, old['value'], value, change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite over the recorded fixtures')
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change flagged as a regression')
+    parser.add_argument('--raw', action='store_true', help='compare without the calibration correction')
+    parser.add_argument('--rounds', type=int, default=15)
+    parser.add_argument('--pages', type=int, default=60, help='pages per round of the parse benchmarks')
+    parser.add_argument('--calls', type=int, default=4000, help='calls per round of the cleaner benchmarks')
+    parser.add_argument('--items', type=int, default=10000, help='items collected for the memory benchmark')
+    parser.add_argument('--category-pages', type=int, default=10, help='category pages served to the crawl')
+    parser.add_argument('--skip-crawl', action='store_true')
+    parser.add_argument('--quick', action='store_true', help='fewer rounds and pages, for a smoke run')
+    args = parser.parse_args()
+    if args.quick:
+        args.rounds, args.pages, args.calls, args.items, args.category_pages = 3, 30, 2000, 1000, 2
+
+    report = run_suite(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if not args.baseline:
+        for name, result in report['results'].items():
+            print('%-28s %14.1f %s' % (name, result['value'], result['unit']))
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print('baseline %s, current %s' % (baseline.get('commit'), report['commit']))
+    regressions = 0
+    for name, old, new, change, regression in compare(report, baseline, args.threshold, not args.raw):
+        regressions += regression
+        print('%-28s %14.1f %14.1f %+7.1f%%%s' % (name, old, new, change * 100, '  REGRESSION' if regression else ''))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# AIMD concurrency controller for AdaptiveConcurrencyMiddleware
+#
+# Every downloader slot (one per domain) gets a congestion window, the number
+# of requests it may have in flight. Each good response grows the window by
+# ADAPTIVE_INCREASE / window, i.e. by about ADAPTIVE_INCREASE per round trip.
+# A congestion signal multiplies it by ADAPTIVE_DECREASE. Requests carry the
+# domain's epoch (number of decreases so far) from the moment they were sent,
+# and signals from requests sent before the last decrease are ignored, so
+# one burst of errors counts once. Congestion signals are
+# throttling/overload statuses (429, 503, ...), download errors, and a
+# latency EWMA above ADAPTIVE_LATENCY_FACTOR times the domain's baseline
+# (latencies under MIN_CONGESTED_LATENCY never count). The baseline is the
+# best EWMA of the last ADAPTIVE_LATENCY_WINDOW responses, and a latency
+# decrease moves it to the current EWMA: queueing delay falls once the window
+# shrinks, while a domain whose normal latency went up costs one decrease and
+# then grows back instead of being throttled to the minimum for good.
+#
+# The concurrency that triggered a throttling status or error is remembered
+# as a ceiling: the
+# window grows back just below it and only probes above it again after
+# ADAPTIVE_PROBE_INTERVAL seconds without congestion, so a host that
+# answers every probe with Retry-After is not probed on every round trip.
+#
+# Retry-After (seconds or an HTTP date) pauses the whole slot for that long.
+
+import time
+from email.utils import parsedate_to_datetime
+
+# Задержка меньше этой не считается признаком перегрузки, как бы ни выросла
+MIN_CONGESTED_LATENCY = 0.1
+
+
+def retry_after_seconds(value, now=None):
+    """Retry-After в секундах: число секунд или HTTP-дата; None, если не разобрать"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - (now if now is not None else time.time()))
+
+
+class DomainWindow:
+    __slots__ = ('window', 'epoch', 'latency', 'best_latency', 'best_age', 'paused_until',
+                 'ceiling', 'ceiling_until')
+
+    def __init__(self, window):
+        self.window = window
+        self.epoch = 0
+        self.ceiling = None
+        self.ceiling_until = 0.0
+        self.latency = None
+        self.best_latency = None
+        # Сколько ответов назад выставлена базовая задержка
+        self.best_age = 0
+        self.paused_until = 0.0
+
+
+class AimdController:
+    """Окна конкуренции по ключам слотов загрузчика"""
+
+    def __init__(self, start=8, minimum=1, maximum=32, increase=1.0, decrease=0.5,
+                 latency_factor=3.0, probe_interval=30.0, smoothing=0.2, latency_window=100):
+        self.start = start
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.probe_interval = probe_interval
+        self.smoothing = smoothing
+        self.latency_window = latency_window
+        self.domains = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            start=settings.getint('ADAPTIVE_START_CONCURRENCY', 8),
+            minimum=settings.getint('ADAPTIVE_MIN_CONCURRENCY', 1),
+            maximum=settings.getint('ADAPTIVE_MAX_CONCURRENCY', 32),
+            increase=settings.getfloat('ADAPTIVE_INCREASE', 1.0),
+            decrease=settings.getfloat('ADAPTIVE_DECREASE', 0.5),
+            latency_factor=settings.getfloat('ADAPTIVE_LATENCY_FACTOR', 3.0),
+            probe_interval=settings.getfloat('ADAPTIVE_PROBE_INTERVAL', 30.0),
+            latency_window=settings.getint('ADAPTIVE_LATENCY_WINDOW', 100),
+        )
+
+    def state(self, key):
+        state = self.domains.get(key)
+        if state is None:
+            state = self.domains[key] = DomainWindow(float(self.start))
+        return state
+
+    def concurrency(self, key):
+        return max(self.minimum, int(self.state(key).window))
+
+    def epoch(self, key):
+        return self.state(key).epoch
+
+    def on_success(self, key, latency, epoch, now=None):
+        """Ответ без признаков перегрузки на запрос, отправленный в эпоху epoch;
+        вернуть True, если окно пришлось уменьшить из-за выросшей задержки"""
+        state = self.state(key)
+        now = time.monotonic() if now is None else now
+        if latency is not None:
+            if state.latency is None:
+                state.latency = latency
+            else:
+                state.latency += self.smoothing * (latency - state.latency)
+            state.best_age += 1
+            # База — лучшая задержка за последние latency_window ответов
+            if (state.best_latency is None or state.latency < state.best_latency
+                    or state.best_age >= self.latency_window):
+                state.best_latency = state.latency
+                state.best_age = 0
+            # Задержка выросла в разы относительно базы — сервер захлёбывается
+            if (state.latency > MIN_CONGESTED_LATENCY
+                    and state.latency > self.latency_factor * state.best_latency):
+                decreased = self.on_congestion(key, epoch, now, ceiling=False)
+                if decreased:
+                    # Если с меньшим окном задержка не спадёт, это новый обычный уровень домена
+                    state.best_latency = state.latency
+                    state.best_age = 0
+                return decreased
+        limit = float(self.maximum)
+        if state.ceiling is not None:
+            if now < state.ceiling_until:
+                limit = min(limit, max(float(self.minimum), state.ceiling - 1.0))
+            else:
+                state.ceiling = None
+        state.window = min(limit, state.window + self.increase / state.window)
+        return False
+
+    def on_congestion(self, key, epoch, now=None, ceiling=True):
+        """Сигнал перегрузки; вернуть True, если окно уменьшено. Запросы, ушедшие
+        до прошлого уменьшения, окно уже не трогают; ceiling — запомнить потолок"""
+        state = self.state(key)
+        now = time.monotonic() if now is None else now
+        if epoch != state.epoch:
+            return False
+        state.epoch += 1
+        if ceiling:
+            state.ceiling = float(int(state.window))
+            state.ceiling_until = now + self.probe_interval
+        state.window = max(float(self.minimum), state.window * self.decrease)
+        return True
+
+    def pause(self, key, seconds, now=None):
+        """Запомнить Retry-After; вернуть, до какого момента слот стоит"""
+        state = self.state(key)
+        now = time.monotonic() if now is None else now
+        state.paused_until = max(state.paused_until, now + seconds)
+        return state.paused_until
@@ -0,0 +1,201 @@
+# Crawl checkpoints for MoviesSpider
+#
+# With CHECKPOINT_PATH the spider appends every change of its crawl state to
+# a binary log: pages queued (with their visited key), pages finished, film
+# rows waiting for IMDb and rows answered. Category continuation pages
+# ("Следующая страница") are queued pages too, so the pagination position
+# is part of the log. Records are buffered in memory and written every
+# CHECKPOINT_INTERVAL seconds as one group closed by a commit record; just
+# before that the output pipeline flushes its rows to disk and the commit
+# record stores where its file ends. A group without its commit record (the
+# process died while writing it) is ignored when the log is read.
+#
+# With CHECKPOINT_RESUME the log is replayed: the visited keys come back,
+# pages that were queued or downloading go back to the queue, rows waiting
+# for IMDb are requested again and the output file is cut back to the last
+# commit and continued. Only the pages and IMDb lookups in flight since the
+# last checkpoint are fetched again. The log is then compacted to the
+# visited keys plus the open work. A crawl that finishes normally removes
+# its log.
+#
+# Record: type byte, payload length (uint32), payload
+#   V  visited key (uint64)
+#   A  queued page: visited key (uint64) + URL
+#   D  finished page: url_key of its URL (uint64)
+#   I  row waiting for IMDb: row id (uint64) + pickled (WikiRow, IMDb URL, page key)
+#   R  row answered or failed: row id (uint64)
+#   S  commit: pickled {component: state} (the output pipeline's file position)
+
+import logging
+import os
+import pickle
+import struct
+
+from movies_parser.distributed import url_key
+from movies_parser.frontier import WikiRow
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('<cI')
+KEY = struct.Struct('<Q')
+
+
+def read_log(path):
+    """Записи лога [(тип, payload)] из групп, закрытых коммитом"""
+    records = []
+    group = []
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+            kind, size = HEADER.unpack(header)
+            payload = f.read(size)
+            if len(payload) < size:
+                break
+            group.append((kind, payload))
+            if kind == b'S':
+                records += group
+                group = []
+    return records
+
+
+class CrawlState:
+    """Состояние краула по логу: visited, открытые страницы, строки, ждущие IMDb"""
+
+    def __init__(self):
+        self.visited = set()
+        # url_key -> URL, в порядке постановки в очередь
+        self.pages = {}
+        # id строки -> (WikiRow, ссылка на IMDb, ключ страницы)
+        self.rows = {}
+        self.states = {}
+
+    @classmethod
+    def replay(cls, records):
+        state = cls()
+        for kind, payload in records:
+            if kind == b'V':
+                state.visited.add(KEY.unpack(payload)[0])
+            elif kind == b'A':
+                state.visited.add(KEY.unpack_from(payload)[0])
+                url = payload[KEY.size:].decode('utf-8')
+                state.pages[url_key(url)] = url
+            elif kind == b'D':
+                state.pages.pop(KEY.unpack(payload)[0], None)
+            elif kind == b'I':
+                row, link, key = pickle.loads(payload[KEY.size:])
+                state.rows[KEY.unpack_from(payload)[0]] = (WikiRow(*row), link, key)
+            elif kind == b'R':
+                state.rows.pop(KEY.unpack(payload)[0], None)
+            elif kind == b'S':
+                state.states = pickle.loads(payload)
+        return state
+
+
+class Checkpoint:
+    """Журнал состояния краула: записи копятся в памяти и раз в interval секунд
+    пишутся на диск одной группой с коммитом"""
+
+    def __init__(self, path, interval=10.0, resume=False, crawler=None):
+        self.path = path
+        self.interval = interval
+        self.crawler = crawler
+        self.buffer = []
+        self.syncs = {}
+        self.file = None
+        self.task = None
+        self.state = None
+        # Лог без единого коммита — продолжать нечего, начинаем заново
+        records = read_log(path) if resume and os.path.exists(path) else None
+        if records:
+            self.state = CrawlState.replay(records)
+        self.states = dict(self.state.states) if self.state is not None else {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """None, если CHECKPOINT_PATH не задан"""
+        settings = crawler.settings
+        path = settings.get('CHECKPOINT_PATH')
+        if not path:
+            return None
+        return cls(path, settings.getfloat('CHECKPOINT_INTERVAL', 10.0),
+                   settings.getbool('CHECKPOINT_RESUME'), crawler)
+
+    @property
+    def resumed(self):
+        return self.state is not None
+
+    def record(self, kind, payload):
+        self.buffer.append(HEADER.pack(kind, len(payload)) + payload)
+
+    def page_added(self, key, url):
+        self.record(b'A', KEY.pack(key) + url.encode('utf-8'))
+
+    def page_done(self, task):
+        self.record(b'D', KEY.pack(task))
+
+    def row_added(self, row_id, row, link, key):
+        self.record(b'I', KEY.pack(row_id) + pickle.dumps((tuple(row), link, key), pickle.HIGHEST_PROTOCOL))
+
+    def row_done(self, row_id):
+        self.record(b'R', KEY.pack(row_id))
+
+    def register(self, name, sync):
+        """Компонент со своим состоянием на диске (выходной файл): sync() вызывается перед
+        каждым коммитом и возвращает то, что нужно для продолжения; вернуть сохранённое при resume"""
+        self.syncs[name] = sync
+        return self.states.get(name)
+
+    def open(self, visited=()):
+        """Начать запись. После resume лог сжимается: visited + уже записанная в буфер
+        открытая работа пишутся в новый файл, который атомарно заменяет старый"""
+        if self.state is None:
+            self.file = open(self.path, 'wb')
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            header = HEADER.pack(b'V', KEY.size)
+            f.write(b''.join(header + KEY.pack(key) for key in visited))
+            self.write_group(f)
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.file = open(self.path, 'ab')
+        logger.info('Checkpoint %s: resumed with %d visited pages, %d pages and %d IMDb lookups to redo',
+                    self.path, len(self.state.visited), len(self.state.pages), len(self.state.rows))
+
+    def start(self):
+        from twisted.internet import task
+
+        self.task = task.LoopingCall(self.sync)
+        self.task.start(self.interval, now=False)
+
+    def write_group(self, f):
+        payload = pickle.dumps(self.states, pickle.HIGHEST_PROTOCOL)
+        self.buffer.append(HEADER.pack(b'S', len(payload)) + payload)
+        data = b''.join(self.buffer)
+        f.write(data)
+        self.buffer = []
+        return len(data)
+
+    def sync(self):
+        """Коммит: сначала компоненты сбрасывают данные на диск, потом пишется группа записей"""
+        for name, sync in self.syncs.items():
+            self.states[name] = sync()
+        written = self.write_group(self.file)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        stats = self.crawler.stats if self.crawler is not None else None
+        if stats is not None:
+            stats.inc_value('checkpoint/syncs')
+            stats.inc_value('checkpoint/bytes', written)
+
+    def close(self, finished):
+        """Закрыть лог; после нормального завершения краула он больше не нужен.
+        Иначе продолжим с последнего коммита: файл вывода к этому моменту уже закрыт"""
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        if self.file is not None:
+            self.file.close()
+            if finished:
+                os.remove(self.path)
@@ -0,0 +1,207 @@
+# Cleaning of raw infobox values
+#
+# Same rules as the original MoviesSpider.clean_* methods, but with the
+# regexes compiled once and every raw token cleaned once per process:
+# genre/country vocabularies are tiny and years repeat all the time, so
+# the per-token work is memoized and a page mostly costs a few cache hits.
+#
+# clean_items() cleans a batch of raw items, and running the module
+# re-cleans an existing CSV offline:
+#
+#     python -m movies_parser.cleaning movies_output.csv movies_clean.csv
+
+import ast
+import csv
+import re
+import sys
+from functools import lru_cache
+
+YEAR_RE = re.compile(r'\b\d{4}\b')
+FOOTNOTE_RE = re.compile(r'\[.*?\]')
+DOT_SPACES_RE = re.compile(r'\s*\.\s*')
+DASH_SPACES_RE = re.compile(r'\s*-\s*')
+NAME_RE = re.compile(r"[A-Za-zА-Яа-яЁё][-A-Za-zА-Яа-яЁё'\.\s]{2,}")
+COMMA_SPACES_RE = re.compile(r'\s*,\s*')
+COMMAS_RE = re.compile(r',+')
+EMPTY_COMMAS_RE = re.compile(r',\s*,+')
+COUNTRY_NUMBER_RE = re.compile(r'[\d~\-\+]+')
+COUNTRY_BRACKETS_RE = re.compile(r'[\[\],\s]*')
+COUNTRY_APPROX_RE = re.compile(r'\s*(ок\.?|ОК|~|≈)')
+OPEN_PAREN_RE = re.compile(r'^\s*\($')
+CLOSE_PAREN_RE = re.compile(r'^\s*\)$')
+NON_LETTER_RE = re.compile(r'[^A-Za-zА-Яа-яЁё\s-]')
+GENRE_JUNK = ('mw-', '{', '}', 'background', 'padding', 'color:', 'output')
+
+FIELDS = ('title', 'genre', 'director', 'country', 'year')
+
+
+def join_list(parts):
+    """Склеить через запятую и подчистить лишние запятые"""
+    text = ', '.join(parts)
+    text = COMMA_SPACES_RE.sub(', ', text)
+    text = COMMAS_RE.sub(',', text)
+    return text.strip(' ,')
+
+
+def clean_title(title):
+    """Очистить название фильма от лишних кавычек и пробелов"""
+    return title.strip().strip('"').strip()
+
+
+@lru_cache(maxsize=4096)
+def year_token(token):
+    return tuple(YEAR_RE.findall(token))
+
+
+def clean_year(year_input):
+    """Оставить только уникальные года из 4 цифр и вернуть строку, разделенную запятыми"""
+    # Строковое представление списка (например, из старого CSV) превращаем в список
+    if isinstance(year_input, str) and year_input.lstrip().startswith('['):
+        try:
+            year_input = ast.literal_eval(year_input)
+        except (ValueError, SyntaxError):
+            pass
+
+    if isinstance(year_input, str):
+        year_input = [year_input]
+
+    years = set()
+    for token in year_input:
+        years.update(year_token(str(token)))
+
+    return ', '.join(sorted(years, reverse=True))
+
+
+@lru_cache(maxsize=65536)
+def director_token(token):
+    token = token.strip()
+    if not token or not token.strip(','):
+        return None
+    # Убираем лишние пробелы вокруг точек и дефисов
+    token = DOT_SPACES_RE.sub('.', token)
+    token = DASH_SPACES_RE.sub('-', token)
+    return token if NAME_RE.fullmatch(token) else None
+
+
+def clean_director(director_list):
+    """Очистить список режиссеров от мусора и оставить только похожее на имена"""
+    cleaned_list = []
+    for token in director_list:
+        token = director_token(token)
+        if token is not None:
+            cleaned_list.append(token)
+    return join_list(cleaned_list)
+
+
+@lru_cache(maxsize=4096)
+def country_token(token):
+    token = FOOTNOTE_RE.sub('', token.strip()).strip()
+    # Цифры, "~", пустые скобки и запятые, приблизительные значения — мусор
+    if not token or COUNTRY_NUMBER_RE.fullmatch(token) or COUNTRY_BRACKETS_RE.fullmatch(token):
+        return ()
+    if COUNTRY_APPROX_RE.match(token):
+        return ()
+    # Обрабатываем символ "/" как разделитель стран
+    if '/' in token:
+        return tuple(part.strip() for part in token.split('/') if part.strip())
+    token = OPEN_PAREN_RE.sub('', token)
+    token = CLOSE_PAREN_RE.sub('', token)
+    return (token,) if token else ()
+
+
+def clean_country(country_list):
+    """Очистить список стран от мусора"""
+    cleaned_list = []
+    for token in country_list:
+        cleaned_list.extend(country_token(token))
+    return join_list(cleaned_list)
+
+
+@lru_cache(maxsize=4096)
+def genre_token(token):
+    token = FOOTNOTE_RE.sub('', token.strip()).strip()
+    if not token:
+        return ()
+    # Иногда жанры разделены слэшем
+    parts = [part.strip() for part in token.split('/')] if '/' in token else [token]
+    kept = []
+    for genre in parts:
+        if not genre:
+            continue
+        # Убираем если много мусорных символов (не буквенных)
+        if len(NON_LETTER_RE.findall(genre)) / len(genre) > 0.3:
+            continue
+        # Убираем если есть явные мусорные куски (стили шаблонов и т.п.)
+        if any(junk in genre for junk in GENRE_JUNK):
+            continue
+        # Убираем короткие или цифровые элементы
+        if len(genre) >= 3 and not genre.isdigit():
+            kept.append(genre)
+    return tuple(kept)
+
+
+def clean_genre(genre_list):
+    """Очистить список жанров от мусора"""
+    # Если genre_list это одна строка, разбить её по запятым
+    if isinstance(genre_list, str):
+        genre_list = genre_list.split(',')
+
+    final_list = []
+    for token in genre_list:
+        final_list.extend(genre_token(token))
+
+    genre = ', '.join(final_list)
+    genre = EMPTY_COMMAS_RE.sub(', ', genre)
+    return genre.strip(' ,')
+
+
+CLEANERS = {
+    'title': clean_title,
+    'genre': clean_genre,
+    'director': clean_director,
+    'country': clean_country,
+    'year': clean_year,
+}
+
+
+def clean_item(raw):
+    """Почистить поля одного сырого item; остальные поля копируются как есть"""
+    item = dict(raw)
+    for field, cleaner in CLEANERS.items():
+        if field in raw:
+            item[field] = cleaner(raw[field])
+    return item
+
+
+def clean_items(raw_items):
+    """Почистить пачку сырых items (списки токенов из инфобокса)"""
+    return [clean_item(raw) for raw in raw_items]
+
+
+def split_row(row):
+    """Строку CSV (поля уже склеены через запятую) вернуть к спискам токенов"""
+    raw = dict(row)
+    for field in ('director', 'country'):
+        if raw.get(field) is not None:
+            raw[field] = raw[field].split(',')
+    return raw
+
+
+def reclean_csv(src, dst):
+    """Перечистить готовый CSV текущими правилами очистки; вернуть число строк"""
+    count = 0
+    with open(src, newline='', encoding='utf-8') as fin, \
+            open(dst, 'w', newline='', encoding='utf-8') as fout:
+        reader = csv.DictReader(fin)
+        writer = csv.DictWriter(fout, fieldnames=reader.fieldnames)
+        writer.writeheader()
+        for row in reader:
+            writer.writerow(clean_item(split_row(row)))
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('usage: python -m movies_parser.cleaning SRC.csv DST.csv')
+    print('%d rows' % reclean_csv(sys.argv[1], sys.argv[2]))
@@ -0,0 +1,105 @@
+# Identity index for DedupPipeline
+#
+# The same film reaches the pipeline through several category pages and
+# redirect/alias URLs. An item is identified by any of its stable keys:
+# the Wikipedia page id, the IMDb tt-ID and the normalized (title, year).
+# Two items sharing a page id or a tt-ID are the same film. The title key is
+# weaker: it exists only when the year is known (the normalized title drops
+# the "(фильм, ...)" disambiguation), and it matches only items whose page
+# ids and tt-IDs do not contradict each other, so two different films of
+# the same name and year are both kept.
+#
+# The DEDUP_MAX_ENTRIES most recent keys point at the first item seen for
+# the film, so later duplicates can fill in its missing fields. Older keys
+# are moved into a Bloom filter: duplicates of those films are still dropped
+# but no longer merged, which keeps memory bounded on any crawl size. An
+# evicted title key can't be checked against the IDs, so it only drops items
+# that have neither a page id nor a tt-ID.
+
+import hashlib
+import re
+from collections import OrderedDict
+
+from itemadapter import ItemAdapter
+
+from movies_parser.seen import BloomSeenStore
+
+DISAMBIGUATION_RE = re.compile(r'\s*\([^)]*\)\s*$')
+SPACES_RE = re.compile(r'\s+')
+YEAR_RE = re.compile(r'\d{4}')
+
+
+def normalize_title(title):
+    """Название без уточнения «(фильм, 1979)», в нижнем регистре, ё -> е"""
+    title = DISAMBIGUATION_RE.sub('', title or '')
+    title = SPACES_RE.sub(' ', title).strip().casefold().replace('ё', 'е')
+    return title.strip('«»"\'')
+
+
+def hash_key(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def strong_ids(item):
+    """(page id, tt-ID) item в виде строк, '' — если нет"""
+    return str(item.get('page_id') or ''), str(item.get('imdb_id') or '')
+
+
+def ids_conflict(a, b):
+    """У двух записей разные page id или разные tt-ID"""
+    return any(x and y and x != y for x, y in zip(a, b))
+
+
+def identity_keys(item):
+    """Ключи, по которым item можно узнать: (page id и tt-ID, название с годом или None)"""
+    strong = []
+    if item.get('page_id'):
+        strong.append(hash_key('page:%s' % item['page_id']))
+    if item.get('imdb_id'):
+        strong.append(hash_key('imdb:%s' % item['imdb_id']))
+    title = normalize_title(item.get('title'))
+    years = YEAR_RE.findall(str(item.get('year') or ''))
+    # Без года «Мама (фильм)» и «Мама» совпали бы
+    title_key = hash_key('title:%s:%s' % (title, min(years))) if title and years else None
+    return strong, title_key
+
+
+class IdentityIndex:
+    """LRU ключ -> первый item фильма, вытесненные ключи — в фильтр Блума"""
+
+    def __init__(self, max_entries=200000, capacity=1000000, error_rate=0.001):
+        self.max_entries = max_entries
+        self.recent = OrderedDict()
+        self.evicted = BloomSeenStore(capacity=capacity, error_rate=error_rate)
+
+    def find(self, keys, ids=('', '')):
+        """Вернуть (известен ли фильм, его первый item или None, если он уже вытеснен);
+        keys — из identity_keys, ids — strong_ids того же item"""
+        strong, title_key = keys
+        known = False
+        for key in strong:
+            record = self.recent.get(key)
+            if record is not None:
+                self.recent.move_to_end(key)
+                return True, record
+            if key in self.evicted:
+                known = True
+        if title_key is not None:
+            record = self.recent.get(title_key)
+            if record is not None:
+                # Тёзка того же года с другим page id или tt-ID — другой фильм
+                if not ids_conflict(ids, strong_ids(ItemAdapter(record))):
+                    self.recent.move_to_end(title_key)
+                    return True, record
+            elif title_key in self.evicted and not any(ids):
+                known = True
+        return known, None
+
+    def add(self, keys, record):
+        strong, title_key = keys
+        for key in strong + ([title_key] if title_key is not None else []):
+            self.recent[key] = record
+            self.recent.move_to_end(key)
+        while len(self.recent) > self.max_entries:
+            key, _ = self.recent.popitem(last=False)
+            self.evicted.add(key)
@@ -0,0 +1,502 @@
+# Distributed crawl: several MoviesSpider processes share one frontier
+#
+# With DISTRIBUTED_ENABLED the spider no longer keeps its own queue and
+# visited set. Links go to a shared backend, which adds each page once
+# (visited) and queues it, and every worker claims URLs from it as its
+# downloader frees up. A claimed page stays in the backend until the worker
+# has queued the links found on it; pages claimed by a worker that died are
+# handed out again after DISTRIBUTED_LEASE seconds. A worker stops when the
+# backend has no queued or claimed pages left.
+#
+# Backends (DISTRIBUTED_BACKEND):
+#   - SqliteSharedFrontier: a SQLite file at DISTRIBUTED_PATH, for workers
+#     on one machine (SQLite locking serializes the writers)
+#   - RedisSharedFrontier: any Redis-compatible server at
+#     DISTRIBUTED_REDIS_URL, for several machines; needs the redis package
+#
+# Every worker writes its items to its own shard of OUTPUT_PATH
+# (movies_output.<worker>.csv). The launcher starts the workers on one
+# machine and merges the shards at the end, dropping films that reached
+# two workers. The merge sorts each shard into a run file (an external sort
+# in chunks of 100000 rows) and k-way merges the runs, so its memory is one
+# chunk plus the bounded dedup index (DEDUP_MAX_ENTRIES), not the whole
+# output:
+#
+#     python -m movies_parser.distributed run -w 4 [-s NAME=VALUE ...]
+#     python -m movies_parser.distributed reset   # before starting workers by hand
+#     python -m movies_parser.distributed merge -o movies_output.csv movies_output.*.csv
+
+import argparse
+import csv
+import glob
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import get_project_settings
+
+from movies_parser.dedup import IdentityIndex, identity_keys, normalize_title, strong_ids
+from movies_parser.exporters import make_writer, output_path, pyarrow
+from movies_parser.items import FIELDS, Movie, is_empty
+from movies_parser.seen import to_signed
+
+
+# Файлы, которые у каждого воркера на одной машине должны быть свои: SQLite-хранилища
+# держат транзакцию записи открытой, второй процесс на том же файле получит database is locked.
+# Страницы между воркерами каждый раз делятся по-новому, так что seen/инкрементальное
+# хранилище/кэш воркера помогают меньше, чем у одного процесса
+WORKER_FILE_SETTINGS = ('FRONTIER_STORE_PATH', 'METRICS_DUMP_PATH', 'SEEN_STORE_PATH', 'INCREMENTAL_STORE_PATH',
+                        'RESPONSE_CACHE_PATH')
+
+
+def worker_id(settings):
+    """Имя воркера: DISTRIBUTED_WORKER или хост-pid"""
+    return settings.get('DISTRIBUTED_WORKER') or '%s-%d' % (socket.gethostname(), os.getpid())
+
+
+def worker_overrides(settings, worker, index, names=WORKER_FILE_SETTINGS):
+    """-s опции процесса-воркера: свои файлы и METRICS_PORT + index"""
+    overrides = []
+    for name in names:
+        if settings.get(name):
+            overrides += ['-s', '%s=%s' % (name, shard_path(settings.get(name), worker))]
+    port = settings.getint('METRICS_PORT')
+    if port:
+        overrides += ['-s', 'METRICS_PORT=%d' % (port + index)]
+    return overrides
+
+
+def url_key(url):
+    """Ключ по полному URL: у продолжений категории (?pagefrom=...) page_key тот же, что у первой страницы"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def shard_path(path, worker):
+    """movies_output.csv -> movies_output.<worker>.csv"""
+    root, ext = os.path.splitext(path)
+    return '%s.%s%s' % (root, worker, ext)
+
+
+class SharedFrontier:
+    """Общий для воркеров фронтир: visited + очередь + выданные воркерам страницы"""
+
+    @classmethod
+    def from_settings(cls, settings):
+        raise NotImplementedError
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls.from_settings(crawler.settings)
+
+    def reset(self):
+        """Очистить всё перед новым краулом"""
+        raise NotImplementedError
+
+    def add(self, entries):
+        """Поставить в очередь [(ключ страницы, url)], которых ещё не было; вернуть сколько добавлено"""
+        raise NotImplementedError
+
+    def claim(self, worker, count):
+        """Выдать воркеру до count страниц: [(id, url)]"""
+        raise NotImplementedError
+
+    def done(self, ids):
+        """Страницы обработаны, их ссылки уже в очереди"""
+        raise NotImplementedError
+
+    def pending(self):
+        """Сколько страниц ждёт в очереди или обрабатывается воркерами"""
+        raise NotImplementedError
+
+    def requeue_stale(self, lease):
+        """Вернуть в очередь страницы, выданные больше lease секунд назад; вернуть их число"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SqliteSharedFrontier(SharedFrontier):
+    """Фронтир в SQLite-файле; каждая операция — одна короткая транзакция"""
+
+    def __init__(self, path, timeout=60.0):
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS frontier ('
+                        'id INTEGER PRIMARY KEY, url TEXT NOT NULL, worker TEXT, claimed REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS frontier_worker ON frontier (worker, id)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS visited (key INTEGER PRIMARY KEY) WITHOUT ROWID')
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get('DISTRIBUTED_PATH', 'movies_shared.db'))
+
+    def transaction(self, func, *args):
+        # BEGIN IMMEDIATE сразу берёт блокировку записи: два воркера не выдадут одну страницу дважды
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(*args)
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+        return result
+
+    def reset(self):
+        self.transaction(lambda: (self.db.execute('DELETE FROM frontier'), self.db.execute('DELETE FROM visited')))
+
+    def _add(self, entries):
+        added = 0
+        for key, url in entries:
+            if self.db.execute('INSERT OR IGNORE INTO visited (key) VALUES (?)', (to_signed(key),)).rowcount:
+                self.db.execute('INSERT INTO frontier (url) VALUES (?)', (url,))
+                added += 1
+        return added
+
+    def add(self, entries):
+        return self.transaction(self._add, entries) if entries else 0
+
+    def _claim(self, worker, count):
+        rows = self.db.execute('SELECT id, url FROM frontier WHERE worker IS NULL ORDER BY id LIMIT ?',
+                               (count,)).fetchall()
+        if rows:
+            self.db.executemany('UPDATE frontier SET worker = ?, claimed = ? WHERE id = ?',
+                                ((worker, time.time(), row_id) for row_id, _ in rows))
+        return rows
+
+    def claim(self, worker, count):
+        return self.transaction(self._claim, worker, count) if count > 0 else []
+
+    def done(self, ids):
+        if ids:
+            self.transaction(lambda: self.db.executemany('DELETE FROM frontier WHERE id = ?',
+                                                         ((row_id,) for row_id in ids)))
+
+    def pending(self):
+        return self.db.execute('SELECT COUNT(*) FROM frontier').fetchone()[0]
+
+    def requeue_stale(self, lease):
+        return self.db.execute('UPDATE frontier SET worker = NULL, claimed = NULL '
+                               'WHERE worker IS NOT NULL AND claimed < ?', (time.time() - lease,)).rowcount
+
+    def close(self):
+        self.db.close()
+
+
+class RedisSharedFrontier(SharedFrontier):
+    """Фронтир в Redis: множество visited, список-очередь и хеш выданных страниц url -> "воркер время" """
+
+    # Добавить только новые ключи и поставить их URL в очередь
+    ADD_SCRIPT = """
+local added = 0
+for i = 1, #ARGV, 2 do
+  if redis.call('SADD', KEYS[1], ARGV[i]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[i + 1])
+    added = added + 1
+  end
+end
+return added
+"""
+    # Снять URL с головы очереди и записать их за воркером одним атомарным шагом
+    CLAIM_SCRIPT = """
+local urls = redis.call('LPOP', KEYS[1], ARGV[1])
+if not urls then return {} end
+for _, url in ipairs(urls) do redis.call('HSET', KEYS[2], url, ARGV[2]) end
+return urls
+"""
+
+    def __init__(self, url, prefix='movies:frontier:'):
+        if redis is None:
+            raise ValueError('RedisSharedFrontier needs the redis package')
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.visited_key = prefix + 'visited'
+        self.queue_key = prefix + 'queue'
+        self.claims_key = prefix + 'claims'
+        self.add_script = self.redis.register_script(self.ADD_SCRIPT)
+        self.claim_script = self.redis.register_script(self.CLAIM_SCRIPT)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get('DISTRIBUTED_REDIS_URL', 'redis://localhost:6379/0'))
+
+    def reset(self):
+        self.redis.delete(self.visited_key, self.queue_key, self.claims_key)
+
+    def add(self, entries):
+        if not entries:
+            return 0
+        args = []
+        for key, url in entries:
+            args += [key, url]
+        return self.add_script(keys=[self.visited_key, self.queue_key], args=args)
+
+    def claim(self, worker, count):
+        if count <= 0:
+            return []
+        urls = self.claim_script(keys=[self.queue_key, self.claims_key], args=[count, '%s %f' % (worker, time.time())])
+        # id выданной страницы — сам URL
+        return [(url, url) for url in urls]
+
+    def done(self, ids):
+        if ids:
+            self.redis.hdel(self.claims_key, *ids)
+
+    def pending(self):
+        pipe = self.redis.pipeline()
+        pipe.llen(self.queue_key)
+        pipe.hlen(self.claims_key)
+        return sum(pipe.execute())
+
+    def requeue_stale(self, lease):
+        deadline = time.time() - lease
+        requeued = 0
+        for url, claim in self.redis.hgetall(self.claims_key).items():
+            if float(claim.rsplit(' ', 1)[1]) < deadline and self.redis.hdel(self.claims_key, url):
+                # hdel вернёт 1 только одному воркеру — в очередь URL попадёт один раз
+                self.redis.rpush(self.queue_key, url)
+                requeued += 1
+        return requeued
+
+    def close(self):
+        self.redis.close()
+
+
+def shard_files(path, workers):
+    """Файлы шардов воркеров, с частями ротации и .gz"""
+    files = []
+    for worker in workers:
+        root, ext = os.path.splitext(shard_path(path, worker))
+        files += sorted(set(glob.glob(root + ext + '*') + glob.glob(root + '.[0-9]*' + ext + '*')))
+    return files
+
+
+def read_rows(path):
+    """Строки шарда как словари, по расширению файла: csv, jsonl, parquet (.gz для текстовых)"""
+    name = path[:-len('.gz')] if path.endswith('.gz') else path
+    if name.endswith('.parquet'):
+        if pyarrow is None:
+            raise ValueError('reading parquet shards needs the pyarrow package')
+        yield from pyarrow.parquet.read_table(path).to_pylist()
+        return
+    raw = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+    with io.TextIOWrapper(raw, encoding='utf-8', newline='') as f:
+        if name.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def merge_key(movie):
+    """Порядок строк в итоговом файле: год выхода, название"""
+    return movie.release_year or 0, normalize_title(movie.title), movie.title or ''
+
+
+def write_run(movies, path):
+    """Отсортировать movies и записать run-файл (JSON Lines, строка — Movie.to_row)"""
+    movies.sort(key=merge_key)
+    with open(path, 'w', encoding='utf-8') as f:
+        for movie in movies:
+            f.write(json.dumps(movie.to_row(), ensure_ascii=False) + '\n')
+    return path
+
+
+def sort_partition(paths, run_path, chunk_rows=100000):
+    """Отсортировать выход шарда в run-файл внешней сортировкой: куски по chunk_rows строк
+    сортируются в памяти, затем сливаются; вернуть число строк"""
+    chunks = []
+    movies = []
+    rows = 0
+    try:
+        for path in paths:
+            for row in read_rows(path):
+                movies.append(Movie.from_row(row))
+                rows += 1
+                if len(movies) >= chunk_rows:
+                    chunks.append(write_run(movies, '%s.%d' % (run_path, len(chunks))))
+                    movies = []
+        if not chunks:
+            write_run(movies, run_path)
+            return rows
+        if movies:
+            chunks.append(write_run(movies, '%s.%d' % (run_path, len(chunks))))
+        movies = None
+        with open(run_path, 'w', encoding='utf-8') as f:
+            for movie in heapq.merge(*(read_run(path) for path in chunks), key=merge_key):
+                f.write(json.dumps(movie.to_row(), ensure_ascii=False) + '\n')
+        return rows
+    finally:
+        for path in chunks:
+            os.remove(path)
+
+
+def read_run(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield Movie.from_cleaned(*json.loads(line))
+
+
+def merge_runs(run_paths, output, fmt, fields, compression=None, layout='flat', batch_size=1000,
+               max_entries=200000):
+    """k-way слияние отсортированных run-файлов в один вывод; вернуть (строк, повторов)"""
+    writer = make_writer(fmt, output, fields, compression=compression, layout=layout)
+    index = IdentityIndex(max_entries)
+    nested = layout == 'nested'
+    rows = duplicates = 0
+    batch = []
+    # Записи текущего пакета по id(): в уже записанные поля дописать нельзя
+    pending = {}
+    for movie in heapq.merge(*(read_run(path) for path in run_paths), key=merge_key):
+        flat = movie.to_flat()
+        keys = identity_keys(flat)
+        known, first = index.find(keys, strong_ids(flat))
+        if known:
+            duplicates += 1
+            # Недостающие поля дописываем в первую запись, пока она не ушла на диск
+            if first is not None and id(first) in pending:
+                for field in FIELDS:
+                    value = getattr(movie, field)
+                    if not is_empty(value) and is_empty(getattr(first, field)):
+                        setattr(first, field, value)
+            if first is not None:
+                index.add(keys, first)
+            continue
+        index.add(keys, movie)
+        batch.append(movie)
+        pending[id(movie)] = movie
+        rows += 1
+        if len(batch) >= batch_size:
+            writer.write_batch([m.to_nested(fields) if nested else m.to_row(fields) for m in batch])
+            batch = []
+            pending = {}
+    if batch:
+        writer.write_batch([m.to_nested(fields) if nested else m.to_row(fields) for m in batch])
+    writer.close()
+    return rows, duplicates
+
+
+def run_path(output, name):
+    return os.path.splitext(shard_path(output, name))[0] + '.sorted.jsonl'
+
+
+def merge_shards(paths, output, fmt, fields, compression=None, batch_size=1000, layout='flat',
+                 max_entries=200000):
+    """Склеить шарды в один файл, отбросив повторы фильмов между воркерами
+    (как DedupPipeline: недостающие поля дописываются в первую запись); вернуть (строк, повторов).
+    Каждый шард сортируется в свой run-файл, дальше — потоковое слияние с ограниченным индексом"""
+    runs = []
+    try:
+        for i, path in enumerate(paths):
+            runs.append(run_path(output, '%d' % i))
+            sort_partition([path], runs[-1])
+        return merge_runs(runs, output, fmt, fields, compression, layout, batch_size, max_entries)
+    finally:
+        for path in runs:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def apply_overrides(settings, pairs):
+    for pair in pairs:
+        name, _, value = pair.partition('=')
+        settings.set(name, value, priority='cmdline')
+
+
+def reset_backend(settings):
+    backend = load_object(settings.get('DISTRIBUTED_BACKEND')).from_settings(settings)
+    backend.reset()
+    backend.close()
+
+
+def reset(args):
+    settings = get_project_settings()
+    apply_overrides(settings, args.set)
+    reset_backend(settings)
+    print('shared frontier emptied: %s' % settings.get('DISTRIBUTED_BACKEND'))
+    return 0
+
+
+def run(args):
+    settings = get_project_settings()
+    apply_overrides(settings, args.set)
+    reset_backend(settings)
+
+    workers = ['w%d' % i for i in range(args.workers)]
+    output = output_path(settings)
+    start = time.monotonic()
+    processes = []
+    for worker in workers:
+        command = [sys.executable, '-m', 'scrapy', 'crawl', args.spider,
+                   '-s', 'DISTRIBUTED_ENABLED=1', '-s', 'DISTRIBUTED_WORKER=' + worker]
+        for pair in args.set:
+            command += ['-s', pair]
+        command += worker_overrides(settings, worker, len(processes))
+        processes.append(subprocess.Popen(command))
+    failed = [worker for worker, process in zip(workers, processes) if process.wait() != 0]
+    elapsed = time.monotonic() - start
+
+    fields = settings.getlist('OUTPUT_FIELDS')
+    shards = shard_files(output, workers)
+    rows, duplicates = merge_shards(shards, output, settings.get('OUTPUT_FORMAT', 'csv'), fields,
+                                    settings.get('OUTPUT_COMPRESSION'),
+                                    layout=settings.get('OUTPUT_LAYOUT', 'flat'),
+                                    max_entries=settings.getint('DEDUP_MAX_ENTRIES', 200000))
+    if not args.keep_shards:
+        for path in shards:
+            os.remove(path)
+    print('%d workers: %d films (%d duplicates across shards) in %.1fs, %.1f films/sec -> %s' % (
+        len(workers), rows, duplicates, elapsed, rows / elapsed if elapsed else 0.0, output))
+    if failed:
+        print('workers failed: %s' % ', '.join(failed))
+        return 1
+    return 0
+
+
+def merge(args):
+    settings = get_project_settings()
+    apply_overrides(settings, args.set)
+    output = args.output or output_path(settings)
+    rows, duplicates = merge_shards(args.shards, output, settings.get('OUTPUT_FORMAT', 'csv'),
+                                    settings.getlist('OUTPUT_FIELDS'), settings.get('OUTPUT_COMPRESSION'),
+                                    layout=settings.get('OUTPUT_LAYOUT', 'flat'),
+                                    max_entries=settings.getint('DEDUP_MAX_ENTRIES', 200000))
+    print('%d films (%d duplicates across shards) -> %s' % (rows, duplicates, output))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Distributed crawl with a shared frontier')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run N workers on this machine and merge their shards')
+    run_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    run_parser.add_argument('--spider', default='movies')
+    run_parser.add_argument('--keep-shards', action='store_true')
+    merge_parser = commands.add_parser('merge', help='merge worker shards into one output file')
+    merge_parser.add_argument('shards', nargs='+')
+    merge_parser.add_argument('-o', '--output', help='OUTPUT_PATH')
+    reset_parser = commands.add_parser('reset', help='empty the shared frontier before a multi-node crawl')
+    for sub in (run_parser, merge_parser, reset_parser):
+        sub.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+                         help='override a project setting')
+    args = parser.parse_args(argv)
+    return {'run': run, 'merge': merge, 'reset': reset}[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# Offline ingestion from a ruwiki XML dump
+#
+# Reads ruwiki-YYYYMMDD-pages-articles-multistream.xml.bz2 instead of
+# crawling. A multistream dump is a concatenation of independent bz2
+# streams of ~100 pages each, and the companion
+# ...-multistream-index.txt.bz2 lists "offset:page_id:title" for every
+# page, so the stream offsets split the file into chunks that can be
+# decompressed and parsed independently. The chunks are spread over a
+# process pool; every worker reads its byte range, decompresses it, keeps
+# the articles (ns 0, no redirects) in a film category
+# (DUMP_CATEGORY_PATTERN), extracts the infobox from the wikitext with the
+# same WikitextInfobox as the API spider and cleans the values with
+# movies_parser.cleaning. The items go through the project's
+# ITEM_PIPELINES in the main process, as in movies_parser.reextract.
+#
+#     python -m movies_parser.dump ruwiki-latest-pages-articles-multistream.xml.bz2 -o movies_dump.csv -w 8
+#
+# The index is looked up next to the dump (…-multistream-index.txt.bz2) or
+# given with --index. IMDb ratings can't be chained from a dump; use
+# -s IMDB_ENRICHMENT=dataset -s IMDB_RATINGS_PATH=title.ratings.tsv.gz.
+
+import argparse
+import bz2
+import multiprocessing
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+from scrapy.utils.log import configure_logging
+from scrapy.utils.project import get_project_settings
+
+from movies_parser import cleaning
+from movies_parser.enrichment import imdb_id
+from movies_parser.items import Movie
+from movies_parser.reextract import OfflinePipelines
+from movies_parser.wikitext import WikitextInfobox
+
+CATEGORY_RE = re.compile(r'\[\[\s*(?:Категория|Category)\s*:\s*([^\]|]+)', re.I)
+DEFAULT_CATEGORY_PATTERN = r'фильмы\b.*\b\d{4} года'
+
+_wikitext = None
+_category_re = None
+
+
+def index_path(dump_path):
+    """Индекс рядом с дампом: …-multistream.xml.bz2 -> …-multistream-index.txt.bz2"""
+    if not dump_path.endswith('-multistream.xml.bz2'):
+        raise ValueError('not a multistream dump, pass --index: %s' % dump_path)
+    return dump_path[:-len('.xml.bz2')] + '-index.txt.bz2'
+
+
+def read_offsets(path):
+    """Смещения начала bz2-потоков по индексу (строки "offset:page_id:title"), по возрастанию"""
+    offsets = set()
+    opener = bz2.open if path.endswith('.bz2') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            offset, _, _ = line.partition(':')
+            if offset:
+                offsets.add(int(offset))
+    return sorted(offsets)
+
+
+def iter_chunks(dump_path, offsets):
+    """Куски дампа (путь, начало, конец): от начала потока до начала следующего"""
+    size = os.path.getsize(dump_path)
+    # Первый поток — заголовок <mediawiki><siteinfo>, в индексе его нет
+    bounds = ([0] if not offsets or offsets[0] else []) + list(offsets) + [size]
+    for start, end in zip(bounds, bounds[1:]):
+        if end > start:
+            yield dump_path, start, end
+
+
+def iter_pages(text):
+    """Элементы <page>…</page> из распакованного куска"""
+    start = text.find('<page>')
+    while start != -1:
+        end = text.find('</page>', start)
+        if end == -1:
+            return
+        end += len('</page>')
+        yield text[start:end]
+        start = text.find('<page>', end)
+
+
+def init_worker(fields, category_pattern):
+    global _wikitext, _category_re
+    _wikitext = WikitextInfobox(fields)
+    _category_re = re.compile(category_pattern, re.I)
+
+
+def extract_page(xml):
+    """Очищенные поля фильма из <page> дампа; None, если это не статья о фильме"""
+    # Дешёвые проверки по сырому XML до разбора: редиректы и статьи вне категорий фильмов
+    if '<redirect' in xml:
+        return None
+    if not any(_category_re.search(category) for category in CATEGORY_RE.findall(xml)):
+        return None
+    page = ElementTree.fromstring(xml)
+    if page.findtext('ns') != '0':
+        return None
+    title = page.findtext('title')
+    infobox = _wikitext.extract(page.findtext('revision/text') or '', title)
+    if not infobox:
+        return None
+    return {
+        'title': cleaning.clean_title(infobox['title']),
+        'genre': cleaning.clean_genre(infobox['genre']),
+        'director': cleaning.clean_director(infobox['director']),
+        'country': cleaning.clean_country(infobox['country']),
+        'year': cleaning.clean_year(infobox['year']),
+        'imdb': None,
+        'imdb_id': imdb_id(infobox['imdb_link']),
+        'page_id': int(page.findtext('id')),
+    }
+
+
+def extract_chunk(chunk):
+    """Воркер: (страниц в куске, [items]) для одного bz2-потока"""
+    path, start, end = chunk
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    text = bz2.decompress(data).decode('utf-8')
+    pages = 0
+    items = []
+    for xml in iter_pages(text):
+        pages += 1
+        item = extract_page(xml)
+        if item is not None:
+            items.append(item)
+    return pages, items
+
+
+def ingest(dump_path, settings, index=None, workers=None):
+    """Разобрать дамп на workers процессах и прогнать фильмы через пайплайны; вернуть stats"""
+    offsets = read_offsets(index or index_path(dump_path))
+    chunks = list(iter_chunks(dump_path, offsets))
+    pipelines = OfflinePipelines(settings)
+    pipelines.open()
+    start = time.monotonic()
+    pages = 0
+    fields = settings.getdict('INFOBOX_FIELDS') or None
+    pattern = settings.get('DUMP_CATEGORY_PATTERN') or DEFAULT_CATEGORY_PATTERN
+    with multiprocessing.Pool(workers or os.cpu_count(), initializer=init_worker,
+                              initargs=(fields, pattern)) as pool:
+        for chunk_pages, items in pool.imap_unordered(extract_chunk, chunks):
+            pages += chunk_pages
+            for item in items:
+                # Movie собираем здесь: так жанры и страны делят один словарь на весь процесс
+                pipelines.process(Movie.from_row(item))
+    pipelines.close()
+    elapsed = time.monotonic() - start
+    stats = pipelines.stats.get_stats()
+    stats['dump/streams'] = len(chunks)
+    stats['dump/pages'] = pages
+    stats['dump/bytes'] = os.path.getsize(dump_path)
+    stats['elapsed_time_seconds'] = elapsed
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract films from a ruwiki multistream XML dump')
+    parser.add_argument('dump', help='…-pages-articles-multistream.xml.bz2')
+    parser.add_argument('--index', help='…-multistream-index.txt.bz2 (default: next to the dump)')
+    parser.add_argument('-o', '--output', help='OUTPUT_PATH')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='override a project setting')
+    args = parser.parse_args(argv)
+
+    settings = get_project_settings()
+    for pair in args.set:
+        name, _, value = pair.partition('=')
+        settings.set(name, value, priority='cmdline')
+    if args.output:
+        settings.set('OUTPUT_PATH', args.output, priority='cmdline')
+    configure_logging(settings)
+
+    stats = ingest(args.dump, settings, args.index, args.workers)
+    elapsed = stats['elapsed_time_seconds']
+    print('%d streams, %d pages, %d items, %d dropped in %.2fs (%.1f pages/sec, %.1f MB/s compressed)' % (
+        stats['dump/streams'], stats['dump/pages'], stats.get('item_scraped_count', 0),
+        stats.get('item_dropped_count', 0), elapsed, stats['dump/pages'] / elapsed if elapsed else 0.0,
+        stats['dump/bytes'] / elapsed / 2 ** 20 if elapsed else 0.0))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# IMDb rating enrichment from the IMDb ratings dataset
+#
+# Instead of chaining one IMDb request per film, the spider can emit
+# Wikipedia items right away with their tt-ID (IMDB_ENRICHMENT = "dataset")
+# and ImdbRatingsPipeline fills the `imdb` column from title.ratings.tsv.gz
+# (https://datasets.imdbws.com/). The dataset is loaded into two parallel
+# arrays sorted by numeric tt-ID (about 6 bytes per title) and cached next
+# to the dataset as a binary index, so later runs load it almost instantly.
+#
+# Existing CSV files can be enriched offline:
+#
+#     python -m movies_parser.enrichment title.ratings.tsv.gz movies_output.csv movies_rated.csv
+
+import csv
+import gzip
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left
+
+IMDB_ID_RE = re.compile(r'tt(\d+)')
+
+
+def imdb_id(link):
+    """tt-ID из ссылки на страницу фильма IMDb"""
+    match = IMDB_ID_RE.search(link or '')
+    return match.group(0) if match else None
+
+
+class RatingsIndex:
+    """Рейтинги IMDb: отсортированные массивы номеров tt-ID и рейтингов * 10"""
+
+    def __init__(self, ids, ratings):
+        self.ids = ids
+        self.ratings = ratings
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, tt):
+        """Рейтинг по tt-ID ('tt0282599') или None"""
+        match = IMDB_ID_RE.fullmatch(tt or '')
+        if not match:
+            return None
+        number = int(match.group(1))
+        pos = bisect_left(self.ids, number)
+        if pos < len(self.ids) and self.ids[pos] == number:
+            return self.ratings[pos] / 10
+        return None
+
+    @classmethod
+    def from_tsv(cls, path):
+        ids, ratings = array('I'), array('H')
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            next(f)  # tconst, averageRating, numVotes
+            for line in f:
+                tconst, rating, _ = line.split('\t', 2)
+                ids.append(int(tconst[2:]))
+                ratings.append(round(float(rating) * 10))
+        # Датасет отсортирован по tconst, но полагаться на это не будем
+        if any(ids[i] > ids[i + 1] for i in range(len(ids) - 1)):
+            order = sorted(range(len(ids)), key=ids.__getitem__)
+            ids = array('I', (ids[i] for i in order))
+            ratings = array('H', (ratings[i] for i in order))
+        return cls(ids, ratings)
+
+    @classmethod
+    def load(cls, path):
+        """Загрузить датасет, используя бинарный кэш <path>.idx, если он свежее"""
+        cache = path + '.idx'
+        if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+            try:
+                return cls.from_cache(cache)
+            except EOFError:
+                # Кэш обрезан (например, запись прервали) — пересоберём его из датасета
+                pass
+
+        index = cls.from_tsv(path)
+        index.write_cache(cache)
+        return index
+
+    @classmethod
+    def from_cache(cls, cache):
+        with open(cache, 'rb') as f:
+            header = f.read(8)
+            if len(header) < 8:
+                raise EOFError('truncated ratings cache header')
+            count = int.from_bytes(header, 'little')
+            ids, ratings = array('I'), array('H')
+            ids.fromfile(f, count)
+            ratings.fromfile(f, count)
+        return cls(ids, ratings)
+
+    def write_cache(self, cache):
+        # Пишем во временный файл и подменяем целиком: другой процесс не увидит полузаписанный кэш
+        tmp = '%s.%d.tmp' % (cache, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(len(self).to_bytes(8, 'little'))
+            self.ids.tofile(f)
+            self.ratings.tofile(f)
+        os.replace(tmp, cache)
+
+
+def enrich_csv(ratings_path, src, dst):
+    """Заполнить колонку imdb в готовом CSV по колонке imdb_id; вернуть число найденных рейтингов"""
+    index = RatingsIndex.load(ratings_path)
+    found = 0
+    with open(src, newline='', encoding='utf-8') as fin, \
+            open(dst, 'w', newline='', encoding='utf-8') as fout:
+        reader = csv.DictReader(fin)
+        fields = list(reader.fieldnames)
+        for field in ('imdb', 'imdb_id'):
+            if field not in fields:
+                fields.append(field)
+        writer = csv.DictWriter(fout, fieldnames=fields)
+        writer.writeheader()
+        for row in reader:
+            rating = index.get(row.get('imdb_id'))
+            if rating is not None:
+                row['imdb'] = rating
+                found += 1
+            writer.writerow(row)
+    return found
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        sys.exit('usage: python -m movies_parser.enrichment RATINGS.tsv.gz SRC.csv DST.csv')
+    print('%d ratings filled' % enrich_csv(*sys.argv[1:]))
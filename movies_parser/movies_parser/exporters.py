@@ -0,0 +1,280 @@
+# Batch writers for MoviesParserPipeline
+#
+# Each writer takes whole batches of rows (lists of values in OUTPUT_FIELDS
+# order) and rotates to a new part file once the current one grows past
+# OUTPUT_ROTATE_BYTES: movies_output.csv -> movies_output.00000.csv, ...
+#
+#   csv     - the classic movies_output.csv, optionally gzip-compressed
+#   jsonl   - one JSON object per line, optionally gzip-compressed
+#   parquet - Arrow/Parquet with dictionary-encoded genre/country columns,
+#             needs the optional pyarrow package
+#
+# An OUTPUT_PATH ending in another format's extension gets the extension of
+# OUTPUT_FORMAT (output_path): with OUTPUT_FORMAT = "parquet" the default
+# movies_output.csv becomes movies_output.parquet. OUTPUT_COMPRESSION is
+# "gzip" or nothing for csv/jsonl; anything else is an error.
+#
+# The row values depend on OUTPUT_LAYOUT (see movies_parser.items):
+#
+#   flat   - strings, lists joined with ", " as in the CSV
+#   nested - lists and numbers (Movie.to_nested): JSON arrays in jsonl, and
+#            in Parquet list<string> genre/director/country columns,
+#            list<int16> year, float64 imdb and int64 page_id. CSV has no
+#            place for lists and is flat only.
+#
+# sync() makes everything written so far durable and returns the writer
+# state; resume(state) continues a file from that point after a crash (the
+# crawl checkpoint, movies_parser.checkpoint). Text files are cut back to
+# the synced length, gzip files end a gzip member on every sync (a
+# multi-member file reads as one stream), and Parquet, which can't be
+# appended to, closes the part on every sync and continues in a new one.
+
+import csv
+import gzip
+import io
+import json
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Колонки с маленьким словарём значений храним словарём в Parquet/Arrow
+DICTIONARY_FIELDS = frozenset(['genre', 'country'])
+LAYOUTS = ('flat', 'nested')
+
+
+class BatchWriter:
+    extension = ''
+
+    def __init__(self, path, fields, compression=None, rotate_bytes=0, layout='flat'):
+        self.path = path
+        self.fields = list(fields)
+        self.compression = compression or None
+        self.rotate_bytes = rotate_bytes
+        self.layout = layout
+        self.part = 0
+        self.paths = []
+        self.file = None
+
+    def part_path(self):
+        # Без ротации новые части появляются только после sync() у Parquet
+        if not self.rotate_bytes and not self.part:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return '%s.%05d%s' % (root, self.part, ext)
+
+    def open_part(self):
+        path = self.part_path()
+        self.paths.append(path)
+        self.part += 1
+        return path
+
+    def write_batch(self, rows):
+        if self.file is None:
+            self.open()
+        self.write_rows(rows)
+        if self.rotate_bytes and self.tell() >= self.rotate_bytes:
+            self.close()
+
+    def open(self):
+        raise NotImplementedError
+
+    def write_rows(self, rows):
+        raise NotImplementedError
+
+    def sync(self):
+        """Сбросить всё записанное на диск, вернуть состояние для resume()"""
+        raise NotImplementedError
+
+    def resume(self, state):
+        """Продолжить вывод с состояния, которое вернул sync()"""
+        self.part = state['part']
+        self.paths = list(state['paths'])
+
+    def tell(self):
+        return self.raw.tell()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.raw.close()
+            self.file = None
+
+
+class TextBatchWriter(BatchWriter):
+    """Общая часть CSV и JSON Lines: текстовый файл, при необходимости в gzip"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.compression not in (None, 'gzip'):
+            raise ValueError('%s output supports OUTPUT_COMPRESSION "gzip" only, not %r'
+                             % (self.extension[1:], self.compression))
+
+    def open(self):
+        path = self.open_part()
+        if self.compression == 'gzip':
+            path += '.gz'
+            self.paths[-1] = path
+        self.raw = open(path, 'wb')
+        self.wrap()
+        self.start()
+
+    def wrap(self):
+        stream = gzip.GzipFile(fileobj=self.raw, mode='wb') if self.compression == 'gzip' else self.raw
+        self.file = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        self.bind()
+
+    def start(self):
+        pass
+
+    def bind(self):
+        pass
+
+    def sync(self):
+        offset = None
+        if self.file is not None:
+            if self.compression == 'gzip':
+                # Закрываем gzip member (сам файл GzipFile не закрывает) и начинаем следующий
+                self.file.close()
+                offset = self.raw.tell()
+            else:
+                self.file.flush()
+                offset = self.raw.tell()
+            self.raw.flush()
+            os.fsync(self.raw.fileno())
+            if self.compression == 'gzip':
+                self.wrap()
+        return {'part': self.part, 'paths': list(self.paths), 'offset': offset}
+
+    def resume(self, state):
+        super().resume(state)
+        if state['offset'] is None:
+            return
+        # Строки, записанные после sync(), отрезаем: их страницы будут разобраны заново
+        self.raw = open(self.paths[-1], 'r+b')
+        self.raw.truncate(state['offset'])
+        self.raw.seek(state['offset'])
+        self.wrap()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            if not self.raw.closed:
+                self.raw.close()
+            self.file = None
+
+    def tell(self):
+        self.file.flush()
+        return self.raw.tell()
+
+
+class CsvBatchWriter(TextBatchWriter):
+    extension = '.csv'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.layout != 'flat':
+            raise ValueError('csv output supports OUTPUT_LAYOUT "flat" only')
+
+    def bind(self):
+        self.writer = csv.writer(self.file)
+
+    def start(self):
+        self.writer.writerow(self.fields)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+
+class JsonLinesBatchWriter(TextBatchWriter):
+    extension = '.jsonl'
+
+    def write_rows(self, rows):
+        fields = self.fields
+        self.file.write(''.join(
+            json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n' for row in rows))
+
+
+class ParquetBatchWriter(BatchWriter):
+    """Каждый пакет — отдельная row group; genre/country — dictionary-колонки"""
+
+    extension = '.parquet'
+
+    def __init__(self, *args, **kwargs):
+        if pyarrow is None:
+            raise ValueError('parquet output needs the pyarrow package')
+        super().__init__(*args, **kwargs)
+        self.schema = pyarrow.schema([(name, self.column_type(name)) for name in self.fields])
+
+    def column_type(self, name):
+        if self.layout == 'nested' and name in NESTED_TYPES:
+            return NESTED_TYPES[name]
+        if name in DICTIONARY_FIELDS:
+            return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        return pyarrow.string()
+
+    def open(self):
+        self.raw = open(self.open_part(), 'wb')
+        self.file = pyarrow.parquet.ParquetWriter(
+            self.raw, self.schema, compression=self.compression or 'snappy')
+
+    def write_rows(self, rows):
+        columns = []
+        for i, field in enumerate(self.schema):
+            if self.layout == 'nested' and field.name in NESTED_TYPES:
+                # Значения уже нужных типов (Movie.to_nested)
+                columns.append(pyarrow.array([row[i] for row in rows], type=field.type))
+                continue
+            values = [None if row[i] is None else str(row[i]) for row in rows]
+            column = pyarrow.array(values, type=pyarrow.string())
+            if field.name in DICTIONARY_FIELDS:
+                column = column.dictionary_encode()
+            columns.append(column)
+        self.file.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def sync(self):
+        # Parquet нельзя дописать: закрываем часть, следующий пакет откроет новую
+        if self.file is not None:
+            self.close()
+            # ParquetWriter мог закрыть файл сам — fsync через новый дескриптор
+            with open(self.paths[-1], 'rb') as f:
+                os.fsync(f.fileno())
+        return {'part': self.part, 'paths': list(self.paths), 'offset': None}
+
+
+# Типы колонок Parquet для OUTPUT_LAYOUT "nested"
+NESTED_TYPES = {
+    'genre': pyarrow.list_(pyarrow.string()),
+    'director': pyarrow.list_(pyarrow.string()),
+    'country': pyarrow.list_(pyarrow.string()),
+    'year': pyarrow.list_(pyarrow.int16()),
+    'imdb': pyarrow.float64(),
+    'page_id': pyarrow.int64(),
+} if pyarrow is not None else {}
+
+WRITERS = {
+    'csv': CsvBatchWriter,
+    'jsonl': JsonLinesBatchWriter,
+    'parquet': ParquetBatchWriter,
+}
+
+
+def output_path(settings):
+    """OUTPUT_PATH; расширение другого формата заменяется на расширение OUTPUT_FORMAT"""
+    path = settings.get('OUTPUT_PATH', 'movies_output.csv')
+    writer = WRITERS.get(settings.get('OUTPUT_FORMAT', 'csv'))
+    root, ext = os.path.splitext(path)
+    if writer is not None and ext != writer.extension and ext in {cls.extension for cls in WRITERS.values()}:
+        path = root + writer.extension
+    return path
+
+
+def make_writer(fmt, path, fields, compression=None, rotate_bytes=0, layout='flat'):
+    if fmt not in WRITERS:
+        raise ValueError('unknown output format: %s' % fmt)
+    if layout not in LAYOUTS:
+        raise ValueError('unknown output layout: %s' % layout)
+    return WRITERS[fmt](path, fields, compression=compression, rotate_bytes=rotate_bytes, layout=layout)
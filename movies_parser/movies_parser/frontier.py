@@ -0,0 +1,284 @@
+# Frontier storage and memory limits for MoviesSpider
+#
+# The spider keeps URLs waiting for the scheduler in `queue` and the keys of
+# pages already queued in `visited`; by default a deque and a set. With
+# FRONTIER_STORE = "disk" both live in one SQLite file (FRONTIER_STORE_PATH):
+# the queue is a table written and read in chunks of CHUNK rows, the visited
+# keys an integer primary key, so the category tree no longer has to fit in
+# memory.
+#
+# Film rows waiting for their IMDb rating (IMDB_ENRICHMENT = "chain") are
+# WikiRow tuples in PendingRows, and the IMDb request only carries the row
+# id; in disk mode the rows go to the same SQLite file.
+#
+# MemoryGovernor compares the process RSS with MEMORY_TARGET_MB and shrinks
+# the number of frontier requests handed to the Scrapy scheduler (its queue
+# is the other big in-memory structure) while the RSS stays above it.
+
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import time
+from collections import deque
+from itertools import count
+from typing import NamedTuple, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from movies_parser.seen import to_signed
+
+logger = logging.getLogger(__name__)
+
+CHUNK = 512
+
+
+class WikiRow(NamedTuple):
+    """Очищенные данные статьи, ждущие рейтинга с IMDb"""
+    title: str
+    genre: str
+    director: str
+    country: str
+    year: str
+    imdb_id: Optional[str]
+    page_id: Optional[int]
+
+
+def open_store(path):
+    """SQLite-файл фронтира; прошлое содержимое не нужно, начинаем с пустых таблиц"""
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=OFF')
+    db.execute('CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY, entry BLOB NOT NULL)')
+    db.execute('CREATE TABLE IF NOT EXISTS visited (key INTEGER PRIMARY KEY)')
+    db.execute('CREATE TABLE IF NOT EXISTS pending (id INTEGER PRIMARY KEY, row BLOB NOT NULL)')
+    for table in ('queue', 'visited', 'pending'):
+        db.execute('DELETE FROM %s' % table)
+    db.commit()
+    return db
+
+
+class DiskQueue:
+    """FIFO-очередь в таблице SQLite: append/popleft/len, как у deque.
+    Записи, уже сброшенные в таблицу (flush), подхватываются новой очередью на том же файле"""
+
+    def __init__(self, db, chunk=CHUNK):
+        self.db = db
+        self.chunk = chunk
+        # head — уже прочитанные из базы записи, tail — ещё не записанные в неё
+        self.head = deque()
+        self.tail = []
+        self.size = db.execute('SELECT COUNT(*) FROM queue').fetchone()[0]
+
+    def __len__(self):
+        return self.size
+
+    def append(self, entry):
+        self.tail.append(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        self.size += 1
+        if len(self.tail) >= self.chunk:
+            self.flush()
+
+    def popleft(self):
+        if not self.size:
+            raise IndexError('pop from an empty queue')
+        if not self.head:
+            self.refill()
+        self.size -= 1
+        return pickle.loads(self.head.popleft())
+
+    def flush(self):
+        if self.tail:
+            self.db.executemany('INSERT INTO queue (entry) VALUES (?)', ((entry,) for entry in self.tail))
+            self.db.commit()
+            self.tail = []
+
+    def refill(self):
+        self.flush()
+        rows = self.db.execute('SELECT id, entry FROM queue ORDER BY id LIMIT ?', (self.chunk,)).fetchall()
+        self.db.execute('DELETE FROM queue WHERE id <= ?', (rows[-1][0],))
+        self.head.extend(entry for _, entry in rows)
+
+    def clear(self):
+        self.db.execute('DELETE FROM queue')
+        self.db.commit()
+        self.head.clear()
+        self.tail = []
+        self.size = 0
+
+
+class DiskKeySet:
+    """Множество 64-битных ключей страниц в SQLite: in/add/len, как у set"""
+
+    def __init__(self, db, commit_every=CHUNK):
+        self.db = db
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.size = db.execute('SELECT COUNT(*) FROM visited').fetchone()[0]
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self.db.execute('SELECT 1 FROM visited WHERE key = ?', (to_signed(key),)).fetchone() is not None
+
+    def add(self, key):
+        cursor = self.db.execute('INSERT OR IGNORE INTO visited (key) VALUES (?)', (to_signed(key),))
+        self.size += cursor.rowcount
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def clear(self):
+        self.db.execute('DELETE FROM visited')
+        self.db.commit()
+        self.size = 0
+
+
+class PendingRows:
+    """Строки, ждущие ответа IMDb, по числовому id; с db — в SQLite, иначе в словаре"""
+
+    def __init__(self, db=None):
+        self.db = db
+        self.rows = {}
+        self.ids = count(1)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def put(self, row):
+        """Сохранить WikiRow, вернуть его id для meta запроса"""
+        row_id = next(self.ids)
+        if self.db is None:
+            self.rows[row_id] = tuple(row)
+        else:
+            self.db.execute('INSERT INTO pending (id, row) VALUES (?, ?)',
+                            (row_id, pickle.dumps(tuple(row), pickle.HIGHEST_PROTOCOL)))
+        self.size += 1
+        return row_id
+
+    def pop(self, row_id):
+        """Забрать строку по id; None, если её нет"""
+        if self.db is None:
+            row = self.rows.pop(row_id, None)
+        else:
+            found = self.db.execute('SELECT row FROM pending WHERE id = ?', (row_id,)).fetchone()
+            row = None
+            if found:
+                self.db.execute('DELETE FROM pending WHERE id = ?', (row_id,))
+                row = pickle.loads(found[0])
+        if row is None:
+            return None
+        self.size -= 1
+        return WikiRow(*row)
+
+
+class Frontier:
+    """queue, visited и pending для паука: в памяти или в одном SQLite-файле"""
+
+    def __init__(self, path=None):
+        self.db = open_store(path) if path else None
+        if self.db is None:
+            self.queue = deque()
+            self.visited = set()
+        else:
+            self.queue = DiskQueue(self.db)
+            self.visited = DiskKeySet(self.db)
+        self.pending = PendingRows(self.db)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        store = settings.get('FRONTIER_STORE', 'memory')
+        if store == 'memory':
+            return cls()
+        if store != 'disk':
+            raise ValueError('FRONTIER_STORE must be "memory" or "disk", got %r' % store)
+        return cls(settings.get('FRONTIER_STORE_PATH', 'movies_frontier.db'))
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+
+
+def current_rss():
+    """Текущий RSS процесса в байтах; None, если его не узнать"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+
+def peak_rss():
+    """Пиковый RSS процесса в байтах; None, если его не узнать"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux отдаёт килобайты, macOS — байты
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if psutil is not None:
+        return psutil.Process().memory_info().peak_wset
+    return None
+
+
+class MemoryGovernor:
+    """Лимит запросов фронтира в планировщике: вдвое меньше, пока RSS выше цели,
+    и обратно до maximum, когда RSS опустится ниже 80% цели"""
+
+    def __init__(self, target_bytes, maximum, minimum=8, interval=1.0, crawler=None):
+        self.target = target_bytes
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.interval = interval
+        # stats у crawler появляются после создания паука, берём их при каждом замере
+        self.crawler = crawler
+        self.current = maximum
+        self.checked = 0.0
+        if current_rss() is None:
+            logger.warning('MEMORY_TARGET_MB is set, but the RSS of this process is not available '
+                           '(no /proc and no psutil); the in-flight limit stays at %d', maximum)
+            self.target = None
+
+    @classmethod
+    def from_crawler(cls, crawler, maximum):
+        """None, если MEMORY_TARGET_MB не задан"""
+        target_mb = crawler.settings.getint('MEMORY_TARGET_MB')
+        if not target_mb:
+            return None
+        return cls(target_mb * 1024 * 1024, maximum, crawler=crawler)
+
+    def limit(self):
+        """Сколько запросов фронтира сейчас можно держать в планировщике"""
+        if self.target is None:
+            return self.current
+        now = time.monotonic()
+        if now - self.checked < self.interval:
+            return self.current
+        self.checked = now
+        rss = current_rss()
+        if rss > self.target and self.current > self.minimum:
+            self.current = max(self.minimum, self.current // 2)
+            logger.info('RSS %.0f MB above MEMORY_TARGET_MB, frontier in-flight limit cut to %d',
+                        rss / 2 ** 20, self.current)
+        elif rss < self.target * 0.8 and self.current < self.maximum:
+            self.current = min(self.maximum, self.current * 2)
+        stats = self.crawler.stats if self.crawler is not None else None
+        if stats is not None:
+            stats.max_value('memory/rss_max_mb', rss // 2 ** 20)
+            stats.min_value('memory/in_flight_limit_min', self.current)
+        return self.current
@@ -0,0 +1,138 @@
+# On-disk response cache used by MoviesParserDownloaderMiddleware
+#
+# All responses live in one SQLite file (RESPONSE_CACHE_PATH), keyed by the
+# request fingerprint, with bodies compressed by gzip or, when the optional
+# zstandard package is installed, zstd. Entries expire per domain
+# (RESPONSE_CACHE_TTL, seconds, 0 = never) and the least recently used ones
+# are evicted once the file holds more than RESPONSE_CACHE_MAX_BYTES of
+# compressed bodies.
+#
+# Bodies cut short on purpose (StopDownload(fail=False), e.g. the IMDb
+# JSON-LD cutoff) are stored as partial: get() returns them only to callers
+# that accept a truncated body (partial_ok), everyone else sees a miss.
+
+import gzip
+import sqlite3
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Codec:
+    def __init__(self, name):
+        if name == 'zstd':
+            if zstandard is None:
+                raise ValueError('zstd codec needs the zstandard package')
+            self._compress = zstandard.ZstdCompressor(level=6).compress
+            self._decompress = zstandard.ZstdDecompressor().decompress
+        elif name == 'gzip':
+            self._compress = lambda data: gzip.compress(data, compresslevel=6)
+            self._decompress = gzip.decompress
+        else:
+            raise ValueError('unknown codec: %s' % name)
+        self.name = name
+
+    def compress(self, data):
+        return self._compress(data)
+
+    def decompress(self, data):
+        return self._decompress(data)
+
+
+class ResponseCache:
+    """SQLite-хранилище ответов: fingerprint -> (url, status, headers, сжатое тело)"""
+
+    def __init__(self, path, codec='gzip', ttl=None, default_ttl=0, max_bytes=0):
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'fingerprint BLOB PRIMARY KEY, url TEXT, domain TEXT, status INTEGER, '
+            'headers BLOB, body BLOB, codec TEXT, size INTEGER, '
+            'stored_at REAL, accessed_at REAL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        # Кэш, созданный до появления частичных записей
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(responses)')]
+        if 'partial' not in columns:
+            self.db.execute('ALTER TABLE responses ADD COLUMN partial INTEGER NOT NULL DEFAULT 0')
+        self.codecs = {}
+        self.codec = self._codec(codec)
+        self.ttl = ttl or {}
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        self.pending = 0
+
+    def _codec(self, name):
+        if name not in self.codecs:
+            self.codecs[name] = Codec(name)
+        return self.codecs[name]
+
+    def ttl_for(self, domain):
+        return self.ttl.get(domain, self.default_ttl)
+
+    def get(self, fingerprint, domain, stale_ok=False, partial_ok=False):
+        """Вернуть (url, status, headers, body, partial) или None, если записи нет, она устарела
+        или тело в ней обрезано, а partial_ok не задан"""
+        row = self.db.execute(
+            'SELECT url, status, headers, body, codec, stored_at, partial FROM responses WHERE fingerprint = ?',
+            (fingerprint,),
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body, codec, stored_at, partial = row
+        if partial and not partial_ok:
+            return None
+        ttl = self.ttl_for(domain)
+        now = time.time()
+        if not stale_ok and ttl and now - stored_at > ttl:
+            return None
+        self.db.execute('UPDATE responses SET accessed_at = ? WHERE fingerprint = ?', (now, fingerprint))
+        return url, status, headers, self._codec(codec).decompress(body), bool(partial)
+
+    def put(self, fingerprint, url, domain, status, headers, body, partial=False):
+        body = self.codec.compress(body)
+        now = time.time()
+        old = self.db.execute('SELECT size FROM responses WHERE fingerprint = ?', (fingerprint,)).fetchone()
+        self.db.execute(
+            'INSERT OR REPLACE INTO responses '
+            '(fingerprint, url, domain, status, headers, body, codec, size, stored_at, accessed_at, partial) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (fingerprint, url, domain, status, headers, body, self.codec.name, len(body), now, now, int(partial)),
+        )
+        self.size += len(body) - (old[0] if old else 0)
+        self.pending += 1
+        if self.pending >= 100:
+            self.commit()
+        return self.evict()
+
+    def evict(self):
+        """Удалить давно не читанные записи, пока кэш больше max_bytes; вернуть число удалённых"""
+        if not self.max_bytes or self.size <= self.max_bytes:
+            return 0
+        # Освобождаем с запасом, чтобы не вытеснять на каждой записи
+        target = self.max_bytes * 0.9
+        evicted = 0
+        rows = self.db.execute('SELECT fingerprint, size FROM responses ORDER BY accessed_at').fetchall()
+        for fingerprint, size in rows:
+            if self.size <= target:
+                break
+            self.db.execute('DELETE FROM responses WHERE fingerprint = ?', (fingerprint,))
+            self.size -= size
+            evicted += 1
+        return evicted
+
+    def commit(self):
+        self.db.commit()
+        self.pending = 0
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
@@ -0,0 +1,145 @@
+# Single-pass infobox extraction for film articles
+#
+# The infobox table is walked once with lxml. Every row header is resolved
+# to the fields it feeds through a lookup table built from INFOBOX_FIELDS
+# (header substring -> field) and memoized per distinct header text, so
+# after the first few pages each row costs one dict lookup.
+
+import re
+
+from lxml import etree
+
+# Какие подстроки заголовка строки инфобокса ведут в какое поле
+DEFAULT_FIELDS = {
+    'director': ['Режиссёр'],
+    'genre': ['Жанр'],
+    'country': ['Страна', 'Страны'],
+    'year': ['Год', 'Дата Выхода', 'Дата выхода', 'Премьера'],
+}
+
+# Для этих полей заголовок берём из ссылки в <th>, а значения — из ссылок в <td>
+# (если ссылок нет — из всего текста ячейки)
+LINK_FIELDS = frozenset(['genre'])
+
+INFOBOX_XPATH = etree.XPath(
+    '(//table[contains(concat(" ", normalize-space(@class), " "), " infobox ")])[1]')
+TITLE_XPATH = etree.XPath('//h1[@id="firstHeading"]//text()')
+IMDB_ROW_XPATH = etree.XPath('//th//a[@title="Internet Movie Database"]')
+TD_HREF_XPATH = etree.XPath('//td//a/@href')
+IMDB_LINK_RE = re.compile(r'https://www.imdb.com/title/tt\d+/')
+
+
+def first_text(element):
+    """Первый текстовый узел непосредственно внутри элемента (как `th::text`)"""
+    if element.text is not None:
+        return element.text
+    for child in element:
+        if child.tail is not None:
+            return child.tail
+    return None
+
+
+def cell_texts(td):
+    """Все текстовые узлы ячейки (как `td *::text`)"""
+    return [t.strip() for t in td.itertext() if t.strip()]
+
+
+def link_texts(td):
+    """Собственный текст ссылок внутри ячейки (как `td a::text`)"""
+    texts = []
+    for a in td.iter('a'):
+        if a.text is not None:
+            texts.append(a.text)
+        for child in a:
+            if child.tail is not None:
+                texts.append(child.tail)
+    return [t.strip() for t in texts if t.strip()]
+
+
+class InfoboxExtractor:
+    """Извлечь название, сырые значения полей и ссылку на IMDb из статьи за один проход"""
+
+    def __init__(self, fields=None):
+        self.fields = {name: list(headers) for name, headers in (fields or DEFAULT_FIELDS).items()}
+        self.text_fields = [(name, headers) for name, headers in self.fields.items()
+                            if name not in LINK_FIELDS]
+        self.link_fields = [(name, headers) for name, headers in self.fields.items()
+                            if name in LINK_FIELDS]
+        self._text_lookup = {}
+        self._link_lookup = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.getdict('INFOBOX_FIELDS') or None)
+
+    def _resolve(self, header, table, candidates):
+        fields = table.get(header)
+        if fields is None:
+            fields = tuple(name for name, needles in candidates
+                           if any(needle in header for needle in needles))
+            table[header] = fields
+        return fields
+
+    def row_fields(self, header, header_link):
+        """Поля, в которые идёт строка с таким заголовком"""
+        fields = ()
+        if header:
+            fields = self._resolve(header, self._text_lookup, self.text_fields)
+        if header_link:
+            fields += self._resolve(header_link, self._link_lookup, self.link_fields)
+        return fields
+
+    def extract(self, root):
+        """Вернуть словарь с title, списками сырых значений полей, has_imdb и imdb_link;
+        None, если в статье нет инфобокса"""
+        tables = INFOBOX_XPATH(root)
+        if not tables:
+            return None
+
+        title_parts = TITLE_XPATH(root)
+        result = {name: [] for name in self.fields}
+        result['title'] = ''.join(title_parts).strip() if title_parts else None
+
+        for row in tables[0].iter('tr'):
+            header = None
+            header_link = None
+            tds = []
+            for cell in row.iter('th', 'td'):
+                if cell.tag == 'th':
+                    if header is None:
+                        header = first_text(cell)
+                    if header_link is None:
+                        for a in cell.iter('a'):
+                            header_link = first_text(a)
+                            if header_link is not None:
+                                break
+                elif not tds or not any(True for _ in cell.iterancestors('td')):
+                    # Вложенные ячейки уже входят в текст внешней
+                    tds.append(cell)
+            if header_link is None:
+                header_link = header
+
+            fields = self.row_fields(header, header_link)
+            if not fields:
+                continue
+
+            texts = None
+            for name in fields:
+                values = None
+                if name in LINK_FIELDS:
+                    values = [t for td in tds for t in link_texts(td)]
+                if not values:
+                    if texts is None:
+                        texts = [t for td in tds for t in cell_texts(td)]
+                    values = texts
+                result[name].extend(values)
+
+        result['has_imdb'] = bool(IMDB_ROW_XPATH(root))
+        result['imdb_link'] = None
+        if result['has_imdb']:
+            for href in TD_HREF_XPATH(root):
+                match = IMDB_LINK_RE.search(href)
+                if match:
+                    result['imdb_link'] = match.group(0)
+                    break
+        return result
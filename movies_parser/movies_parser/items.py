@@ -2,16 +2,144 @@
 #
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
+#
+# Movie is the item the spiders yield: a slotted dataclass holding the
+# cleaned values already split, so pipelines and loaders never split the
+# comma-joined strings again.
+#
+#   title     str
+#   genre     tuple of str, from a shared vocabulary (see below)
+#   director  tuple of str
+#   country   tuple of str, from a shared vocabulary
+#   year      tuple of int, newest first as in the CSV
+#   imdb      float rating or None
+#   imdb_id   IMDb tt-ID or None
+#   page_id   Wikipedia page id (int) or None
+#
+# Genre and country strings repeat across the whole crawl, so every
+# distinct cleaned value is split once, its parts interned, and all items
+# with that value share one tuple object.
+#
+# Serialization (OUTPUT_LAYOUT):
+#   to_row(fields)    - "flat": the classic CSV row, lists joined with ", "
+#   to_nested(fields) - "nested": lists and numbers, for JSON Lines and
+#                       Parquet list columns
+#   from_row(row)     - back from a flat row (CSV, the incremental store)
+
+import re
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+FIELDS = ('title', 'genre', 'director', 'country', 'year', 'imdb', 'imdb_id', 'page_id')
+YEAR_RE = re.compile(r'\d{4}')
+
+
+def split_values(text):
+    """Строку "a, b, c" — в кортеж непустых значений"""
+    if not text:
+        return ()
+    if isinstance(text, (tuple, list)):
+        return tuple(text)
+    return tuple(part.strip() for part in text.split(',') if part.strip())
+
+
+@lru_cache(maxsize=65536)
+def vocabulary_values(text):
+    """Кортеж для жанров и стран: один объект на каждое различное значение, строки интернированы"""
+    return tuple(sys.intern(value) for value in split_values(text))
+
+
+@lru_cache(maxsize=4096)
+def year_values(text):
+    return tuple(int(year) for year in YEAR_RE.findall(text))
+
+
+def to_years(value):
+    if not value:
+        return ()
+    if isinstance(value, (tuple, list)):
+        return tuple(int(year) for year in value)
+    if isinstance(value, int):
+        return (value,)
+    return year_values(value)
+
+
+def to_float(value):
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_int(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_empty(value):
+    """Пустое значение поля: None, '' или пустой список"""
+    return value is None or value in ('', (), [])
+
+
+@dataclass
+class Movie:
+    __slots__ = FIELDS
+    title: str
+    genre: Tuple[str, ...]
+    director: Tuple[str, ...]
+    country: Tuple[str, ...]
+    year: Tuple[int, ...]
+    imdb: Optional[float]
+    imdb_id: Optional[str]
+    page_id: Optional[int]
+
+    @classmethod
+    def from_cleaned(cls, title, genre, director, country, year, imdb=None, imdb_id=None, page_id=None):
+        """Item из очищенных строк (как их отдаёт movies_parser.cleaning)"""
+        if isinstance(genre, str):
+            genre = vocabulary_values(genre)
+        if isinstance(country, str):
+            country = vocabulary_values(country)
+        return cls(title, tuple(genre), split_values(director), tuple(country), to_years(year),
+                   to_float(imdb), imdb_id or None, to_int(page_id))
+
+    @classmethod
+    def from_row(cls, row):
+        """Item из плоской строки: dict полей в форме CSV"""
+        return cls.from_cleaned(row.get('title'), row.get('genre') or '', row.get('director') or '',
+                                row.get('country') or '', row.get('year') or '', row.get('imdb'),
+                                row.get('imdb_id'), row.get('page_id'))
+
+    def to_row(self, fields=FIELDS):
+        """Значения полей в форме CSV: списки через ", " """
+        row = []
+        for field in fields:
+            value = getattr(self, field, None)
+            if isinstance(value, tuple):
+                value = ', '.join(map(str, value))
+            row.append(value)
+        return row
 
-import scrapy
+    def to_flat(self):
+        return dict(zip(FIELDS, self.to_row()))
 
+    def to_nested(self, fields=FIELDS):
+        """Значения полей со списками и числами"""
+        row = []
+        for field in fields:
+            value = getattr(self, field, None)
+            row.append(list(value) if isinstance(value, tuple) else value)
+        return row
 
-class MoviesParserItem(scrapy.Item):
-    # define the fields for your item here like:
-    title = scrapy.Field()
-    genre = scrapy.Field()
-    director = scrapy.Field()
-    country = scrapy.Field()
-    year = scrapy.Field()
-    # name = scrapy.Field()
-    pass
+    @property
+    def release_year(self):
+        """Самый ранний из годов"""
+        return min(self.year) if self.year else None
@@ -0,0 +1,140 @@
+# IMDb rating from the JSON-LD block of a title page
+#
+# An IMDb title page carries the rating in <script type="application/ld+json">
+# in <head>; everything after it (hundreds of KB of markup and inline data)
+# is of no use to the spider. rating() pulls aggregateRating.ratingValue out
+# of the raw bytes with a few find() calls and decodes only that small
+# object, without building a DOM or decoding the whole JSON-LD.
+#
+# JsonLdCutoff watches the IMDb downloads as they arrive (headers_received /
+# bytes_received signals): once the JSON-LD script has closed, the block is
+# put into request.meta['jsonld'] and the transfer is stopped
+# (StopDownload(fail=False)), so the callback gets the head of the page and
+# the rest is never downloaded. gzip bodies are inflated on the fly for the
+# scan; other encodings are downloaded in full. A stopped transfer closes its
+# connection, so pages with less than IMDB_CUTOFF_MIN_BYTES left are left
+# to finish and keep the connection alive.
+
+import json
+import zlib
+
+from scrapy import signals
+from scrapy.exceptions import StopDownload
+
+SCRIPT_MARKER = b'application/ld+json'
+SCRIPT_END = b'</script>'
+RATING_KEY = b'"aggregateRating"'
+
+
+def jsonld_block(body):
+    """Содержимое первого <script type="application/ld+json"> или None, если его нет или он не закрыт"""
+    marker = body.find(SCRIPT_MARKER)
+    if marker < 0:
+        return None
+    begin = body.find(b'>', marker)
+    if begin < 0:
+        return None
+    end = body.find(SCRIPT_END, begin)
+    if end < 0:
+        return None
+    return body[begin + 1:end]
+
+
+def rating(block):
+    """aggregateRating.ratingValue из JSON-LD; None, если рейтинга нет"""
+    pos = block.find(RATING_KEY)
+    if pos < 0:
+        return None
+    # aggregateRating — плоский объект, декодируем только его
+    begin = block.find(b'{', pos)
+    end = block.find(b'}', begin)
+    try:
+        return json.loads(block[begin:end + 1]).get('ratingValue')
+    except ValueError:
+        return json.loads(block).get('aggregateRating', {}).get('ratingValue')
+
+
+class Scan:
+    """Поиск JSON-LD в приходящих кусках одного ответа"""
+
+    def __init__(self, encoding, length):
+        self.inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if encoding == b'gzip' else None
+        self.length = length
+        self.received = 0
+        self.head = bytearray()
+        self.marker = -1
+
+    def feed(self, data):
+        """Блок JSON-LD, как только он пришёл целиком, иначе None"""
+        self.received += len(data)
+        if self.inflate is not None:
+            data = self.inflate.decompress(data)
+        # Ищем только в новых байтах, с запасом на маркер, разрезанный между кусками
+        scanned = len(self.head)
+        self.head += data
+        if self.marker < 0:
+            self.marker = self.head.find(SCRIPT_MARKER, max(scanned - len(SCRIPT_MARKER), 0))
+            if self.marker < 0:
+                return None
+        end = self.head.find(SCRIPT_END, max(scanned - len(SCRIPT_END), self.marker))
+        if end < 0:
+            return None
+        return bytes(self.head[self.head.find(b'>', self.marker) + 1:end])
+
+
+class JsonLdCutoff:
+    """Обрывает загрузку страниц IMDb (request.meta['jsonld_cutoff']) сразу после блока JSON-LD"""
+
+    def __init__(self, crawler, max_bytes=512 * 1024, min_saving=64 * 1024):
+        self.crawler = crawler
+        self.max_bytes = max_bytes
+        self.min_saving = min_saving
+        self.scans = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """None, если IMDB_CUTOFF_ENABLED выключен"""
+        settings = crawler.settings
+        if not settings.getbool('IMDB_CUTOFF_ENABLED', True):
+            return None
+        cutoff = cls(crawler, settings.getint('IMDB_CUTOFF_MAX_BYTES', 512 * 1024),
+                     settings.getint('IMDB_CUTOFF_MIN_BYTES', 64 * 1024))
+        crawler.signals.connect(cutoff.headers_received, signal=signals.headers_received)
+        crawler.signals.connect(cutoff.bytes_received, signal=signals.bytes_received)
+        crawler.signals.connect(cutoff.request_left, signal=signals.request_left_downloader)
+        return cutoff
+
+    def headers_received(self, headers, body_length, request, spider):
+        if not request.meta.get('jsonld_cutoff'):
+            return
+        encoding = headers.get(b'Content-Encoding', b'').lower() or None
+        if encoding not in (None, b'identity', b'gzip'):
+            return
+        request.meta.pop('jsonld', None)
+        self.scans[request] = Scan(encoding, body_length)
+
+    def bytes_received(self, data, request, spider):
+        scan = self.scans.get(request)
+        if scan is None:
+            return
+        block = scan.feed(data)
+        if block is None:
+            # Блока нет в начале страницы — дальше не ищем, страница скачается целиком
+            if len(scan.head) > self.max_bytes:
+                del self.scans[request]
+            return
+        del self.scans[request]
+        request.meta['jsonld'] = block
+        stats = self.crawler.stats
+        remaining = scan.length - scan.received if scan.length >= 0 else None
+        if remaining is not None and remaining < self.min_saving:
+            stats.inc_value('imdb_cutoff/finished')
+            return
+        stats.inc_value('imdb_cutoff/stopped')
+        stats.inc_value('imdb_cutoff/bytes_received', scan.received)
+        if remaining is not None:
+            stats.inc_value('imdb_cutoff/bytes_skipped', remaining)
+        raise StopDownload(fail=False)
+
+    def request_left(self, request, spider):
+        self.scans.pop(request, None)
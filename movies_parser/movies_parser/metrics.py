@@ -0,0 +1,252 @@
+# Crawl instrumentation
+#
+# One Metrics registry per crawler collects what the crawl spends its time
+# on:
+#   - CPU time and calls per spider callback (MoviesParserSpiderMiddleware),
+#     parse_movie is also timed on its own, inside parse_bfs; with
+#     PARSE_POOL_SIZE the cleaners run in the workers and are not timed
+#   - download latency histograms per domain (MoviesParserDownloaderMiddleware)
+#   - CPU time per cleaner field, items scraped
+#   - frontier queue / visited / in-flight sizes, read when a snapshot is taken
+#
+# MetricsExporter (an extension) appends a JSON snapshot with items/sec to
+# METRICS_DUMP_PATH every METRICS_DUMP_INTERVAL seconds and, with
+# METRICS_PORT, serves the registry in Prometheus text format on /metrics.
+
+import json
+import time
+import weakref
+from collections import defaultdict
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+PREFIX = 'movies_'
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registries = weakref.WeakKeyDictionary()
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in pairs)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(граница, число наблюдений <= границы)], последняя граница — +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """Счётчики, гистограммы и gauge-функции с метками"""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.gauges = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Общий реестр краулера: его используют паук, middleware и экспортёр"""
+        metrics = _registries.get(crawler)
+        if metrics is None:
+            metrics = _registries[crawler] = cls()
+        return metrics
+
+    def inc(self, name, value=1, **labels):
+        self.counters[name, labels_key(labels)] += value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = name, labels_key(labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def gauge(self, name, func):
+        """Значение gauge считывается функцией в момент снимка"""
+        self.gauges[name] = func
+
+    def add_cpu(self, name, seconds, **labels):
+        key = labels_key(labels)
+        self.counters[name + '_cpu_seconds_total', key] += seconds
+        self.counters[name + '_calls_total', key] += 1
+
+    def timed(self, iterable, name, **labels):
+        """Пройти по генератору, считая процессорное время его шагов"""
+        iterator = iter(iterable)
+        total = 0.0
+        try:
+            while True:
+                start = time.process_time()
+                try:
+                    result = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    total += time.process_time() - start
+                yield result
+        finally:
+            self.add_cpu(name, total, **labels)
+
+    async def timed_async(self, iterable, name, **labels):
+        """То же для асинхронного генератора; сюда попадает и то, что реактор
+        успел выполнить, пока колбэк ждал (например, пул разбора)"""
+        iterator = iterable.__aiter__()
+        total = 0.0
+        try:
+            while True:
+                start = time.process_time()
+                try:
+                    result = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    total += time.process_time() - start
+                yield result
+        finally:
+            self.add_cpu(name, total, **labels)
+
+    def snapshot(self):
+        """Все метрики в виде словаря, пригодного для JSON"""
+        counters = defaultdict(dict)
+        for (name, key), value in self.counters.items():
+            counters[name][format_labels(key) or '_'] = value
+        histograms = defaultdict(dict)
+        for (name, key), histogram in self.histograms.items():
+            histograms[name][format_labels(key) or '_'] = {
+                'buckets': {str(bound): count for bound, count in histogram.cumulative()},
+                'sum': histogram.sum,
+                'count': histogram.count,
+            }
+        gauges = {name: func() for name, func in self.gauges.items()}
+        return {'counters': dict(counters), 'histograms': dict(histograms), 'gauges': gauges}
+
+    def prometheus(self):
+        """Текстовый формат экспозиции Prometheus"""
+        lines = []
+        by_name = defaultdict(list)
+        for (name, key), value in sorted(self.counters.items()):
+            by_name[name].append((key, value))
+        for name, values in by_name.items():
+            lines.append('# TYPE %s%s counter' % (PREFIX, name))
+            lines.extend('%s%s%s %r' % (PREFIX, name, format_labels(key), value) for key, value in values)
+
+        by_name = defaultdict(list)
+        for (name, key), histogram in sorted(self.histograms.items()):
+            by_name[name].append((key, histogram))
+        for name, values in by_name.items():
+            lines.append('# TYPE %s%s histogram' % (PREFIX, name))
+            for key, histogram in values:
+                for bound, count in histogram.cumulative():
+                    lines.append('%s%s_bucket%s %d' % (PREFIX, name, format_labels(key, [('le', bound)]), count))
+                lines.append('%s%s_sum%s %r' % (PREFIX, name, format_labels(key), histogram.sum))
+                lines.append('%s%s_count%s %d' % (PREFIX, name, format_labels(key), histogram.count))
+
+        for name, func in sorted(self.gauges.items()):
+            lines.append('# TYPE %s%s gauge' % (PREFIX, name))
+            lines.append('%s%s %r' % (PREFIX, name, func()))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsExporter:
+    """Периодический JSON-дамп реестра и HTTP-эндпоинт /metrics для Prometheus"""
+
+    def __init__(self, crawler, dump_path, interval, port):
+        self.crawler = crawler
+        self.metrics = Metrics.from_crawler(crawler)
+        self.dump_path = dump_path
+        self.interval = interval
+        self.port = port
+        self.task = None
+        self.listener = None
+        self.last = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        dump_path = settings.get('METRICS_DUMP_PATH')
+        port = settings.getint('METRICS_PORT')
+        if not dump_path and not port:
+            raise NotConfigured
+        exporter = cls(crawler, dump_path, settings.getfloat('METRICS_DUMP_INTERVAL', 60.0), port)
+        crawler.signals.connect(exporter.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(exporter.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(exporter.spider_closed, signal=signals.spider_closed)
+        return exporter
+
+    def item_scraped(self, item, spider):
+        self.metrics.inc('items_scraped_total')
+
+    def spider_opened(self, spider):
+        from twisted.internet import task
+
+        self.last = (time.monotonic(), 0)
+        if self.dump_path:
+            self.task = task.LoopingCall(self.dump)
+            self.task.start(self.interval, now=False)
+        if self.port:
+            self.listen()
+
+    def listen(self):
+        from twisted.internet import reactor
+        from twisted.web import resource, server
+
+        metrics = self.metrics
+
+        class MetricsResource(resource.Resource):
+            isLeaf = True
+
+            def render_GET(self, request):
+                request.setHeader(b'Content-Type', b'text/plain; version=0.0.4; charset=utf-8')
+                return metrics.prometheus().encode('utf-8')
+
+        self.listener = reactor.listenTCP(self.port, server.Site(MetricsResource()))
+
+    def dump(self):
+        now = time.monotonic()
+        items = self.metrics.counters['items_scraped_total', ()]
+        since, items_before = self.last
+        self.last = (now, items)
+        snapshot = self.metrics.snapshot()
+        snapshot['time'] = time.time()
+        snapshot['items_per_sec'] = (items - items_before) / (now - since) if now > since else 0.0
+        with open(self.dump_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False) + '\n')
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        if self.dump_path:
+            self.dump()
+        if self.listener is not None:
+            return self.listener.stopListening()
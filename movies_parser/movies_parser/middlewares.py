@@ -3,21 +3,48 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import time
+
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet.error import ConnectionLost, TCPTimedOutError, TimeoutError
+from twisted.web.client import ResponseFailed
+from twisted.web._newclient import ResponseNeverReceived
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from movies_parser.adaptive import AimdController, retry_after_seconds
+from movies_parser.httpcache import ResponseCache
+from movies_parser.metrics import Metrics
+
+
+# Ошибки загрузки, которые говорят о перегрузке сервера (не DNS и не отказ в соединении)
+CONGESTION_EXCEPTIONS = (TimeoutError, TCPTimedOutError, ConnectionLost, ResponseFailed, ResponseNeverReceived)
+
+
+def callback_name(response):
+    callback = response.request.callback if response.request is not None else None
+    return getattr(callback, '__name__', 'parse')
+
 
 class MoviesParserSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the spider middleware does not modify the
     # passed objects.
+    # Считаем процессорное время каждого колбэка паука (см. movies_parser.metrics)
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        s = cls(Metrics.from_crawler(crawler))
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
@@ -33,7 +60,10 @@ class MoviesParserSpiderMiddleware:
         # it has processed the response.
 
         # Must return an iterable of Request, or item objects.
-        for i in result:
+        yield from self.metrics.timed(result, 'callback', callback=callback_name(response))
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for i in self.metrics.timed_async(result, 'callback', callback=callback_name(response)):
             yield i
 
     def process_spider_exception(self, response, exception, spider):
@@ -57,15 +87,34 @@ class MoviesParserSpiderMiddleware:
 
 
 class MoviesParserDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    # Кэш ответов на диске (см. movies_parser.httpcache), включается
+    # RESPONSE_CACHE_ENABLED. В режиме RESPONSE_CACHE_REPLAY_ONLY сеть не
+    # используется вовсе: всё, чего нет в кэше, отбрасывается.
+    # Заодно собираем гистограммы задержки загрузки по доменам.
+
+    def __init__(self, cache=None, replay_only=False, stats=None, metrics=None):
+        self.cache = cache
+        self.replay_only = replay_only
+        self.stats = stats
+        self.metrics = metrics
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        settings = crawler.settings
+        cache = None
+        if settings.getbool('RESPONSE_CACHE_ENABLED'):
+            cache = ResponseCache(
+                settings.get('RESPONSE_CACHE_PATH', 'httpcache.db'),
+                codec=settings.get('RESPONSE_CACHE_CODEC', 'gzip'),
+                ttl=settings.getdict('RESPONSE_CACHE_TTL'),
+                default_ttl=settings.getint('RESPONSE_CACHE_DEFAULT_TTL'),
+                max_bytes=settings.getint('RESPONSE_CACHE_MAX_BYTES'),
+            )
+        s = cls(cache, settings.getbool('RESPONSE_CACHE_REPLAY_ONLY'), crawler.stats, Metrics.from_crawler(crawler))
+        s.fingerprinter = crawler.request_fingerprinter
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
     def process_request(self, request, spider):
@@ -78,7 +127,24 @@ class MoviesParserDownloaderMiddleware:
         # - or return a Request object
         # - or raise IgnoreRequest: process_exception() methods of
         #   installed downloader middleware will be called
-        return None
+        if self.cache is None or request.meta.get('dont_cache'):
+            return None
+        fingerprint = self.fingerprinter.fingerprint(request)
+        # Обрезанные тела (JsonLdCutoff) отдаём только запросам, которым хватает начала страницы
+        cached = self.cache.get(fingerprint, urlparse_cached(request).hostname, stale_ok=self.replay_only,
+                                partial_ok=bool(request.meta.get('jsonld_cutoff')))
+        if cached is None:
+            self.stats.inc_value('response_cache/miss')
+            if self.replay_only:
+                raise IgnoreRequest('Not in response cache: %s' % request.url)
+            return None
+
+        self.stats.inc_value('response_cache/hit')
+        url, status, headers, body, partial = cached
+        headers = Headers(headers_raw_to_dict(headers))
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, status=status, headers=headers, body=body,
+                       flags=['cached', 'download_stopped'] if partial else ['cached'], request=request)
 
     def process_response(self, request, response, spider):
         # Called with the response returned from the downloader.
@@ -87,6 +153,25 @@ class MoviesParserDownloaderMiddleware:
         # - return a Response object
         # - return a Request object
         # - or raise IgnoreRequest
+        latency = request.meta.get('download_latency')
+        if latency is not None and 'cached' not in response.flags:
+            self.metrics.observe('download_latency_seconds', latency, domain=urlparse_cached(request).hostname)
+        if (self.cache is not None and response.status == 200
+                and 'cached' not in response.flags and not request.meta.get('dont_cache')):
+            evicted = self.cache.put(
+                self.fingerprinter.fingerprint(request),
+                response.url,
+                urlparse_cached(request).hostname,
+                response.status,
+                headers_dict_to_raw(response.headers),
+                response.body,
+                partial='download_stopped' in response.flags,
+            )
+            self.stats.inc_value('response_cache/store')
+            if 'download_stopped' in response.flags:
+                self.stats.inc_value('response_cache/store_partial')
+            if evicted:
+                self.stats.inc_value('response_cache/evicted', evicted)
         return response
 
     def process_exception(self, request, exception, spider):
@@ -101,3 +186,123 @@ class MoviesParserDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+    def spider_closed(self, spider):
+        if self.cache is not None:
+            self.cache.close()
+
+
+class AdaptiveConcurrencyMiddleware:
+    # AIMD-регулятор конкуренции по доменам (см. movies_parser.adaptive):
+    # меняет concurrency слотов загрузчика Scrapy, как AutoThrottle меняет
+    # delay. Ответы 429/503 с Retry-After ставят слот на паузу, а сам запрос
+    # возвращается в очередь (до ADAPTIVE_THROTTLE_RETRIES раз).
+
+    def __init__(self, crawler, controller, congestion_codes, throttle_retries, max_retry_after):
+        self.crawler = crawler
+        self.controller = controller
+        self.congestion_codes = congestion_codes
+        self.throttle_retries = throttle_retries
+        self.max_retry_after = max_retry_after
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+        return cls(
+            crawler,
+            AimdController.from_settings(settings),
+            frozenset(int(code) for code in settings.getlist('ADAPTIVE_CONGESTION_CODES', [429, 503])),
+            settings.getint('ADAPTIVE_THROTTLE_RETRIES', 10),
+            settings.getfloat('ADAPTIVE_MAX_RETRY_AFTER', 300),
+        )
+
+    def slot(self, request):
+        downloader = self.crawler.engine.downloader
+        key = request.meta.get('download_slot') or downloader.get_slot_key(request)
+        return key, downloader.slots.get(key)
+
+    def apply(self, key, slot):
+        if slot is not None:
+            slot.concurrency = self.controller.concurrency(key)
+        self.crawler.stats.set_value('adaptive/concurrency/%s' % key, self.controller.concurrency(key))
+
+    def process_request(self, request, spider):
+        # Новый слот создаётся с CONCURRENT_REQUESTS_PER_DOMAIN — сразу подменяем окно
+        key, slot = self.slot(request)
+        if slot is not None and slot.concurrency != self.controller.concurrency(key):
+            self.apply(key, slot)
+        request.meta['adaptive_epoch'] = self.controller.epoch(key)
+        return None
+
+    def process_response(self, request, response, spider):
+        if 'cached' in response.flags:
+            return response
+        key, slot = self.slot(request)
+        if response.status not in self.congestion_codes:
+            if self.controller.on_success(key, request.meta.get('download_latency'),
+                                          request.meta.get('adaptive_epoch', 0)):
+                self.crawler.stats.inc_value('adaptive/decrease/latency')
+            self.apply(key, slot)
+            return response
+
+        if self.controller.on_congestion(key, request.meta.get('adaptive_epoch', 0)):
+            self.crawler.stats.inc_value('adaptive/decrease/status')
+            spider.logger.debug('Перегрузка %s (%d), окно %d', key, response.status,
+                                self.controller.concurrency(key))
+        self.apply(key, slot)
+
+        delay = retry_after_seconds(response.headers.get('Retry-After', b'').decode('latin-1'))
+        if delay is not None:
+            self.pause(key, slot, min(delay, self.max_retry_after))
+
+        retries = request.meta.get('throttle_retry_times', 0)
+        if retries >= self.throttle_retries:
+            return response
+        self.crawler.stats.inc_value('adaptive/throttled_retries')
+        retry = request.copy()
+        retry.meta['throttle_retry_times'] = retries + 1
+        retry.dont_filter = True
+        return retry
+
+    def process_exception(self, request, exception, spider):
+        if not isinstance(exception, CONGESTION_EXCEPTIONS):
+            return None
+        key, slot = self.slot(request)
+        if self.controller.on_congestion(key, request.meta.get('adaptive_epoch', 0)):
+            self.crawler.stats.inc_value('adaptive/decrease/error')
+        self.apply(key, slot)
+        return None
+
+    def pause(self, key, slot, seconds):
+        """Остановить выдачу запросов слоту на seconds: временная задержка слота
+        без рандомизации, затем прежние настройки"""
+        from twisted.internet import reactor
+
+        self.crawler.stats.inc_value('adaptive/retry_after')
+        if slot is None or seconds <= 0:
+            return
+        state = self.controller.state(key)
+        now = time.monotonic()
+        if state.paused_until > now + seconds:
+            return
+        already_paused = state.paused_until > now
+        self.controller.pause(key, seconds, now)
+        if not already_paused:
+            saved = slot.delay, slot.randomize_delay
+            reactor.callLater(seconds, self.resume, key, slot, saved)
+        slot.delay = max(slot.delay, seconds)
+        slot.randomize_delay = False
+        slot.lastseen = time.time()
+
+    def resume(self, key, slot, saved):
+        state = self.controller.state(key)
+        wait = state.paused_until - time.monotonic()
+        if wait > 0:
+            # Пока стояли, пришёл более поздний Retry-After
+            from twisted.internet import reactor
+            reactor.callLater(wait, self.resume, key, slot, saved)
+            return
+        slot.delay, slot.randomize_delay = saved
+        self.crawler.stats.inc_value('adaptive/resumed')
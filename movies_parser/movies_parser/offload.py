@@ -0,0 +1,88 @@
+# Process-pool parsing for MoviesSpider
+#
+# With PARSE_POOL_SIZE > 0 the spider hands the raw response body to a pool
+# of worker processes. A worker builds the DOM, runs infobox extraction and
+# cleaning, collects category links and returns plain dicts, so the reactor
+# thread only does I/O and scheduling. At most PARSE_POOL_MAX_PENDING pages
+# are parsed at once; responses waiting for a slot stay in Scrapy's scraper
+# slot, which makes the engine back off from downloading more.
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin
+
+from parsel import Selector
+
+from movies_parser import cleaning
+from movies_parser.infobox import InfoboxExtractor
+
+_extractor = None
+
+
+def init_worker(fields):
+    global _extractor
+    _extractor = InfoboxExtractor(fields)
+
+
+def extract_movie(selector):
+    """Очищенные поля фильма из инфобокса статьи, как в MoviesSpider.parse_movie; None, если это не фильм"""
+    if not selector.css('.infobox'):
+        return None
+    infobox = _extractor.extract(selector.root)
+    if not infobox:
+        return None
+    return {
+        'title': cleaning.clean_title(infobox['title']),
+        'director': cleaning.clean_director(infobox['director']),
+        'genre': cleaning.clean_genre(infobox['genre']),
+        'country': cleaning.clean_country(infobox['country']),
+        'year': cleaning.clean_year(infobox['year']),
+        'imdb_link': infobox['imdb_link'],
+    }
+
+
+def parse_page(body, url, encoding):
+    """Разобрать страницу в процессе-воркере: фильм, ссылки категорий, следующая страница"""
+    selector = Selector(text=body.decode(encoding, errors='replace'), base_url=url)
+
+    movie = extract_movie(selector)
+
+    links = [urljoin(url, href) for href in selector.css('.mw-category-group a::attr(href)').getall()]
+    next_page = selector.css('#mw-pages a').xpath('./text()[.="Следующая страница"]/../@href').get()
+    return {
+        'movie': movie,
+        'links': links,
+        'next_page': urljoin(url, next_page) if next_page else None,
+    }
+
+
+class ParsePool:
+    """Пул процессов для разбора страниц с ограничением на число задач в работе"""
+
+    def __init__(self, size, max_pending, fields=None):
+        self.executor = ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(fields,),
+        )
+        self.slots = asyncio.Semaphore(max_pending)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        size = settings.getint('PARSE_POOL_SIZE')
+        return cls(
+            size=size,
+            max_pending=settings.getint('PARSE_POOL_MAX_PENDING') or 2 * size,
+            fields=settings.getdict('INFOBOX_FIELDS') or None,
+        )
+
+    async def parse(self, response):
+        async with self.slots:
+            future = self.executor.submit(parse_page, response.body, response.url, response.encoding)
+            return await asyncio.wrap_future(future)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -7,27 +7,238 @@
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
-import csv
+import threading
+from queue import Queue
+
+from scrapy.exceptions import DropItem, NotConfigured
+
+from movies_parser.dedup import IdentityIndex, identity_keys, strong_ids
+from movies_parser.distributed import shard_path, worker_id
+from movies_parser.enrichment import RatingsIndex
+from movies_parser.exporters import make_writer, output_path
+from movies_parser.items import Movie, is_empty
 
 
 class MoviesParserPipeline:
+    """Пишет items пачками из фонового потока в CSV, JSON Lines или Parquet (см. movies_parser.exporters)"""
+
+    def __init__(self, path, fmt, fields, batch_size, compression=None, rotate_bytes=0, layout='flat'):
+        self.path = path
+        self.format = fmt
+        self.fields = fields
+        self.batch_size = batch_size
+        self.compression = compression
+        self.rotate_bytes = rotate_bytes
+        self.layout = layout
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = output_path(settings)
+        # Каждый воркер распределённого краула пишет свой шард, launcher их потом склеивает
+        if settings.getbool('DISTRIBUTED_ENABLED'):
+            path = shard_path(path, worker_id(settings))
+        return cls(
+            path=path,
+            fmt=settings.get('OUTPUT_FORMAT', 'csv'),
+            fields=settings.getlist('OUTPUT_FIELDS')
+            or ['title', 'genre', 'director', 'country', 'year', 'imdb'],
+            batch_size=settings.getint('OUTPUT_BATCH_SIZE', 1000),
+            compression=settings.get('OUTPUT_COMPRESSION'),
+            rotate_bytes=settings.getint('OUTPUT_ROTATE_BYTES'),
+            layout=settings.get('OUTPUT_LAYOUT', 'flat'),
+        )
+
+    def open_spider(self, spider):
+        self.writer = make_writer(self.format, self.path, self.fields, compression=self.compression,
+                                  rotate_bytes=self.rotate_bytes, layout=self.layout)
+        # С чекпоинтами файл сбрасывается на диск перед каждым коммитом, а при resume
+        # продолжается с последнего из них (movies_parser.checkpoint)
+        checkpoint = getattr(spider, 'checkpoint', None)
+        if checkpoint is not None:
+            state = checkpoint.register('output', self.sync)
+            if state is not None:
+                self.writer.resume(state)
+        self.buffer = []
+        # Items буфера по id(): DedupPipeline дописывает поля только в них (spider.output_buffer)
+        self.pending = {}
+        spider.output_buffer = self
+        # Ограниченная очередь: если диск не успевает, реактор подождёт, а не съест память
+        self.batches = Queue(maxsize=8)
+        self.error = None
+        self.stopping = False
+        self.spider = spider
+        self.thread = threading.Thread(target=self.write_batches, name='output-writer', daemon=True)
+        self.thread.start()
+
+    def write_batches(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                break
+            # Запрос sync: ответ (состояние writer или ошибку) кладём в присланную очередь всегда,
+            # иначе sync() ждал бы его вечно
+            if isinstance(batch, Queue):
+                if self.error is not None:
+                    batch.put(self.error)
+                    continue
+                try:
+                    batch.put(self.writer.sync())
+                except Exception as e:
+                    self.error = e
+                    batch.put(e)
+                continue
+            # После ошибки файл неполный: пакеты только выбираем, чтобы не встал реактор
+            if self.error is not None:
+                continue
+            try:
+                self.writer.write_batch(batch)
+            except Exception as e:
+                self.error = e
+        try:
+            self.writer.close()
+        except Exception as e:
+            self.error = self.error or e
+
+    def check(self, spider):
+        """Ошибка фонового потока записи: краул останавливается, чекпоинт не коммитится"""
+        if self.error is None:
+            return
+        if not self.stopping:
+            self.stopping = True
+            spider.logger.error("Ошибка записи результатов: %s", self.error)
+            # Без движка (movies_parser.reextract) останавливать нечего: ошибку получит вызывающий
+            engine = getattr(getattr(spider, 'crawler', None), 'engine', None)
+            if engine is not None:
+                engine.close_spider(spider, 'output_error')
+        raise RuntimeError('output writer failed: %s' % self.error) from self.error
+
+    def flush(self):
+        # Строки собираем только при отправке пакета: пока item в буфере,
+        # DedupPipeline ещё может дописать в него поля из дубликатов
+        fields = self.fields
+        nested = self.layout == 'nested'
+        rows = []
+        for item in self.buffer:
+            if isinstance(item, Movie):
+                rows.append(item.to_nested(fields) if nested else item.to_row(fields))
+                continue
+            adapter = ItemAdapter(item)
+            rows.append([adapter.get(field) for field in fields])
+        self.batches.put(rows)
+        self.buffer = []
+        self.pending = {}
+
+    def buffered(self, item):
+        """item ещё не отправлен на запись, в него можно дописывать поля"""
+        return id(item) in self.pending
+
+    def sync(self):
+        """Дописать на диск все полученные items; вернуть состояние writer для продолжения"""
+        self.check(self.spider)
+        if self.buffer:
+            self.flush()
+        reply = Queue(maxsize=1)
+        self.batches.put(reply)
+        state = reply.get()
+        if isinstance(state, Exception):
+            self.check(self.spider)
+        return state
+
+    def close_spider(self, spider):
+        if self.buffer:
+            self.flush()
+        self.batches.put(None)
+        self.thread.join()
+        if self.error is not None and not self.stopping:
+            spider.logger.error("Ошибка записи результатов: %s", self.error)
+        spider.logger.info("Результаты записаны: %s", ', '.join(self.writer.paths))
+
+    def process_item(self, item, spider):
+        self.check(spider)
+        self.buffer.append(item)
+        self.pending[id(item)] = item
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        return item
+
+
+class DedupPipeline:
+    """Отбрасывает повторы фильма (редиректы, несколько категорий) и дописывает
+    недостающие поля в первую запись (см. movies_parser.dedup)"""
+
+    def __init__(self, max_entries, stats):
+        self.max_entries = max_entries
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('DEDUP_ENABLED'):
+            raise NotConfigured
+        return cls(crawler.settings.getint('DEDUP_MAX_ENTRIES', 200000), crawler.stats)
+
     def open_spider(self, spider):
-        self.file = open('movies_output.csv', 'w', newline='', encoding='utf-8')
-        self.writer = csv.writer(self.file)
-        # Укажи нужные заголовки, в зависимости от item
-        self.writer.writerow(['title', 'genre', 'director', 'country', 'year', 'imdb'])
+        self.index = IdentityIndex(self.max_entries)
+        self.items = 0
+        self.duplicates = 0
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        keys = identity_keys(adapter)
+        self.items += 1
+        known, first = self.index.find(keys, strong_ids(adapter))
+        if not known:
+            self.index.add(keys, item)
+            return item
+
+        self.duplicates += 1
+        if first is not None:
+            # Поля дописываем, только пока первая запись в буфере MoviesParserPipeline:
+            # из отправленного на запись пакета они бы молча потерялись
+            output = getattr(spider, 'output_buffer', None)
+            if output is not None and output.buffered(first):
+                first_adapter = ItemAdapter(first)
+                for field, value in adapter.items():
+                    if not is_empty(value) and is_empty(first_adapter.get(field)):
+                        first_adapter[field] = value
+                        self.stats.inc_value('dedup/merged_fields')
+            else:
+                self.stats.inc_value('dedup/dropped')
+            # Запоминаем и новые псевдонимы того же фильма
+            self.index.add(keys, first)
+        else:
+            self.stats.inc_value('dedup/dropped')
+        raise DropItem('Duplicate film: %s' % adapter.get('title'))
 
     def close_spider(self, spider):
-        self.file.close()
+        ratio = self.duplicates / self.items if self.items else 0.0
+        self.stats.set_value('dedup/items', self.items)
+        self.stats.set_value('dedup/duplicates', self.duplicates)
+        self.stats.set_value('dedup/ratio', round(ratio, 4))
+        spider.logger.info("Дубликаты: %d из %d (%.1f%%)", self.duplicates, self.items, ratio * 100)
+
+
+class ImdbRatingsPipeline:
+    """Заполняет рейтинг IMDb по tt-ID из датасета title.ratings.tsv.gz"""
+
+    def __init__(self, ratings_path):
+        self.ratings_path = ratings_path
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler.settings.get('IMDB_ENRICHMENT') != 'dataset':
+            raise NotConfigured
+        ratings_path = crawler.settings.get('IMDB_RATINGS_PATH')
+        if not ratings_path:
+            raise NotConfigured('IMDB_RATINGS_PATH is not set')
+        return cls(ratings_path)
+
+    def open_spider(self, spider):
+        self.index = RatingsIndex.load(self.ratings_path)
+        spider.logger.info("Загружено рейтингов IMDb: %d", len(self.index))
 
     def process_item(self, item, spider):
-        # Записывай нужные поля из item
-        self.writer.writerow([
-            item.get('title'),
-            item.get('genre'),
-            item.get('director'),
-            item.get('country'),
-            item.get('year'),
-            item.get('imdb')
-        ])
+        adapter = ItemAdapter(item)
+        if adapter.get('imdb') is None and adapter.get('imdb_id'):
+            adapter['imdb'] = self.index.get(adapter['imdb_id'])
         return item
@@ -0,0 +1,53 @@
+# Cheap checks that run before full HTML parsing
+#
+# scan() looks at the raw response bytes after "<body" for the markers the
+# spider's selectors depend on: "infobox" (parse_movie, `.infobox`) and
+# "mw-category-group" / "mw-pages" (category links and the next-page link).
+# A page is parsed only for what it has, and a page with none of them is
+# dropped without building a DOM. Every marker is a substring of what the
+# matching selector looks for, so the full parse would not find anything
+# on a rejected page either.
+#
+# TitleFilter drops links before they are requested: article and category
+# titles matching one of PREFILTER_SKIP_TITLES (other namespaces, lists,
+# people categories, ...) are never downloaded. The list is empty unless the
+# project opts in (see the example in settings.py).
+
+import re
+from urllib.parse import unquote, urlsplit
+
+INFOBOX_MARKER = b'infobox'
+LISTING_MARKERS = (b'mw-category-group', b'mw-pages')
+
+
+def scan(body):
+    """(есть ли инфобокс, есть ли списки категории) по сырым байтам страницы"""
+    start = max(body.find(b'<body'), 0)
+    infobox = body.find(INFOBOX_MARKER, start) >= 0
+    listing = any(body.find(marker, start) >= 0 for marker in LISTING_MARKERS)
+    return infobox, listing
+
+
+def url_title(url):
+    """Заголовок страницы из URL вида /wiki/..., с пробелами вместо подчёркиваний"""
+    path = unquote(urlsplit(url).path)
+    if not path.startswith('/wiki/'):
+        return None
+    return path[len('/wiki/'):].replace('_', ' ')
+
+
+class TitleFilter:
+    """Регулярные выражения по заголовкам страниц, которые не нужно скачивать"""
+
+    def __init__(self, patterns=()):
+        self.regex = re.compile('|'.join('(?:%s)' % pattern for pattern in patterns)) if patterns else None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.getlist('PREFILTER_SKIP_TITLES'))
+
+    def skip_title(self, title):
+        return self.regex is not None and title is not None and self.regex.search(title) is not None
+
+    def skip(self, url):
+        return self.regex is not None and self.skip_title(url_title(url))
@@ -0,0 +1,293 @@
+# Offline re-extraction over saved article HTML
+#
+# Runs the same infobox extraction and cleaning as MoviesSpider (via
+# movies_parser.offload) over a stored corpus on all cores and streams the
+# items through the project's ITEM_PIPELINES, without the Scrapy engine or
+# any network access. Sources can be mixed:
+#   - a directory with .html / .htm files (also .html.gz), searched recursively
+#   - a tar archive of such files (.tar, .tar.gz, .tgz, ...)
+#   - a WARC file (.warc, .warc.gz) with HTTP responses
+#
+#     python -m movies_parser.reextract corpus/ pages.tar.gz crawl.warc.gz -o movies_reextracted.csv
+#
+# The output settings are the project ones and can be overridden with -s,
+# e.g. -s OUTPUT_FORMAT=jsonl -s IMDB_ENRICHMENT=dataset -s IMDB_RATINGS_PATH=title.ratings.tsv.gz.
+# Re-running it on a fixed corpus and diffing the outputs is a regression
+# test for cleaner changes.
+
+import argparse
+import gzip
+import itertools
+import multiprocessing
+import os
+import re
+import sys
+import tarfile
+import time
+from collections import deque
+from pathlib import Path
+
+from parsel import Selector
+from scrapy.crawler import Crawler
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.log import configure_logging
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import get_project_settings
+
+from movies_parser import offload
+from movies_parser.enrichment import imdb_id
+from movies_parser.incremental import article_id
+from movies_parser.items import Movie
+from movies_parser.spiders.movies import MoviesSpider
+
+HTML_SUFFIXES = ('.html', '.htm', '.html.gz', '.htm.gz')
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+WARC_SUFFIXES = ('.warc', '.warc.gz')
+CHARSET_RE = re.compile(rb'charset=([\w-]+)', re.I)
+# Страниц в задаче пула и задач в полёте на воркер: тела из tar/WARC читаются
+# в основном процессе, и в памяти их не больше workers * CHUNKS_PER_WORKER * CHUNK_SIZE
+CHUNK_SIZE = 16
+CHUNKS_PER_WORKER = 2
+
+
+def iter_directory(path):
+    """(url, None, путь) для каждого HTML-файла; файлы читают сами воркеры"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(HTML_SUFFIXES):
+                full = os.path.join(root, name)
+                yield Path(os.path.abspath(full)).as_uri(), None, full
+
+
+def iter_tar(path):
+    """(url, тело, None) для HTML-файлов архива, читая его потоком"""
+    with tarfile.open(path, 'r|*') as tar:
+        for member in tar:
+            if member.isfile() and member.name.lower().endswith(HTML_SUFFIXES):
+                body = tar.extractfile(member).read()
+                if member.name.lower().endswith('.gz'):
+                    body = gzip.decompress(body)
+                yield 'tar:%s!/%s' % (path, member.name), body, None
+
+
+def dechunk(body):
+    """Снять Transfer-Encoding: chunked"""
+    result = []
+    pos = 0
+    while True:
+        end = body.find(b'\r\n', pos)
+        if end < 0:
+            break
+        size = int(body[pos:end].split(b';')[0] or b'0', 16)
+        if size == 0:
+            break
+        result.append(body[end + 2:end + 2 + size])
+        pos = end + 2 + size + 2
+    return b''.join(result)
+
+
+def http_payload(block):
+    """Тело HTML-ответа 200 из HTTP-блока WARC-записи или None"""
+    head, _, body = block.partition(b'\r\n\r\n')
+    lines = head.split(b'\r\n')
+    status = lines[0].split()
+    if len(status) < 2 or status[1] != b'200':
+        return None
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(b':')
+        headers[name.strip().lower()] = value.strip()
+    if b'html' not in headers.get(b'content-type', b'text/html').lower():
+        return None
+    if b'chunked' in headers.get(b'transfer-encoding', b'').lower():
+        body = dechunk(body)
+    if headers.get(b'content-encoding', b'').lower() == b'gzip':
+        body = gzip.decompress(body)
+    return body
+
+
+def iter_warc(path):
+    """(url, тело, None) для ответов (WARC-Type: response) из WARC, в т.ч. .warc.gz"""
+    opener = gzip.open if path.lower().endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            if not line.startswith(b'WARC/'):
+                raise ValueError('%s: not a WARC record: %r' % (path, line[:40]))
+            headers = {}
+            for line in iter(f.readline, b''):
+                if not line.strip():
+                    break
+                name, _, value = line.decode('utf-8', 'replace').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            block = f.read(int(headers.get('content-length', 0)))
+            if headers.get('warc-type') == 'response' and block.startswith(b'HTTP/'):
+                body = http_payload(block)
+                if body is not None:
+                    yield headers.get('warc-target-uri', ''), body, None
+
+
+def iter_sources(paths):
+    for path in paths:
+        lower = path.lower()
+        if os.path.isdir(path):
+            yield from iter_directory(path)
+        elif lower.endswith(WARC_SUFFIXES):
+            yield from iter_warc(path)
+        elif lower.endswith(TAR_SUFFIXES) or tarfile.is_tarfile(path):
+            yield from iter_tar(path)
+        elif lower.endswith(HTML_SUFFIXES):
+            yield Path(os.path.abspath(path)).as_uri(), None, path
+        else:
+            raise ValueError('unsupported source: %s' % path)
+
+
+def extract_item(record):
+    """Воркер: item фильма из сохранённой страницы (как в режимах IMDB_ENRICHMENT "dataset"/"off") или None"""
+    url, body, path = record
+    if body is None:
+        opener = gzip.open if path.lower().endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            body = f.read()
+    match = CHARSET_RE.search(body[:2048])
+    encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        text = body.decode(encoding, errors='replace')
+    except LookupError:
+        text = body.decode('utf-8', errors='replace')
+    movie = offload.extract_movie(Selector(text=text, base_url=url))
+    if movie is None:
+        return None
+    return {
+        'title': movie['title'],
+        'genre': movie['genre'],
+        'director': movie['director'],
+        'country': movie['country'],
+        'year': movie['year'],
+        'imdb': None,
+        'imdb_id': imdb_id(movie['imdb_link']),
+        'page_id': article_id(body),
+    }
+
+
+def extract_chunk(records):
+    return [extract_item(record) for record in records]
+
+
+def bounded_map(pool, records, workers):
+    """Результаты extract_item по всем записям; в пул отдаётся ограниченное окно задач
+    (imap_unordered сам вычитал бы весь итератор источников в очередь)"""
+    records = iter(records)
+    in_flight = deque()
+    while True:
+        chunk = list(itertools.islice(records, CHUNK_SIZE))
+        if chunk:
+            in_flight.append(pool.apply_async(extract_chunk, (chunk,)))
+        if in_flight and (not chunk or len(in_flight) >= workers * CHUNKS_PER_WORKER):
+            yield from in_flight.popleft().get()
+        if not chunk and not in_flight:
+            return
+
+
+class OfflinePipelines:
+    """ITEM_PIPELINES проекта без движка Scrapy: те же классы, тот же порядок"""
+
+    def __init__(self, settings):
+        self.crawler = Crawler(MoviesSpider, settings)
+        self.crawler.stats = MemoryStatsCollector(self.crawler)
+        # Паук только как контекст пайплайнов: его crawler — тот же, без движка
+        self.spider = MoviesSpider()
+        self.spider.crawler = self.crawler
+        self.pipelines = []
+        for path, _ in sorted(settings.getdict('ITEM_PIPELINES').items(), key=lambda pair: pair[1]):
+            cls = load_object(path)
+            try:
+                self.pipelines.append(cls.from_crawler(self.crawler) if hasattr(cls, 'from_crawler') else cls())
+            except NotConfigured:
+                pass
+
+    @property
+    def stats(self):
+        return self.crawler.stats
+
+    def open(self):
+        self.stats.open_spider(self.spider)
+        for pipeline in self.pipelines:
+            if hasattr(pipeline, 'open_spider'):
+                pipeline.open_spider(self.spider)
+
+    def process(self, item):
+        try:
+            for pipeline in self.pipelines:
+                item = pipeline.process_item(item, self.spider)
+        except DropItem:
+            self.stats.inc_value('item_dropped_count')
+            return
+        self.stats.inc_value('item_scraped_count')
+
+    def close(self):
+        for pipeline in self.pipelines:
+            if hasattr(pipeline, 'close_spider'):
+                pipeline.close_spider(self.spider)
+        self.stats.close_spider(self.spider, 'finished')
+        # Ошибку записи последних пакетов MoviesParserPipeline только логирует — здесь она роняет прогон
+        for pipeline in self.pipelines:
+            error = getattr(pipeline, 'error', None)
+            if error is not None:
+                raise RuntimeError('output writer failed: %s' % error) from error
+
+
+def reextract(paths, settings, workers=None):
+    """Извлечь фильмы из всех источников на workers процессах и прогнать через пайплайны; вернуть stats"""
+    pipelines = OfflinePipelines(settings)
+    pipelines.open()
+    start = time.monotonic()
+    pages = 0
+    fields = settings.getdict('INFOBOX_FIELDS') or None
+    workers = workers or os.cpu_count()
+    with multiprocessing.Pool(workers, initializer=offload.init_worker, initargs=(fields,)) as pool:
+        for item in bounded_map(pool, iter_sources(paths), workers):
+            pages += 1
+            if item is not None:
+                # Movie собираем здесь: так жанры и страны делят один словарь на весь процесс
+                pipelines.process(Movie.from_row(item))
+    pipelines.close()
+    elapsed = time.monotonic() - start
+    stats = pipelines.stats.get_stats()
+    stats['pages'] = pages
+    stats['elapsed_time_seconds'] = elapsed
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-extract films from saved article HTML')
+    parser.add_argument('sources', nargs='+', help='directories, tar archives or WARC files')
+    parser.add_argument('-o', '--output', help='OUTPUT_PATH')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='override a project setting')
+    args = parser.parse_args(argv)
+
+    settings = get_project_settings()
+    for pair in args.set:
+        name, _, value = pair.partition('=')
+        settings.set(name, value, priority='cmdline')
+    if args.output:
+        settings.set('OUTPUT_PATH', args.output, priority='cmdline')
+    configure_logging(settings)
+
+    stats = reextract(args.sources, settings, args.workers)
+    elapsed = stats['elapsed_time_seconds']
+    print('%d pages, %d items, %d dropped in %.2fs (%.1f pages/sec)' % (
+        stats['pages'], stats.get('item_scraped_count', 0), stats.get('item_dropped_count', 0),
+        elapsed, stats['pages'] / elapsed if elapsed else 0.0))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
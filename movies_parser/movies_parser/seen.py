@@ -0,0 +1,186 @@
+# Seen-URL stores for MoviesSpider
+#
+# Pages are keyed on a 64-bit hash of the canonical page id (host + article
+# title) instead of the raw URL string, so "%D0%A4..." and "Ф..." spellings
+# of the same article collapse into one key and memory stays flat.
+#
+# Pick a store with the SEEN_STORE setting:
+#   - movies_parser.seen.BloomSeenStore: Bloom filter, in memory or mmap-ed
+#     to SEEN_STORE_PATH, SEEN_STORE_CAPACITY keys at SEEN_STORE_ERROR_RATE
+#   - movies_parser.seen.SqliteSeenStore: exact keys in SQLite at SEEN_STORE_PATH
+
+import hashlib
+import math
+import mmap
+import os
+import sqlite3
+from urllib.parse import unquote, urlsplit
+
+CATEGORY_PREFIX = 'Категория:'
+
+
+def canonical_page_id(url):
+    """Привести URL статьи к виду host/Заголовок_статьи"""
+    parts = urlsplit(url)
+    # Мобильная версия (ru.m.wikipedia.org) — та же статья
+    host = parts.netloc.lower().replace('.m.', '.', 1)
+    path = unquote(parts.path)
+    if path.startswith('/wiki/'):
+        title = path[len('/wiki/'):].replace(' ', '_')
+        # MediaWiki не различает регистр первой буквы заголовка
+        title = title[:1].upper() + title[1:]
+        return host + '/' + title
+    return host + path + ('?' + unquote(parts.query) if parts.query else '')
+
+
+def page_key(url):
+    """64-битный ключ страницы по её каноническому id"""
+    digest = hashlib.blake2b(canonical_page_id(url).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def is_category(url):
+    """Ссылка ведёт на страницу категории, а не на статью"""
+    return CATEGORY_PREFIX in unquote(url)
+
+
+class SeenStore:
+    """Базовый интерфейс: `key in store`, `store.add(key)`, `store.close()`"""
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            path=settings.get('SEEN_STORE_PATH'),
+            capacity=settings.getint('SEEN_STORE_CAPACITY', 1000000),
+            error_rate=settings.getfloat('SEEN_STORE_ERROR_RATE', 0.001),
+        )
+
+    def __contains__(self, key):
+        raise NotImplementedError
+
+    def add(self, key):
+        raise NotImplementedError
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        pass
+
+
+class BloomSeenStore(SeenStore):
+    """Фильтр Блума; с path битовый массив живёт в mmap-файле и переживает рестарт.
+    Заголовок файла: число ключей (8 байт), num_bits (7 байт), num_hashes (1 байт)"""
+
+    HEADER = 16
+
+    def __init__(self, path=None, capacity=1000000, error_rate=0.001, **kwargs):
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        size = self.HEADER + (self.num_bits + 7) // 8
+        self.path = path
+        self.file = None
+        if path:
+            fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+            self.file = open(path, 'w+b' if fresh else 'r+b')
+            if fresh:
+                self.file.truncate(size)
+            else:
+                self.check_header(os.path.getsize(path), self.file.read(self.HEADER))
+            self.bits = mmap.mmap(self.file.fileno(), size)
+            self.bits[8:16] = self.num_bits.to_bytes(7, 'little') + bytes([self.num_hashes])
+            self.count = int.from_bytes(self.bits[:8], 'little')
+        else:
+            self.bits = bytearray(size)
+            self.count = 0
+
+    def check_header(self, file_size, header):
+        """Файл фильтра с другими параметрами не затираем, а отказываемся открывать"""
+        num_bits = int.from_bytes(header[8:15], 'little')
+        num_hashes = header[15]
+        # Файлы без параметров в заголовке (нули) проверяем только по размеру
+        if num_bits:
+            same = (num_bits, num_hashes) == (self.num_bits, self.num_hashes)
+        else:
+            same = file_size == self.HEADER + (self.num_bits + 7) // 8
+        if not same:
+            self.file.close()
+            self.file = None
+            raise ValueError(
+                'seen store %s was built for other SEEN_STORE_CAPACITY / SEEN_STORE_ERROR_RATE '
+                '(%s bits, %s hashes; now %d bits, %d hashes): restore the old settings or remove the file'
+                % (self.path, num_bits or (file_size - self.HEADER) * 8, num_hashes or '?',
+                   self.num_bits, self.num_hashes))
+
+    def _positions(self, key):
+        # Двойное хеширование: k позиций из двух половин 64-битного ключа
+        h1 = key & 0xFFFFFFFF
+        h2 = (key >> 32) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, key):
+        bits = self.bits
+        header = self.HEADER
+        for pos in self._positions(key):
+            if not bits[header + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        bits = self.bits
+        header = self.HEADER
+        added = False
+        for pos in self._positions(key):
+            index = header + (pos >> 3)
+            mask = 1 << (pos & 7)
+            if not bits[index] & mask:
+                bits[index] |= mask
+                added = True
+        if added:
+            self.count += 1
+            bits[:8] = self.count.to_bytes(8, 'little')
+
+    def close(self):
+        if self.file is not None:
+            self.bits.flush()
+            self.bits.close()
+            self.file.close()
+            self.file = None
+
+
+class SqliteSeenStore(SeenStore):
+    """Точное множество ключей в SQLite; коммитим пачками, чтобы не платить fsync за ключ"""
+
+    def __init__(self, path=None, commit_every=1000, **kwargs):
+        self.path = path or ':memory:'
+        self.commit_every = commit_every
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS seen (key INTEGER PRIMARY KEY) WITHOUT ROWID')
+        self.count = self.db.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+        self.pending = 0
+
+    def __contains__(self, key):
+        return self.db.execute('SELECT 1 FROM seen WHERE key = ?', (to_signed(key),)).fetchone() is not None
+
+    def add(self, key):
+        cursor = self.db.execute('INSERT OR IGNORE INTO seen (key) VALUES (?)', (to_signed(key),))
+        self.count += cursor.rowcount
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+
+def to_signed(key):
+    """SQLite хранит только знаковые 64-битные целые"""
+    return key - (1 << 64) if key >= (1 << 63) else key
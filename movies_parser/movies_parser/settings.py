@@ -22,6 +22,111 @@ ROBOTSTXT_OBEY = True
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
 CONCURRENT_REQUESTS = 32
 
+# Category tree frontier: how many spider requests may sit in the Scrapy
+# scheduler at once (the rest wait in the spider queue as plain URLs) and
+# the priority lanes for category listings, film articles and IMDb pages
+FRONTIER_MAX_IN_FLIGHT = 256
+FRONTIER_CATEGORY_PRIORITY = 0
+FRONTIER_FILM_PRIORITY = 10
+FRONTIER_IMDB_PRIORITY = 20
+
+# Memory-bounded crawl: with FRONTIER_STORE = "disk" the frontier queue, the
+# visited page keys and the film rows waiting for IMDb are kept in the
+# SQLite file FRONTIER_STORE_PATH (emptied at start) instead of in memory.
+# With MEMORY_TARGET_MB the number of frontier requests in the scheduler is
+# halved while the process RSS is above the target (0 disables)
+FRONTIER_STORE = "memory"
+FRONTIER_STORE_PATH = "movies_frontier.db"
+MEMORY_TARGET_MB = 0
+
+# Distributed crawl: with DISTRIBUTED_ENABLED several "movies" processes
+# (named by DISTRIBUTED_WORKER, hostname-pid by default) share the frontier
+# queue and the visited keys through DISTRIBUTED_BACKEND: a SQLite file at
+# DISTRIBUTED_PATH for workers on one machine, or RedisSharedFrontier at
+# DISTRIBUTED_REDIS_URL (needs the redis package) across machines. Pages
+# claimed by a worker that died are queued again after DISTRIBUTED_LEASE
+# seconds; a worker with nothing to do polls the queue every
+# DISTRIBUTED_POLL_INTERVAL seconds until no worker has pages left. Each
+# worker writes its own shard of OUTPUT_PATH; see
+# `python -m movies_parser.distributed` for running and merging them
+DISTRIBUTED_ENABLED = False
+DISTRIBUTED_WORKER = None
+DISTRIBUTED_BACKEND = "movies_parser.distributed.SqliteSharedFrontier"
+DISTRIBUTED_PATH = "movies_shared.db"
+DISTRIBUTED_REDIS_URL = "redis://localhost:6379/0"
+DISTRIBUTED_LEASE = 300
+DISTRIBUTED_POLL_INTERVAL = 1.0
+
+# Year-sharded crawl (`python -m movies_parser.shards run`): the launcher
+# starts one process per decade (or year) with SHARD_START_URLS set to that
+# shard's year categories (comma-separated); the spider then starts from
+# them instead of start_url
+SHARD_START_URLS = []
+
+# Crawl checkpoints: with CHECKPOINT_PATH the queue, visited pages, category
+# pagination and rows waiting for IMDb are logged append-only and committed
+# every CHECKPOINT_INTERVAL seconds together with the output file position.
+# CHECKPOINT_RESUME continues a crawl that died from its last commit (see
+# movies_parser.checkpoint); without it an existing log is overwritten
+CHECKPOINT_PATH = None
+CHECKPOINT_INTERVAL = 10
+CHECKPOINT_RESUME = False
+
+# Seen-page store: film articles processed in earlier runs are skipped.
+# BloomSeenStore keeps the filter in memory, or mmap-ed to SEEN_STORE_PATH;
+# SqliteSeenStore keeps exact keys in the SQLite file at SEEN_STORE_PATH
+SEEN_STORE = "movies_parser.seen.BloomSeenStore"
+SEEN_STORE_PATH = None
+SEEN_STORE_CAPACITY = 1000000
+SEEN_STORE_ERROR_RATE = 0.001
+
+# Prefilter: pages are checked for the "infobox" and category-listing markers
+# in their raw bytes before the HTML is parsed, and pages with neither are
+# dropped unparsed. Links whose title (spaces, not underscores) matches one
+# of PREFILTER_SKIP_TITLES are never requested (counted as
+# prefilter/skipped_links, logged at DEBUG). The list is empty by default, so
+# the crawl fetches the same pages as without it; opt in with e.g.
+#PREFILTER_SKIP_TITLES = [
+#    r"^(Шаблон|Портал|Проект|Википедия|Файл|Модуль|Участник|Участница|Справка|Служебная|Обсуждение[^:]*):",
+#    r"^Список ",
+#    r"^Категория:(Персоналии|Актёры|Актрисы|Кинорежиссёры|Сценаристы|Кинокомпании|Кинопремии)",
+#]
+PREFILTER_ENABLED = True
+PREFILTER_SKIP_TITLES = []
+
+# Infobox row header substrings feeding each item field (see movies_parser.infobox)
+INFOBOX_FIELDS = {
+    "director": ["Режиссёр"],
+    "genre": ["Жанр"],
+    "country": ["Страна", "Страны"],
+    "year": ["Год", "Дата Выхода", "Дата выхода", "Премьера"],
+}
+
+# Parse pages in a pool of worker processes instead of on the reactor thread
+# (0 disables); at most PARSE_POOL_MAX_PENDING pages are parsed at once
+# (0 means twice the pool size). Off by default: it only pays off with spare
+# cores (see benchmarks/bench_offload.py)
+PARSE_POOL_SIZE = 0
+PARSE_POOL_MAX_PENDING = 0
+
+# Incremental recrawl: remember ETag/Last-Modified, revision id and the last
+# item of every article, send conditional requests and emit only changed rows
+# (INCREMENTAL_EMIT_UNCHANGED re-emits stored rows for unchanged pages too)
+INCREMENTAL_ENABLED = False
+INCREMENTAL_STORE_PATH = "movies_revisions.db"
+INCREMENTAL_EMIT_UNCHANGED = False
+
+# MediaWiki API ingestion (the "movies_api" spider): category members are
+# listed API_MEMBERS_LIMIT per call (max 500) and article wikitext is fetched
+# API_PAGES_BATCH articles per call (max 50)
+API_MEMBERS_LIMIT = 500
+API_PAGES_BATCH = 50
+
+# Offline ingestion from a ruwiki multistream XML dump
+# (`python -m movies_parser.dump`): articles with a category matching
+# DUMP_CATEGORY_PATTERN (case-insensitive regex) and a film infobox become items
+DUMP_CATEGORY_PATTERN = r"фильмы\b.*\b\d{4} года"
+
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
@@ -44,28 +149,122 @@ CONCURRENT_REQUESTS = 32
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "movies_parser.middlewares.MoviesParserSpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    "movies_parser.middlewares.MoviesParserSpiderMiddleware": 543,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "movies_parser.middlewares.MoviesParserDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "movies_parser.middlewares.MoviesParserDownloaderMiddleware": 543,
+    # Above RetryMiddleware (550), so it sees 429/503 responses first
+    "movies_parser.middlewares.AdaptiveConcurrencyMiddleware": 560,
+}
+
+# Adaptive per-domain concurrency (AIMD): every domain starts at
+# ADAPTIVE_START_CONCURRENCY requests in flight, grows by about
+# ADAPTIVE_INCREASE per round trip and is multiplied by ADAPTIVE_DECREASE on
+# ADAPTIVE_CONGESTION_CODES, download errors or when its latency exceeds
+# ADAPTIVE_LATENCY_FACTOR times its baseline (the best latency of the last
+# ADAPTIVE_LATENCY_WINDOW responses, reset to the current one after each
+# latency decrease, so a slower but steady domain is not throttled for
+# good); after a status or error it stays below
+# the failed concurrency for ADAPTIVE_PROBE_INTERVAL seconds. Retry-After pauses the
+# domain (capped at ADAPTIVE_MAX_RETRY_AFTER seconds) and the throttled
+# request is re-queued up to ADAPTIVE_THROTTLE_RETRIES times.
+# CONCURRENT_REQUESTS still caps the total
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_START_CONCURRENCY = 8
+ADAPTIVE_MIN_CONCURRENCY = 1
+ADAPTIVE_MAX_CONCURRENCY = 32
+ADAPTIVE_INCREASE = 1.0
+ADAPTIVE_DECREASE = 0.5
+ADAPTIVE_LATENCY_FACTOR = 3.0
+ADAPTIVE_LATENCY_WINDOW = 100
+ADAPTIVE_PROBE_INTERVAL = 30
+ADAPTIVE_CONGESTION_CODES = [429, 503]
+ADAPTIVE_THROTTLE_RETRIES = 10
+ADAPTIVE_MAX_RETRY_AFTER = 300
+
+# Project response cache for development and re-parse runs: one SQLite file,
+# gzip (or zstd, needs the zstandard package) bodies, per-domain TTL in
+# seconds (0 = never expires) and LRU eviction above RESPONSE_CACHE_MAX_BYTES.
+# RESPONSE_CACHE_REPLAY_ONLY serves everything from the cache, with no network
+RESPONSE_CACHE_ENABLED = False
+RESPONSE_CACHE_PATH = "httpcache.db"
+RESPONSE_CACHE_CODEC = "gzip"
+RESPONSE_CACHE_DEFAULT_TTL = 7 * 24 * 3600
+RESPONSE_CACHE_TTL = {
+    "ru.wikipedia.org": 7 * 24 * 3600,
+    "www.imdb.com": 24 * 3600,
+}
+RESPONSE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+RESPONSE_CACHE_REPLAY_ONLY = False
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "movies_parser.metrics.MetricsExporter": 500,
+}
+
+# Crawl metrics (callback/cleaner CPU time, per-domain download latency,
+# frontier sizes, items/sec): a JSON snapshot is appended to METRICS_DUMP_PATH
+# every METRICS_DUMP_INTERVAL seconds, and with METRICS_PORT the same data is
+# served in Prometheus text format on http://localhost:<port>/metrics
+METRICS_DUMP_PATH = None
+METRICS_DUMP_INTERVAL = 60
+METRICS_PORT = 0
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
+   "movies_parser.pipelines.ImdbRatingsPipeline": 200,
+   "movies_parser.pipelines.DedupPipeline": 250,
    "movies_parser.pipelines.MoviesParserPipeline": 300,
 }
 
+# Output of MoviesParserPipeline: items are buffered and written in batches of
+# OUTPUT_BATCH_SIZE from a background thread. OUTPUT_FORMAT is "csv", "jsonl"
+# or "parquet" (needs pyarrow; genre/country are dictionary-encoded); an
+# OUTPUT_PATH ending in .csv/.jsonl/.parquet gets the OUTPUT_FORMAT extension.
+# OUTPUT_COMPRESSION is "gzip" for csv/jsonl or a Parquet codec ("snappy",
+# "zstd", ...); with OUTPUT_ROTATE_BYTES a new part file is started once the
+# current one grows past that size. OUTPUT_LAYOUT "flat" writes lists joined
+# with ", " as in the CSV; "nested" (jsonl/parquet only) writes genre,
+# director, country and year as lists and imdb/page_id as numbers.
+# OUTPUT_FIELDS are the baseline CSV columns; add "imdb_id" and/or "page_id"
+# to write them too (enrichment.py rates an existing CSV by its imdb_id column)
+OUTPUT_PATH = "movies_output.csv"
+OUTPUT_FORMAT = "csv"
+OUTPUT_FIELDS = ["title", "genre", "director", "country", "year", "imdb"]
+OUTPUT_BATCH_SIZE = 1000
+OUTPUT_COMPRESSION = None
+OUTPUT_ROTATE_BYTES = 0
+OUTPUT_LAYOUT = "flat"
+
+# Drop repeated films (redirects, several categories) by page id, IMDb tt-ID
+# or normalized (title, year) when the year is known and the page ids and
+# tt-IDs do not contradict each other, and merge their missing fields into the first
+# row while it is still in the OUTPUT_BATCH_SIZE buffer (dedup/merged_fields;
+# later duplicates only count as dedup/dropped); the last DEDUP_MAX_ENTRIES
+# keys are kept for merging, older ones only in a Bloom filter
+DEDUP_ENABLED = True
+DEDUP_MAX_ENTRIES = 200000
+
+# IMDb ratings: "chain" requests every film's IMDb page before emitting the
+# item, "dataset" emits Wikipedia items right away with their tt-ID and fills
+# the rating from IMDB_RATINGS_PATH (title.ratings.tsv.gz), "off" skips ratings
+IMDB_ENRICHMENT = "chain"
+IMDB_RATINGS_PATH = None
+
+# With "chain", an IMDb title page is downloaded only until its JSON-LD
+# block has closed and the rest of the transfer is cancelled. The block is
+# looked for in the first IMDB_CUTOFF_MAX_BYTES; a page with less than
+# IMDB_CUTOFF_MIN_BYTES still to come is let finish, keeping the connection
+IMDB_CUTOFF_ENABLED = True
+IMDB_CUTOFF_MAX_BYTES = 524288
+IMDB_CUTOFF_MIN_BYTES = 65536
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 #AUTOTHROTTLE_ENABLED = True
@@ -0,0 +1,213 @@
+# Year-sharded crawl: independent MoviesSpider processes over disjoint years
+#
+# The root category ("Фильмы по годам") only links to one subcategory per
+# year, so the crawl splits cleanly by year. The launcher reads the root
+# category, groups the year subcategories into shards (one per decade by
+# default, or one per year) and runs the shards as separate
+# `scrapy crawl movies` processes, at most --workers at a time. Each process
+# starts from its shard's year categories (SHARD_START_URLS) instead of the
+# root and writes its own partition of OUTPUT_PATH
+# (movies_output.y1990-1999.csv); its frontier, checkpoint, seen and cache
+# files get the same suffix. Unlike movies_parser.distributed the processes
+# share nothing, so they need no coordination and scale with cores and
+# bandwidth, but a shard that is much bigger than the others finishes last:
+# shards are started newest first (recent decades have the most films) and
+# the report shows every shard's time and the skew.
+#
+# When a shard finishes, its partition is sorted by (release year, title)
+# into a run file while the other shards are still crawling. The final
+# OUTPUT_PATH is a streaming k-way merge (heapq.merge) of the runs: memory
+# holds one row per shard plus the dedup index, and a film listed under two
+# years (it reached two shards) is written once, with the missing fields of
+# later copies merged into the first while it is still in the write buffer.
+# The output format and layout are OUTPUT_FORMAT / OUTPUT_LAYOUT, so the
+# merge can write CSV, JSON Lines or Parquet. If a shard exits with an
+# error, the partitions, run files and checkpoints are all kept and the
+# launcher prints the commands that rerun the failed shards and merge again.
+#
+#     python -m movies_parser.shards run -w 4 [--by decade|year] [-s NAME=VALUE ...]
+#     python -m movies_parser.shards merge -o movies_output.csv movies_output.y*.csv
+
+import argparse
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+from urllib.parse import unquote, urljoin
+from urllib.request import Request, urlopen
+
+from parsel import Selector
+from scrapy.utils.project import get_project_settings
+
+from movies_parser.distributed import (WORKER_FILE_SETTINGS, apply_overrides, merge_runs, merge_shards, run_path,
+                                       shard_files, sort_partition, worker_overrides)
+from movies_parser.exporters import output_path
+from movies_parser.spiders.movies import MoviesSpider
+
+# Файлы, которые у каждого шарда свои; имена шардов стабильны, так что между
+# запусками шард находит свои seen/инкрементальное хранилище/кэш
+SHARD_FILE_SETTINGS = WORKER_FILE_SETTINGS + ('CHECKPOINT_PATH', 'OUTPUT_PATH')
+YEAR_RE = re.compile(r'(\d{4})\D*$')
+
+
+def fetch(url, user_agent):
+    with urlopen(Request(url, headers={'User-Agent': user_agent}), timeout=60) as response:
+        return response.read().decode('utf-8')
+
+
+def year_categories(root_url, user_agent='Mozilla/5.0'):
+    """Подкатегории корневой категории по годам: [(год, URL)] по возрастанию"""
+    years = {}
+    url = root_url
+    while url:
+        page = Selector(text=fetch(url, user_agent))
+        for href in page.css('#mw-subcategories .mw-category-group a::attr(href)').getall():
+            match = YEAR_RE.search(unquote(href).replace('_', ' ').replace(' года', ''))
+            if match:
+                years.setdefault(int(match.group(1)), urljoin(url, href))
+        # Подкатегорий больше 200 — список продолжается на следующей странице
+        next_href = page.css('#mw-subcategories a').xpath('./text()[.="Следующая страница"]/../@href').get()
+        url = urljoin(url, next_href) if next_href else None
+    return sorted(years.items())
+
+
+def group_years(categories, by='decade'):
+    """Шарды [(имя, [URL])] по десятилетиям или годам, новые первыми"""
+    groups = {}
+    for year, url in categories:
+        start = year - year % 10 if by == 'decade' else year
+        groups.setdefault(start, []).append(url)
+    shards = []
+    for start in sorted(groups, reverse=True):
+        name = 'y%d-%d' % (start, start + 9) if by == 'decade' else 'y%d' % start
+        shards.append((name, groups[start]))
+    return shards
+
+
+def crawl_command(spider, name, index, urls, settings, overrides):
+    """Команда процесса-шарда: scrapy crawl со своими стартовыми категориями, файлами и METRICS_PORT"""
+    command = [sys.executable, '-m', 'scrapy', 'crawl', spider, '-s', 'SHARD_START_URLS=' + ','.join(urls)]
+    for pair in overrides:
+        command += ['-s', pair]
+    return command + worker_overrides(settings, name, index, SHARD_FILE_SETTINGS)
+
+
+def run_shards(shards, start, output, workers, poll=0.2):
+    """Запускать шарды по workers штук; готовый шард сразу сортируется в run-файл.
+    start(имя, URL) -> Popen. Вернуть [(имя, лет, секунд, строк, код возврата)]"""
+    waiting = list(shards)
+    running = {}
+    report = []
+    while waiting or running:
+        while waiting and len(running) < workers:
+            name, urls = waiting.pop(0)
+            running[name] = (start(name, urls), len(urls), time.monotonic())
+        time.sleep(poll)
+        for name, (process, years, started) in list(running.items()):
+            if process.poll() is None:
+                continue
+            elapsed = time.monotonic() - started
+            del running[name]
+            rows = sort_partition(shard_files(output, [name]), run_path(output, name))
+            report.append((name, years, elapsed, rows, process.returncode))
+    return report
+
+
+def print_report(report, elapsed, rows, duplicates, output):
+    print('%-14s %5s %9s %7s %11s' % ('shard', 'years', 'time', 'films', 'films/sec'))
+    for name, years, seconds, films, code in sorted(report):
+        print('%-14s %5d %8.1fs %7d %11.1f%s' % (name, years, seconds, films, films / seconds if seconds else 0.0,
+                                                 '' if code == 0 else '  (exit code %d)' % code))
+    times = [seconds for _, _, seconds, _, _ in report]
+    mean = sum(times) / len(times) if times else 0.0
+    print('%d shards in %.1fs (sum of shard times %.1fs), skew %.2f (slowest / mean shard time)' % (
+        len(report), elapsed, sum(times), max(times) / mean if mean else 0.0))
+    print('%d films (%d duplicates across shards) -> %s' % (rows, duplicates, output))
+
+
+def output_settings(settings):
+    return (settings.get('OUTPUT_FORMAT', 'csv'), settings.getlist('OUTPUT_FIELDS'),
+            settings.get('OUTPUT_COMPRESSION'), settings.get('OUTPUT_LAYOUT', 'flat'))
+
+
+def run(args):
+    settings = get_project_settings()
+    apply_overrides(settings, args.set)
+    root = args.root or MoviesSpider.start_url
+    categories = year_categories(root, settings.get('USER_AGENT') or 'Mozilla/5.0')
+    if not categories:
+        print('no year subcategories found in %s' % root)
+        return 1
+    shards = group_years(categories, args.by)
+    output = output_path(settings)
+    print('%d years (%d-%d) in %d shards, %d at a time' % (
+        len(categories), categories[0][0], categories[-1][0], len(shards), args.workers))
+
+    indexes = {name: i for i, (name, _) in enumerate(shards)}
+
+    def start(name, urls):
+        return subprocess.Popen(crawl_command(args.spider, name, indexes[name], urls, settings, args.set))
+
+    started = time.monotonic()
+    report = run_shards(shards, start, output, args.workers)
+    fmt, fields, compression, layout = output_settings(settings)
+    runs = [run_path(output, name) for name, _ in shards]
+    rows, duplicates = merge_runs(runs, output, fmt, fields, compression, layout,
+                                  max_entries=settings.getint('DEDUP_MAX_ENTRIES', 200000))
+    elapsed = time.monotonic() - started
+    print_report(report, elapsed, rows, duplicates, output)
+    failed = sorted(name for name, _, _, _, code in report if code)
+    if failed:
+        # Частичный выход и чекпойнт упавшего шарда — база для перезапуска, ничего не удаляем
+        urls = dict(shards)
+        print('shards failed: %s; their years are missing from %s' % (', '.join(failed), output))
+        print('partitions and run files are kept; rerun the failed shards, then merge:')
+        resume = ['CHECKPOINT_RESUME=1'] if settings.get('CHECKPOINT_PATH') else []
+        for name in failed:
+            print('  ' + shlex.join(crawl_command(args.spider, name, indexes[name], urls[name], settings,
+                                                  args.set + resume)))
+        print('  ' + shlex.join([sys.executable, '-m', 'movies_parser.shards', 'merge', '-o', output]
+                                + shard_files(output, [name for name, _ in shards])))
+        return 1
+    for path in runs:
+        os.remove(path)
+    if not args.keep_shards:
+        for path in shard_files(output, [name for name, _ in shards]):
+            os.remove(path)
+    return 0
+
+
+def merge(args):
+    settings = get_project_settings()
+    apply_overrides(settings, args.set)
+    output = args.output or output_path(settings)
+    fmt, fields, compression, layout = output_settings(settings)
+    rows, duplicates = merge_shards(args.shards, output, fmt, fields, compression, layout=layout,
+                                    max_entries=settings.getint('DEDUP_MAX_ENTRIES', 200000))
+    print('%d films (%d duplicates across shards) -> %s' % (rows, duplicates, output))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Year-sharded parallel crawl')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='crawl the year shards in parallel and merge their outputs')
+    run_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    run_parser.add_argument('--by', choices=('decade', 'year'), default='decade')
+    run_parser.add_argument('--root', help='root category URL (default: the spider start_url)')
+    run_parser.add_argument('--spider', default='movies')
+    run_parser.add_argument('--keep-shards', action='store_true')
+    merge_parser = commands.add_parser('merge', help='merge shard outputs into one output file')
+    merge_parser.add_argument('shards', nargs='+')
+    merge_parser.add_argument('-o', '--output', help='OUTPUT_PATH')
+    for sub in (run_parser, merge_parser):
+        sub.add_argument('-s', '--set', action='append', default=[], metavar='NAME=VALUE',
+                         help='override a project setting')
+    args = parser.parse_args(argv)
+    return {'run': run, 'merge': merge}[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
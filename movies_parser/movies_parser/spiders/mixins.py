@@ -0,0 +1,382 @@
+# Optional crawl modes of MoviesSpider, one mixin each
+#
+#   EnrichmentMixin     - IMDB_ENRICHMENT: chain (one IMDb request per film,
+#                         cut off after the JSON-LD block) or dataset/off
+#                         (items emitted right away)
+#   SharedFrontierMixin - DISTRIBUTED_ENABLED: queue and visited shared by
+#                         all workers (movies_parser.distributed)
+#   OffloadMixin        - PARSE_POOL_SIZE: HTML parsed in a process pool
+#                         (movies_parser.offload)
+#   IncrementalMixin    - INCREMENTAL_ENABLED: conditional requests and only
+#                         changed rows emitted (movies_parser.incremental)
+#   PrefilterMixin      - PREFILTER_ENABLED: raw-byte checks before the DOM
+#                         is built (movies_parser.prefilter)
+#
+# Each mixin sets its own state up in setup_<mode>(crawler), called from
+# MoviesSpider.from_crawler, and the spider's frontier, checkpoint and
+# parse_bfs stay in movies.py.
+
+import time
+
+import scrapy
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.misc import load_object
+
+from movies_parser import prefilter
+from movies_parser.distributed import worker_id
+from movies_parser.enrichment import imdb_id
+from movies_parser.frontier import WikiRow
+from movies_parser.incremental import RevisionStore, article_id, revision_id
+from movies_parser.items import Movie
+from movies_parser.jsonld import JsonLdCutoff, jsonld_block, rating as jsonld_rating
+from movies_parser.offload import ParsePool
+from movies_parser.prefilter import TitleFilter
+from movies_parser.seen import is_category, page_key
+
+
+def header_text(response, name):
+    value = response.headers.get(name)
+    return value.decode('latin-1') if value else None
+
+
+class EnrichmentMixin:
+    """Рейтинг IMDb: запрос на каждую статью (chain) или сразу готовый item (dataset/off)"""
+
+    def setup_enrichment(self, crawler):
+        settings = crawler.settings
+        self.imdb_priority = settings.getint('FRONTIER_IMDB_PRIORITY', 20)
+        self.imdb_enrichment = settings.get('IMDB_ENRICHMENT', 'chain')
+        # Страницы IMDb докачиваются только до блока JSON-LD с рейтингом
+        self.jsonld_cutoff = None
+        if self.imdb_enrichment == 'chain':
+            self.jsonld_cutoff = JsonLdCutoff.from_crawler(crawler)
+
+    def movie_results(self, key, page_id, title, genre, director, country, year, imdb_link):
+        """Запрос рейтинга на IMDb или готовый item по очищенным данным статьи
+        (key — ключ страницы в seen/инкрементальном хранилище, page_id — Page ID статьи).
+        Фильм выдаётся в любом режиме, есть у него ссылка на IMDb или нет; без ссылки — без рейтинга"""
+        # Рейтинг по ссылке запрашиваем только в режиме chain; иначе его заполнит
+        # отдельная стадия (ImdbRatingsPipeline) — выдаём сразу
+        if self.imdb_enrichment == 'chain' and imdb_link:
+            yield self.imdb_request(WikiRow(title, genre, director, country, year,
+                                            imdb_id(imdb_link), page_id), imdb_link, key)
+            return
+
+        item = self.emit(Movie.from_cleaned(title, genre, director, country, year,
+                                            imdb_id=imdb_id(imdb_link), page_id=page_id), key)
+        if item:
+            yield item
+
+    def imdb_request(self, row, imdb_link, key):
+        # Сами данные ждут ответа в хранилище, в запросе — только id строки
+        row_id = self.pending.put(row)
+        if self.checkpoint is not None:
+            self.checkpoint.row_added(row_id, row, imdb_link, key)
+        meta = {'pending_id': row_id, 'page_key': key}
+        headers = {'User-Agent': 'Mozilla/5.0'}
+        if self.jsonld_cutoff is not None:
+            meta['jsonld_cutoff'] = True
+            # Обрезать на лету умеем только gzip, не br/zstd
+            headers['Accept-Encoding'] = 'gzip'
+        return scrapy.Request(
+            url=imdb_link,
+            callback=self.parse_imdb,
+            errback=self.parse_imdb_failed,
+            meta=meta,
+            headers=headers,
+            priority=self.imdb_priority
+        )
+
+    def pop_row(self, row_id):
+        row = self.pending.pop(row_id)
+        if self.checkpoint is not None:
+            self.checkpoint.row_done(row_id)
+        return row
+
+    def parse_imdb(self, response):
+        rating = None
+        wiki_data = self.pop_row(response.meta['pending_id'])
+        if wiki_data is None:
+            return
+        # Блок JSON-LD уже вырезан при загрузке (JsonLdCutoff) или ищется в теле ответа
+        block = response.meta.get('jsonld')
+        if block is None:
+            block = jsonld_block(response.body)
+        try:
+            if block is None:
+                raise ValueError('no JSON-LD block')
+            rating = jsonld_rating(block)
+        except Exception as e:
+            self.logger.error(f"Ошибка при извлечении рейтинга: {e}")
+
+        key = response.meta.get('page_key')
+        item = self.emit(Movie.from_cleaned(
+            wiki_data.title, wiki_data.genre, wiki_data.director, wiki_data.country, wiki_data.year,
+            imdb=rating, imdb_id=wiki_data.imdb_id, page_id=wiki_data.page_id,
+        ), key)
+        # Статья обработана только сейчас; если IMDb не ответил, следующий запуск её повторит
+        if key is not None:
+            self.seen.add(key)
+        if item:
+            yield item
+
+    def parse_imdb_failed(self, failure):
+        # Страница IMDb не скачалась — строка, как и раньше, теряется, но хранилище не растёт
+        self.pop_row(failure.request.meta['pending_id'])
+        self.crawler.stats.inc_value('pending/imdb_failed')
+
+
+class SharedFrontierMixin:
+    """Очередь и visited общие для всех воркеров (movies_parser.distributed)"""
+
+    def setup_shared(self, crawler):
+        settings = crawler.settings
+        self.shared = None
+        if not settings.getbool('DISTRIBUTED_ENABLED'):
+            return
+        self.shared = load_object(settings.get('DISTRIBUTED_BACKEND')).from_crawler(crawler)
+        self.worker = worker_id(settings)
+        self.lease = settings.getint('DISTRIBUTED_LEASE', 300)
+        self.poll_interval = settings.getfloat('DISTRIBUTED_POLL_INTERVAL', 1.0)
+        self.poller = None
+        # Id разобранных страниц, о которых ещё не сообщили общему фронтиру
+        self.finished = []
+
+    def follow_shared(self, urls):
+        """follow_urls для общего фронтира: visited проверяет и пополняет он сам"""
+        entries = []
+        for url in urls:
+            if self.skip_link(url):
+                continue
+            key = page_key(url)
+            if not is_category(url) and self.revisions is None and key in self.seen:
+                self.crawler.stats.inc_value('seen/skipped')
+                continue
+            entries.append((key, url))
+        if entries:
+            self.crawler.stats.inc_value('distributed/added', self.shared.add(entries))
+        yield from self.drain_queue()
+
+    def drain_shared(self):
+        """drain_queue для общего фронтира: сообщить о разобранных страницах и забрать новые
+        пачкой в 1/8 лимита — реже ходим в хранилище и не забираем всю очередь себе"""
+        limit = self.in_flight_limit()
+        batch = max(1, limit // 8)
+        free = limit - self.in_flight
+        if free < batch and self.in_flight:
+            return
+        self.flush_finished()
+        claimed = self.shared.claim(self.worker, min(free, batch))
+        self.crawler.stats.inc_value('distributed/claimed', len(claimed))
+        for frontier_id, url in claimed:
+            self.in_flight += 1
+            yield self.frontier_request(url, frontier_id)
+
+    def flush_finished(self):
+        if self.finished:
+            self.shared.done(self.finished)
+            self.finished = []
+
+    def shared_idle(self):
+        """Своих запросов нет: взять страницы из общего фронтира; закрыться,
+        только когда их нет и ни один воркер ничего не разбирает"""
+        self.in_flight = 0
+        requeued = self.shared.requeue_stale(self.lease)
+        if requeued:
+            self.logger.warning("Возвращено в очередь страниц упавших воркеров: %d", requeued)
+            self.crawler.stats.inc_value('distributed/requeued', requeued)
+        requests = list(self.drain_queue())
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        if requests:
+            raise DontCloseSpider
+        # Другие воркеры ещё могут найти новые ссылки — ждём их
+        if self.shared.pending():
+            self.start_polling()
+            raise DontCloseSpider
+
+    def start_polling(self):
+        """Пока страницы есть только у других воркеров, проверять общую очередь
+        каждые DISTRIBUTED_POLL_INTERVAL секунд, а не раз в 5 секунд цикла idle"""
+        from twisted.internet import task
+
+        if self.poller is None or not self.poller.running:
+            self.poller = task.LoopingCall(self.poll_shared)
+            self.poller.start(self.poll_interval, now=False)
+
+    def poll_shared(self):
+        requests = list(self.drain_queue())
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        if requests or not self.shared.pending():
+            self.poller.stop()
+
+    def close_shared(self):
+        if self.poller is not None and self.poller.running:
+            self.poller.stop()
+        self.flush_finished()
+        self.shared.close()
+
+
+class OffloadMixin:
+    """Разбор HTML в пуле процессов, чтобы не занимать поток реактора"""
+
+    def setup_offload(self, crawler):
+        self.parse_pool = None
+        if crawler.settings.getint('PARSE_POOL_SIZE'):
+            self.parse_pool = ParsePool.from_crawler(crawler)
+
+    def page_callback(self, callback):
+        """В режиме пула процессов все страницы разбирает parse_offloaded"""
+        return callback if self.parse_pool is None else self.parse_offloaded
+
+    async def parse_offloaded(self, response):
+        """parse и parse_bfs в одном, но HTML разбирается в пуле процессов"""
+        frontier = 'page_key' in response.meta
+        if frontier:
+            self.page_finished(response.meta)
+            if self.page_unchanged(response):
+                for result in self.replay_unchanged(response):
+                    yield result
+                self.page_done(response.meta)
+                return
+            # Страницу без инфобокса и списков в пул даже не отправляем
+            if self.scan(response) == (False, False):
+                self.record_revision(response, False)
+                for result in self.drain_queue():
+                    yield result
+                self.page_done(response.meta)
+                return
+
+        page = await self.parse_pool.parse(response)
+
+        pending = False
+        if page['movie']:
+            for result in self.movie_results(response.meta.get('page_key'), article_id(response.body),
+                                             **page['movie']):
+                pending = pending or isinstance(result, scrapy.Request)
+                yield result
+        if frontier:
+            self.record_revision(response, pending)
+
+        for result in self.follow_urls(page['links']):
+            yield result
+        if page['next_page']:
+            for result in self.follow_next_url(page['next_page']):
+                yield result
+        self.page_done(response.meta)
+
+
+class IncrementalMixin:
+    """Условные запросы к статьям и выдача только изменившихся строк"""
+
+    def setup_incremental(self, crawler):
+        settings = crawler.settings
+        self.revisions = None
+        if settings.getbool('INCREMENTAL_ENABLED'):
+            self.revisions = RevisionStore.from_crawler(crawler)
+        self.emit_unchanged = settings.getbool('INCREMENTAL_EMIT_UNCHANGED')
+
+    def page_unchanged(self, response):
+        """True, если статья не менялась с прошлого запуска (сервер ответил 304 или ревизия та же)"""
+        if response.meta.get('category'):
+            return False
+        key = response.meta['page_key']
+        if self.revisions is None:
+            return False
+        if response.status != 304 and not self.revisions.unchanged(key, revision_id(response.body)):
+            return False
+        self.seen.add(key)
+        self.crawler.stats.inc_value('incremental/unchanged_pages')
+        return True
+
+    def replay_unchanged(self, response):
+        if self.emit_unchanged:
+            item = self.revisions.item(response.meta['page_key'])
+            if item:
+                yield Movie.from_row(item)
+        yield from self.drain_queue()
+
+    def record_revision(self, response, pending):
+        """Запомнить валидаторы статьи и отметить её в seen; пока ждём IMDb, страница считается
+        необработанной — в seen её добавит parse_imdb, когда item будет выдан"""
+        if response.meta.get('category'):
+            return
+        if not pending:
+            self.seen.add(response.meta['page_key'])
+        if self.revisions is None:
+            return
+        self.revisions.record(
+            response.meta['page_key'],
+            etag=header_text(response, 'ETag'),
+            last_modified=header_text(response, 'Last-Modified'),
+            revision=revision_id(response.body),
+            complete=not pending,
+        )
+
+    def emit(self, item, key):
+        """Вернуть item для выдачи; в инкрементальном режиме — только если он изменился"""
+        if self.revisions is None or key is None:
+            return item
+        # В хранилище — плоская форма (как в CSV), чтобы сравнение не зависело от типов полей
+        if self.revisions.put_item(key, item.to_flat()):
+            return item
+        self.crawler.stats.inc_value('incremental/unchanged_items')
+        return None
+
+
+class PrefilterMixin:
+    """Проверка сырых байтов до разбора HTML и ссылки, которые не скачиваем вовсе"""
+
+    def setup_prefilter(self, crawler):
+        settings = crawler.settings
+        self.prefilter = settings.getbool('PREFILTER_ENABLED', True)
+        self.title_filter = TitleFilter.from_settings(settings)
+        # Сколько стоило строить DOM на прошедших фильтр страницах — для оценки экономии
+        self.dom_seconds = 0.0
+        self.dom_pages = 0
+
+    def scan(self, response):
+        """(инфобокс, списки) по сырым байтам ответа; без PREFILTER_ENABLED — (True, True)"""
+        if not self.prefilter:
+            return True, True
+        start = time.process_time()
+        infobox, listing = prefilter.scan(response.body)
+        self.metrics.add_cpu('prefilter', time.process_time() - start)
+        stats = self.crawler.stats
+        stats.inc_value('prefilter/pages')
+        if not infobox and not listing:
+            stats.inc_value('prefilter/rejected')
+        elif not infobox:
+            stats.inc_value('prefilter/no_infobox')
+        return infobox, listing
+
+    def build_dom(self, response):
+        """Построить дерево lxml заранее, замерив, сколько это стоит"""
+        start = time.process_time()
+        response.selector
+        self.dom_seconds += time.process_time() - start
+        self.dom_pages += 1
+
+    def skip_link(self, url):
+        """True, если заголовок ссылки попал под PREFILTER_SKIP_TITLES; каждый пропуск — в stats и DEBUG-лог"""
+        if not self.title_filter.skip(url):
+            return False
+        self.crawler.stats.inc_value('prefilter/skipped_links')
+        self.logger.debug('Skipped by PREFILTER_SKIP_TITLES: %s', url)
+        return True
+
+    def report_prefilter(self):
+        """Доля отброшенных по байтам страниц и оценка снизу сэкономленного CPU
+        (средняя цена построения DOM на разобранных страницах)"""
+        stats = self.crawler.stats
+        pages = stats.get_value('prefilter/pages', 0)
+        if not pages:
+            return
+        rejected = stats.get_value('prefilter/rejected', 0)
+        saved = rejected * self.dom_seconds / self.dom_pages if self.dom_pages else 0.0
+        stats.set_value('prefilter/rejected_ratio', round(rejected / pages, 4))
+        stats.set_value('prefilter/cpu_saved_seconds', round(saved, 3))
+        self.logger.info('Prefilter: %d of %d pages (%.1f%%) rejected without parsing, ~%.2fs CPU saved; '
+                         '%d links skipped by title', rejected, pages, 100.0 * rejected / pages, saved,
+                         stats.get_value('prefilter/skipped_links', 0))
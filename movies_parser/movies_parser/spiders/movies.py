@@ -1,338 +1,328 @@
-import json
-import re
-import ast
+# Category-tree crawl of ru.wikipedia.org: the frontier (queue, visited,
+# in-flight limit), checkpoints and film parsing. The optional modes
+# (IMDb enrichment, shared frontier, process pool, incremental crawl,
+# prefilter) live in movies_parser.spiders.mixins.
+
+import time
 import scrapy
 from collections import deque
 
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.misc import load_object
+
+from movies_parser import cleaning
+from movies_parser.checkpoint import Checkpoint
+from movies_parser.distributed import url_key
+from movies_parser.frontier import Frontier, MemoryGovernor, peak_rss
+from movies_parser.incremental import article_id
+from movies_parser.infobox import InfoboxExtractor
+from movies_parser.metrics import Metrics
+from movies_parser.seen import is_category, page_key
+from movies_parser.spiders.mixins import (EnrichmentMixin, IncrementalMixin, OffloadMixin, PrefilterMixin,
+                                          SharedFrontierMixin)
 
-class MoviesSpider(scrapy.Spider):
+
+class MoviesSpider(EnrichmentMixin, SharedFrontierMixin, OffloadMixin, IncrementalMixin, PrefilterMixin,
+                   scrapy.Spider):
     name = "movies"
     allowed_domains = ["ru.wikipedia.org", "imdb.com"]
+    start_url = "https://ru.wikipedia.org/wiki/%D0%9A%D0%B0%D1%82%D0%B5%D0%B3%D0%BE%D1%80%D0%B8%D1%8F:%D0%A4%D0%B8%D0%BB%D1%8C%D0%BC%D1%8B_%D0%BF%D0%BE_%D0%B3%D0%BE%D0%B4%D0%B0%D0%BC"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Используем очередь как в BFS: состояние обхода у каждого паука своё.
+        # visited — ключи страниц, уже поставленных в очередь в этом запуске
+        self.visited = set()
+        self.queue = deque()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        # Сколько запросов фронтира одновременно отдаём планировщику Scrapy,
+        # остальные ссылки ждут в очереди в виде строк
+        spider.max_in_flight = settings.getint('FRONTIER_MAX_IN_FLIGHT', 256)
+        spider.category_priority = settings.getint('FRONTIER_CATEGORY_PRIORITY', 0)
+        spider.film_priority = settings.getint('FRONTIER_FILM_PRIORITY', 10)
+        spider.in_flight = 0
+        # Очередь, visited и строки, ждущие IMDb: в памяти или в SQLite (FRONTIER_STORE)
+        spider.frontier = Frontier.from_crawler(crawler)
+        spider.queue = spider.frontier.queue
+        spider.visited = spider.frontier.visited
+        spider.pending = spider.frontier.pending
+        # Лимит фронтира урезается, пока RSS выше MEMORY_TARGET_MB
+        spider.memory = MemoryGovernor.from_crawler(crawler, spider.max_in_flight)
+        # Статьи, обработанные в прошлых запусках, хранятся в seen-хранилище
+        spider.seen = load_object(settings.get('SEEN_STORE', 'movies_parser.seen.BloomSeenStore')).from_crawler(crawler)
+        spider.infobox = InfoboxExtractor.from_settings(settings)
+        # Шард годов (movies_parser.shards) начинает со своих категорий годов, а не с корня
+        spider.roots = settings.getlist('SHARD_START_URLS') or [spider.start_url]
+        # Режимы из movies_parser.spiders.mixins
+        spider.setup_enrichment(crawler)
+        spider.setup_shared(crawler)
+        spider.setup_prefilter(crawler)
+        spider.setup_incremental(crawler)
+        spider.setup_offload(crawler)
+        # Размеры фронтира снимаются в момент выгрузки метрик
+        spider.metrics = Metrics.from_crawler(crawler)
+        spider.metrics.gauge('frontier_queue_size', lambda: len(spider.queue))
+        spider.metrics.gauge('frontier_visited_size', lambda: len(spider.visited))
+        spider.metrics.gauge('frontier_in_flight', lambda: spider.in_flight)
+        spider.metrics.gauge('frontier_pending_size', lambda: len(spider.pending))
+        # Журнал состояния краула для продолжения после падения (CHECKPOINT_PATH)
+        spider.checkpoint = Checkpoint.from_crawler(crawler)
+        spider.resumed_requests = []
+        if spider.checkpoint is not None:
+            if spider.shared is not None:
+                raise ValueError('CHECKPOINT_PATH can not be combined with DISTRIBUTED_ENABLED: '
+                                 'the shared frontier already outlives its workers')
+            if spider.checkpoint.resumed:
+                spider.restore_checkpoint()
+            else:
+                spider.checkpoint.open()
+            crawler.signals.connect(spider.checkpoint.start, signal=signals.spider_opened)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    def restore_checkpoint(self):
+        """Поднять состояние из лога чекпоинта: visited, очередь (с недокачанными страницами
+        и продолжениями категорий) и запросы к IMDb, на которые не пришёл ответ"""
+        state = self.checkpoint.state
+        for key in state.visited:
+            self.visited.add(key)
+        for url in state.pages.values():
+            self.queue_page(page_key(url), url)
+        for row, imdb_link, key in state.rows.values():
+            self.resumed_requests.append(self.imdb_request(row, imdb_link, key))
+        self.checkpoint.open(state.visited)
 
     def start_requests(self):
-        url = "https://ru.wikipedia.org/wiki/%D0%9A%D0%B0%D1%82%D0%B5%D0%B3%D0%BE%D1%80%D0%B8%D1%8F:%D0%A4%D0%B8%D0%BB%D1%8C%D0%BC%D1%8B_%D0%BF%D0%BE_%D0%B3%D0%BE%D0%B4%D0%B0%D0%BC"
-        yield scrapy.Request(url=url, callback=self.parse,
-                             headers={'Use-Agent':'Mozilla/5.0'})
+        # Стартовую категорию ставит в общую очередь первый запущенный воркер
+        if self.shared is not None:
+            yield from self.follow_urls(self.roots)
+            return
+        # Продолжение по чекпоинту: стартовая страница уже разобрана или лежит в очереди
+        if self.checkpoint is not None and self.checkpoint.resumed:
+            state = self.checkpoint.state
+            self.crawler.stats.set_value('checkpoint/restored_pages', len(state.pages))
+            self.crawler.stats.set_value('checkpoint/restored_rows', len(state.rows))
+            yield from self.resumed_requests
+            yield from self.drain_queue()
+            return
+        for url in self.roots:
+            yield scrapy.Request(url=url, callback=self.page_callback(self.parse),
+                                 priority=self.category_priority,
+                                 headers={'User-Agent':'Mozilla/5.0'}, meta=self.track_page(url))
 
-        # Используем очередь как в BFS
+    def parse(self, response):
+        # Собираем все ссылки под заголовками <h3> и сразу раздаём их планировщику
+        yield from self.follow_links(response)
+        yield from self.follow_next_page(response)
+        if self.checkpoint is not None:
+            self.page_done(response.meta)
 
-    visited = set()
-    queue = deque()
+    def parse_bfs(self, response):
+        self.page_finished(response.meta)
+
+        # Статья не менялась с прошлого запуска — parse_movie не нужен
+        if self.page_unchanged(response):
+            yield from self.replay_unchanged(response)
+            self.page_done(response.meta)
+            return
+
+        # Ни инфобокса, ни списков категории — DOM не строим
+        infobox, listing = self.scan(response)
+        if not infobox and not listing:
+            self.record_revision(response, False)
+            yield from self.drain_queue()
+            self.page_done(response.meta)
+            return
+        self.build_dom(response)
 
-    def parse(self, response):
-        # Собираем все ссылки под заголовками <h3>
+        # Если есть инфобокс — вызываем парсинг фильма
+        pending = False
+        if infobox and response.css('.infobox'):
+            for result in self.metrics.timed(self.parse_movie(response), 'callback', callback='parse_movie'):
+                pending = pending or isinstance(result, scrapy.Request)
+                yield result
+        self.record_revision(response, pending)
+
+        # Ищем следующие ссылки, добавляем во фронтир
+        if listing:
+            yield from self.follow_links(response)
+            yield from self.follow_next_page(response)
+        else:
+            yield from self.drain_queue()
+        self.page_done(response.meta)
+
+    def parse_bfs_failed(self, failure):
+        self.page_finished(failure.request.meta)
+        yield from self.drain_queue()
+        self.page_done(failure.request.meta)
+
+    def page_finished(self, meta):
+        """Запрос фронтира отработал: освободить место; страницу общего фронтира — отметить разобранной"""
+        self.in_flight -= 1
+        if 'frontier_id' in meta:
+            self.finished.append(meta['frontier_id'])
+
+    def page_done(self, meta):
+        """Страница отдала всё: её ссылки в очереди, items выданы — в чекпоинте она закрыта"""
+        if self.checkpoint is not None and 'task' in meta:
+            self.checkpoint.page_done(meta['task'])
+
+    def track_page(self, url):
+        """Записать в чекпоинт страницу, которая идёт в планировщик мимо очереди; вернуть её meta"""
+        if self.checkpoint is None:
+            return None
+        self.checkpoint.page_added(page_key(url), url)
+        return {'task': url_key(url)}
+
+    def spider_idle(self, spider):
+        if self.shared is not None:
+            return self.shared_idle()
+        # Страховка: если какой-то запрос потерялся, не даём пауку закрыться,
+        # пока в очереди остаются ссылки
+        if not self.queue:
+            return
+        self.in_flight = 0
+        for request in self.drain_queue():
+            self.crawler.engine.crawl(request)
+        raise DontCloseSpider
+
+    def closed(self, reason):
+        self.report_prefilter()
+        rss = peak_rss()
+        if rss is not None:
+            self.crawler.stats.set_value('memory/peak_rss_mb', rss // 2 ** 20)
+        self.frontier.close()
+        if self.shared is not None:
+            self.close_shared()
+        self.seen.close()
+        if self.parse_pool is not None:
+            self.parse_pool.close()
+        if self.revisions is not None:
+            self.revisions.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close(reason == 'finished')
+
+    def follow_links(self, response):
         links = response.css('.mw-category-group a::attr(href)').getall()
-        for link in links:
-            url = response.urljoin(link)
-            if url not in self.visited:
-                self.queue.append(url)
-                self.visited.add(url)
+        yield from self.follow_urls(response.urljoin(link) for link in links)
+
+    def follow_urls(self, urls):
+        if self.shared is not None:
+            yield from self.follow_shared(urls)
+            return
+        for url in urls:
+            key = page_key(url)
+            if key in self.visited:
+                continue
+            self.visited.add(key)
+            # Ветки, которые заведомо не про фильмы, не скачиваем
+            if self.skip_link(url):
+                continue
+            # Статьи из прошлых запусков пропускаем, категории обходим заново,
+            # чтобы найти новые фильмы
+            if not is_category(url) and self.revisions is None and key in self.seen:
+                self.crawler.stats.inc_value('seen/skipped')
+                continue
+            self.queue_page(key, url)
 
-        # Запускаем обход из очереди
-        while self.queue:
-            next_url = self.queue.popleft()
-            yield scrapy.Request(next_url, callback=self.parse_bfs)
+        yield from self.drain_queue()
 
-    def parse_bfs(self, response):
-        # Если есть инфобокс — вызываем парсинг фильма
-        if response.css('.infobox'):
-            yield from self.parse_movie(response)
-
-        # Ищем следующие ссылки, добавляем в очередь
-        new_links = response.css('.mw-category-group a::attr(href)').getall()
-        for link in new_links:
-            url = response.urljoin(link)
-            if url not in self.visited:
-                self.queue.append(url)
-                self.visited.add(url)
-
-        # Продолжаем обход, если остались ссылки
-        if self.queue:
-            next_url = self.queue.popleft()
-            yield scrapy.Request(next_url, callback=self.parse_bfs)
+    def queue_page(self, key, url):
+        self.queue.append(url)
+        if self.checkpoint is not None:
+            self.checkpoint.page_added(key, url)
 
+    def follow_next_page(self, response):
         next_page_href = response.css('#mw-pages a').xpath('./text()[.="Следующая страница"]/../@href').extract_first()
         if next_page_href:
-            yield response.follow(next_page_href, callback=self.parse)
-        full_url = response.urljoin(next_page_href)
-        print(full_url)
+            yield from self.follow_next_url(response.urljoin(next_page_href))
+
+    def follow_next_url(self, url):
+        # Следующую страницу категории тоже может забрать любой воркер
+        if self.shared is not None:
+            self.shared.add([(url_key(url), url)])
+            yield from self.drain_queue()
+        else:
+            yield self.next_page_request(url)
+
+    def next_page_request(self, url):
+        self.logger.debug("Следующая страница категории: %s", url)
+        # Позиция в списке категории — тоже часть чекпоинта
+        return scrapy.Request(url, callback=self.page_callback(self.parse),
+                              priority=self.category_priority, meta=self.track_page(url))
+
+    def in_flight_limit(self):
+        """Сколько запросов фронтира можно держать в планировщике сейчас"""
+        return self.max_in_flight if self.memory is None else self.memory.limit()
+
+    def drain_queue(self):
+        """Отдать планировщику ссылки из очереди, пока не заполнен лимит фронтира"""
+        if self.shared is not None:
+            yield from self.drain_shared()
+            return
+        while self.queue and self.in_flight < self.in_flight_limit():
+            url = self.queue.popleft()
+            self.in_flight += 1
+            yield self.frontier_request(url)
+
+    def frontier_request(self, url, frontier_id=None):
+        """Запрос страницы фронтира; frontier_id — её id в общем фронтире"""
+        # Дубли отсекаем сами через visited, фильтр Scrapy не нужен
+        category = is_category(url)
+        key = page_key(url)
+        meta = {'category': category, 'page_key': key}
+        if frontier_id is not None:
+            meta['frontier_id'] = frontier_id
+        if self.checkpoint is not None:
+            meta['task'] = url_key(url)
+        headers = None
+        if self.revisions is not None and not category:
+            headers = self.revisions.conditional_headers(key)
+            meta['handle_httpstatus_list'] = [304]
+        return scrapy.Request(url, callback=self.page_callback(self.parse_bfs), errback=self.parse_bfs_failed,
+                              priority=self.category_priority if category else self.film_priority,
+                              meta=meta, headers=headers, dont_filter=True)
+
+    # Правила очистки живут в movies_parser.cleaning (там же пакетный API)
+    def timed_clean(self, field, cleaner, value):
+        start = time.process_time()
+        result = cleaner(value)
+        self.metrics.add_cpu('cleaner', time.process_time() - start, field=field)
+        return result
 
     def clean_title(self, title):
-        """Очистить название фильма от лишних кавычек и пробелов"""
-        # Убираем лишние кавычки в начале и в конце строки
-        title = title.strip().strip('"').strip()
-
-        return title
+        return self.timed_clean('title', cleaning.clean_title, title)
 
     def clean_year(self, year_input):
-        """Оставить только уникальные года из 4 цифр и вернуть строку, разделенную запятыми"""
-        # Преобразуем строку в настоящий список, если это строковое представление списка
-        if isinstance(year_input, str):
-            try:
-                year_input = ast.literal_eval(year_input)
-            except (ValueError, SyntaxError):
-                pass  # Если строка не является корректным представлением списка, ничего не делаем
-
-        # Теперь год должен быть списком, так что обрабатываем его как список
-        if isinstance(year_input, list):
-            # Преобразуем все элементы в строки и находим все года
-            year_input = ' '.join(map(str, year_input))
-
-        years = re.findall(r'\b\d{4}\b', year_input)  # Ищем все года в строке
-
-        # Убираем дубликаты и сортируем
-        unique_years = sorted(set(years), reverse=True)
-
-        # Возвращаем строку годов, разделенную запятыми
-        return ', '.join(unique_years)
+        return self.timed_clean('year', cleaning.clean_year, year_input)
 
     def clean_director(self, director_list):
-        """Очистить список режиссеров от мусора и оставить только похожее на имена"""
-        cleaned_list = []
-        for c in director_list:
-            c = c.strip()
-            if not c:
-                continue
-            if not c.strip(','):
-                continue
-            # Убираем лишние пробелы вокруг точек
-            c = re.sub(r'\s*\.\s*', '.', c)
-            # Убираем лишние пробелы вокруг дефисов
-            c = re.sub(r'\s*-\s*', '-', c)
-
-            # Теперь проверяем через регулярку
-            if re.fullmatch(r"[A-Za-zА-Яа-яЁё][-A-Za-zА-Яа-яЁё'\.\s]{2,}", c):
-                cleaned_list.append(c)
-
-        director = ', '.join(cleaned_list)
-        director = re.sub(r'\s*,\s*', ', ', director)
-        director = re.sub(r',+', ',', director)
-        director = director.strip(' ,')
-
-        return director
+        return self.timed_clean('director', cleaning.clean_director, director_list)
 
     def clean_country(self, country_list):
-        """Очистить список стран от мусора"""
-        cleaned_list = []
-        for c in country_list:
-            c = c.strip()
-            if not c:
-                continue
-
-            # Убираем ссылки/сноски типа [1], [12], [a], просто []
-            c = re.sub(r'\[.*?\]', '', c)
-            c = c.strip()
-
-            # Убираем одиночные цифры, символы типа "~", мусор
-            if re.fullmatch(r'[\d~\-\+]+', c):
-                continue
-
-            # Убираем пустые или невалидные записи вроде ",", "[]", и тому подобное
-            if re.fullmatch(r'[\[\],\s]*', c):
-                continue
-
-            if re.match(r'\s*(ок\.?|ОК|~|≈)', c):
-                continue
-
-            # Обрабатываем символ "/" как разделитель стран
-            if '/' in c:
-                parts = [part.strip() for part in c.split('/') if part.strip()]
-                cleaned_list.extend(parts)
-            else:
-                # Убираем лишние скобки
-                c = re.sub(r'^\s*\($', '', c)
-                c = re.sub(r'^\s*\)$', '', c)
-                if c:
-                    cleaned_list.append(c)
-
-
-        # Склеиваем через запятую
-        country = ', '.join(cleaned_list)
-        country = re.sub(r'\s*,\s*', ', ', country)
-        country = re.sub(r',+', ',', country)
-        country = country.strip(' ,')
-
-        return country
+        return self.timed_clean('country', cleaning.clean_country, country_list)
 
     def clean_genre(self, genre_list):
-        """Очистить список жанров от мусора"""
-        cleaned_list = []
-
-        # Если genre_list это одна строка, разбить её по запятым
-        if isinstance(genre_list, str):
-            genre_list = [g.strip() for g in genre_list.split(',') if g.strip()]
-
-        for c in genre_list:
-            c = c.strip()
-            if not c:
-                continue
-            # Убираем ссылки/сноски типа [1], [2], [] и пр.
-            c = re.sub(r'\[.*?\]', '', c).strip()
-
-            # Иногда жанры разделены слэшем
-            if '/' in c:
-                parts = [part.strip() for part in c.split('/') if part.strip()]
-                cleaned_list.extend(parts)
-            else:
-                if c:
-                    cleaned_list.append(c)
-
-        # Удаляем пустые строки ещё раз
-        cleaned_list = [g for g in cleaned_list if g]
-
-        final_list = []
-        for genre in cleaned_list:
-            genre = genre.strip()
-            if not genre:
-                continue
-
-            # Убираем если много мусорных символов (не буквенных)
-            non_letter_ratio = len(re.findall(r'[^A-Za-zА-Яа-яЁё\s-]', genre)) / max(len(genre), 1)
-            if non_letter_ratio > 0.3:
-                continue
-
-            # Убираем если есть явные мусорные куски
-            if any(substr in genre for substr in ['mw-', '{', '}', 'background', 'padding', 'color:', 'output']):
-                continue
-
-            # Убираем короткие или цифровые элементы
-            if len(genre) >= 3 and not genre.isdigit():
-                final_list.append(genre)
-
-        # И ещё раз удаляем пустые
-        final_list = [g for g in final_list if g]
-
-        # Склеиваем
-        genre = ', '.join(final_list)
-
-        # Убираем подряд идущие запятые
-        genre = re.sub(r',\s*,+', ', ', genre)
-        genre = genre.strip(' ,')
-
-        return genre
+        return self.timed_clean('genre', cleaning.clean_genre, genre_list)
 
     def parse_movie(self, response):
 
-        infobox = response.css('table.infobox')
+        # Инфобокс разбираем за один проход по дереву lxml
+        infobox = self.infobox.extract(response.selector.root)
         if infobox:
-            title_parts = response.css('h1#firstHeading ::text').getall()
-            if title_parts:
-                title = ''.join(title_parts).strip()
-            else:
-                title = None
-
-
-            # Выбираем первый элемент из найденных
-            selector = infobox[0]  # берём только первый infobox
-            director = []
-            genre = []
-            country = []
-            year = []
-            imdb = None
-
-            # Обрабатываем строки таблицы
-            for row in selector.css('tr'):
-                header = row.css('th::text').extract_first()
-                header_genre = row.css('th a::text').extract_first()
-                if not header_genre:
-                    header_genre = row.css('th::text').extract_first()
-
-                if header and 'Режиссёр' in header:
-                    director_list = row.css('td *::text').getall()
-                    director_list = [c.strip() for c in director_list if c.strip()]
-                    director.extend(director_list)  # Добавляем в список всех режиссёров
-
-                if header_genre and 'Жанр' in header_genre:
-                    # Пытаемся вытащить жанры из ссылок
-                    genre_list = row.css('td a::text').getall()
-                    genre_list = [g.strip() for g in genre_list if g.strip()]
-
-                    # Если в ссылках ничего нет — пробуем весь текст
-                    if not genre_list:
-                        genre_list = row.css('td *::text').getall()
-                        genre_list = [g.strip() for g in genre_list if g.strip()]
-
-                    genre.extend(genre_list)
-
-                if header and ('Страна' in header or 'Страны' in header):
-                    # Первый способ: общий сбор текста
-                    country_list = row.css('td *::text').getall()
-                    country_list = [c.strip() for c in country_list if c.strip()]
-
-                    # Если не сработало — fallback на все span теги
-                    if not country_list:
-                        country_list = row.css('td span span *::text').getall()
-                        country_list = [c.strip() for c in country_list if c.strip()]
-
-                        # Если не сработало — fallback на <a> теги
-                        if not country_list:
-                            country_list = row.css('td span span *::text').getall()
-                            country_list = [c.strip() for c in country_list if c.strip()]
-
-                    country.extend(country_list)
-
-                if header and (
-                        'Год' in header or 'Дата Выхода' in header or 'Дата выхода' in header or 'Премьера' in header):
-                    year_list = row.css('td *::text').getall()
-                    year_list = [c.strip() for c in year_list if c.strip()]
-                    year.extend(year_list)  # Добавляем все года
-
             # Применяем очистку данных
-            title = self.clean_title(title)
-            director = self.clean_director(director)
-            genre = self.clean_genre(genre)
-            country = self.clean_country(country)
-            year = self.clean_year(year)
-
-            # Ищем ссылку на IMDb
-
-            imdb_url = response.css('th a[title="Internet Movie Database"]')
-            if imdb_url:
-                imdb_link = response.css('td a::attr(href)').re_first(r'https://www.imdb.com/title/tt\d+/')
-                if imdb_link:
-                    yield scrapy.Request(
-                        url=imdb_link,
-                        callback=self.parse_imdb,
-                        meta={
-                            'wikipedia_data': {
-                                'title': title,
-                                'genre': genre,
-                                'director': director,
-                                'country': country,
-                                'year': year
-                            }
-                        },
-                        headers={'User-Agent': 'Mozilla/5.0'}
-                    )
-                else:
-                    # Если ссылки нет, просто выдаём данные с Википедии
-                    yield {
-                        "title": title,
-                        "genre": genre,
-                        "director": director,
-                        "country": country,
-                        "year": year,
-                        "imdb": None
-                    }
-
-            return  # Прерываем дальнейшую обработку для этой страницы
-
-
-    def parse_imdb(self, response):
-        rating = None
-        wiki_data = response.meta['wikipedia_data']
-        try:
-            script_data = response.xpath('//script[@type="application/ld+json"]/text()').get()
-            json_data = json.loads(script_data)
-            rating = json_data.get('aggregateRating', {}).get('ratingValue')
-        except Exception as e:
-            self.logger.error(f"Ошибка при извлечении рейтинга: {e}")
-
-        yield {
-            "title": wiki_data["title"],
-            "genre": wiki_data["genre"],
-            "director": wiki_data["director"],
-            "country": wiki_data["country"],
-            "year": wiki_data["year"],
-            "imdb": rating
-        }
\ No newline at end of file
+            yield from self.movie_results(
+                response.meta.get('page_key'),
+                article_id(response.body),
+                title=self.clean_title(infobox['title']),
+                director=self.clean_director(infobox['director']),
+                genre=self.clean_genre(infobox['genre']),
+                country=self.clean_country(infobox['country']),
+                year=self.clean_year(infobox['year']),
+                imdb_link=infobox['imdb_link'],
+            )
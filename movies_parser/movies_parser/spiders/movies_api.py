@@ -0,0 +1,174 @@
+import json
+import scrapy
+from urllib.parse import quote, urlencode, urlsplit
+
+from movies_parser.items import Movie
+from movies_parser.wikitext import WikitextInfobox
+from movies_parser.seen import CATEGORY_PREFIX, page_key
+from movies_parser.spiders.movies import MoviesSpider
+
+NS_MAIN = 0
+NS_CATEGORY = 14
+
+
+class MoviesApiSpider(MoviesSpider):
+    """Тот же обход дерева категорий, но через MediaWiki API: участники категорий
+    списками по 500, вики-разметка статей пачками по 50"""
+    name = "movies_api"
+    api_url = "https://ru.wikipedia.org/w/api.php"
+    root_category = CATEGORY_PREFIX + "Фильмы_по_годам"
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        # Общий фронтир и чекпоинт хранят URL страниц, а этот паук ходит по спискам API
+        if crawler.settings.getbool('DISTRIBUTED_ENABLED'):
+            raise ValueError('DISTRIBUTED_ENABLED is supported by the "movies" spider only')
+        if crawler.settings.get('CHECKPOINT_PATH'):
+            raise ValueError('CHECKPOINT_PATH is supported by the "movies" spider only')
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        spider.members_limit = settings.getint('API_MEMBERS_LIMIT', 500)
+        spider.pages_batch = settings.getint('API_PAGES_BATCH', 50)
+        spider.wikitext = WikitextInfobox.from_settings(settings)
+        # Сколько запросов списков категорий ещё не вернулось: пока они есть,
+        # неполную пачку статей не отправляем
+        spider.listing = 0
+        return spider
+
+    def start_requests(self):
+        self.visited.add(page_key(self.article_url(self.root_category)))
+        yield self.members_request(self.root_category)
+
+    def article_url(self, title):
+        """URL статьи на вики, откуда взят API: по нему считается ключ для seen-хранилища"""
+        parts = urlsplit(self.api_url)
+        return '%s://%s/wiki/%s' % (parts.scheme, parts.netloc, quote(title.replace(' ', '_')))
+
+    def api_request(self, params, callback, errback, priority, meta):
+        params = dict(params, action='query', format='json', formatversion=2)
+        return scrapy.Request(self.api_url + '?' + urlencode(params), callback=callback, errback=errback,
+                              priority=priority, meta=meta, dont_filter=True)
+
+    def members_request(self, category, cont=None):
+        """Статьи и подкатегории категории вместе с последней ревизией каждой статьи"""
+        self.listing += 1
+        params = {
+            'generator': 'categorymembers',
+            'gcmtitle': category,
+            'gcmtype': 'page|subcat',
+            'gcmlimit': self.members_limit,
+            'prop': 'info',
+        }
+        params.update(cont or {})
+        return self.api_request(params, self.parse_members, self.parse_members_failed,
+                                self.category_priority, meta={'category': category})
+
+    def parse_members(self, response):
+        self.listing -= 1
+        data = json.loads(response.text)
+
+        for page in data.get('query', {}).get('pages', []):
+            key = page_key(self.article_url(page['title']))
+            if key in self.visited:
+                continue
+            self.visited.add(key)
+            if self.title_filter.skip_title(page['title']):
+                self.crawler.stats.inc_value('prefilter/skipped_links')
+                self.logger.debug('Skipped by PREFILTER_SKIP_TITLES: %s', page['title'])
+                continue
+
+            if page['ns'] == NS_CATEGORY:
+                yield self.members_request(page['title'])
+            elif page['ns'] == NS_MAIN:
+                # Ревизия известна из списка, так что неизменившиеся статьи
+                # даже не скачиваем
+                if self.revisions is None:
+                    if key in self.seen:
+                        self.crawler.stats.inc_value('seen/skipped')
+                        continue
+                elif self.revisions.unchanged(key, page.get('lastrevid')):
+                    self.seen.add(key)
+                    self.crawler.stats.inc_value('incremental/unchanged_pages')
+                    if self.emit_unchanged:
+                        item = self.revisions.item(key)
+                        if item:
+                            yield Movie.from_row(item)
+                    continue
+                self.queue.append((page['pageid'], key))
+
+        # Продолжение списка той же категории
+        if 'continue' in data:
+            yield self.members_request(response.meta['category'], data['continue'])
+        yield from self.drain_queue()
+
+    def parse_members_failed(self, failure):
+        self.listing -= 1
+        yield from self.drain_queue()
+
+    def drain_queue(self):
+        """Отдать планировщику пачки статей по pages_batch штук; неполную —
+        только когда все списки категорий уже получены"""
+        while self.queue and self.in_flight < self.in_flight_limit():
+            if len(self.queue) < self.pages_batch and self.listing:
+                return
+            batch = [self.queue.popleft() for _ in range(min(self.pages_batch, len(self.queue)))]
+            yield self.pages_request(dict(batch), '|'.join(str(page_id) for page_id, _ in batch))
+
+    def pages_request(self, page_keys, pageids, cont=None):
+        """Вики-разметка пачки статей; page_keys — те из них, чьё содержимое ещё не получено"""
+        self.in_flight += 1
+        params = {
+            'prop': 'revisions',
+            'rvprop': 'ids|content',
+            'rvslots': 'main',
+            'pageids': pageids,
+        }
+        params.update(cont or {})
+        return self.api_request(params, self.parse_pages, self.parse_bfs_failed, self.film_priority,
+                                meta={'page_keys': page_keys, 'pageids': pageids})
+
+    def parse_pages(self, response):
+        self.in_flight -= 1
+        keys = response.meta['page_keys']
+        remaining = dict(keys)
+        data = json.loads(response.text)
+
+        for page in data.get('query', {}).get('pages', []):
+            key = keys.get(page['pageid'])
+            revisions = page.get('revisions')
+            if key is None or not revisions:
+                continue
+            del remaining[page['pageid']]
+            revision = revisions[0]
+            content = revision['slots']['main'].get('content', '')
+
+            pending = False
+            infobox = self.wikitext.extract(content, page['title'])
+            if infobox:
+                for result in self.movie_results(
+                    key,
+                    page['pageid'],
+                    title=self.clean_title(infobox['title']),
+                    director=self.clean_director(infobox['director']),
+                    genre=self.clean_genre(infobox['genre']),
+                    country=self.clean_country(infobox['country']),
+                    year=self.clean_year(infobox['year']),
+                    imdb_link=infobox['imdb_link'],
+                ):
+                    pending = pending or isinstance(result, scrapy.Request)
+                    yield result
+            # С запросом на IMDb статью отметит parse_imdb
+            if not pending:
+                self.seen.add(key)
+            if self.revisions is not None:
+                self.revisions.record(key, etag=None, last_modified=None,
+                                      revision=revision['revid'], complete=not pending)
+
+        if remaining:
+            # Ответ обрезан по объёму содержимого: остальное — тем же запросом с continue
+            if 'continue' in data:
+                self.crawler.stats.inc_value('api/continued_batches')
+                yield self.pages_request(remaining, response.meta['pageids'], data['continue'])
+            else:
+                self.crawler.stats.inc_value('api/missing_pages', len(remaining))
+        yield from self.drain_queue()
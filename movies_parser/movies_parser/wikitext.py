@@ -0,0 +1,154 @@
+# Infobox extraction from article wikitext
+#
+# Used by the MediaWiki API spider (and anything else that has raw wikitext
+# instead of rendered HTML). Finds the film infobox template, splits it into
+# parameters, maps parameter names to item fields with the same
+# INFOBOX_FIELDS substrings as the HTML extractor and turns every value into
+# text tokens the way the rendered infobox would show them:
+# [[target|label]] -> label, {{Флаг|СССР}} -> СССР, <br> and list items split
+# tokens, references and comments are dropped.
+#
+# Values that the rendered infobox takes from Wikidata are not in the
+# wikitext and stay empty here.
+
+import re
+
+from movies_parser.infobox import DEFAULT_FIELDS
+
+FILM_TEMPLATES = ('Фильм', 'Мультфильм', 'Телесериал')
+
+TEMPLATE_START_RE = re.compile(
+    r'\{\{\s*(?:%s)\s*(?=[|}\n])' % '|'.join(
+        '[%s%s]%s' % (name[0].upper(), name[0].lower(), re.escape(name[1:])) for name in FILM_TEMPLATES))
+COMMENT_RE = re.compile(r'<!--.*?-->', re.S)
+REF_RE = re.compile(r'<ref[^>/]*/>|<ref[^>]*>.*?</ref>', re.S | re.I)
+BR_RE = re.compile(r'<br\s*/?>', re.I)
+TAG_RE = re.compile(r'</?[a-zA-Z][^>]*>')
+LINK_RE = re.compile(r'\[\[([^\[\]|]*)(?:\|([^\[\]]*))?\]\]')
+EXTERNAL_LINK_RE = re.compile(r'\[(?:https?:)?//[^\s\]]+\s*([^\]]*)\]')
+INNER_TEMPLATE_RE = re.compile(r'\{\{([^{}]*)\}\}')
+IMDB_DIGITS_RE = re.compile(r'(?:tt)?(\d{5,})')
+SEPARATOR = '\x00'
+
+
+def find_template(text):
+    """Тело первого шаблона-карточки фильма (между {{ и парными }}) или None"""
+    match = TEMPLATE_START_RE.search(text)
+    if not match:
+        return None
+    depth = 0
+    i = match.start()
+    while i < len(text) - 1:
+        pair = text[i:i + 2]
+        if pair == '{{':
+            depth += 1
+            i += 2
+        elif pair == '}}':
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return text[match.end():i - 2]
+        else:
+            i += 1
+    return None
+
+
+def split_params(body):
+    """Разбить тело шаблона на параметры по | верхнего уровня: {имя: значение}"""
+    params = {}
+    parts = []
+    depth = 0
+    start = 0
+    i = 0
+    while i < len(body):
+        pair = body[i:i + 2]
+        if pair in ('{{', '[['):
+            depth += 1
+            i += 2
+            continue
+        if pair in ('}}', ']]'):
+            depth -= 1
+            i += 2
+            continue
+        if body[i] == '|' and depth == 0:
+            parts.append(body[start:i])
+            start = i + 1
+        i += 1
+    parts.append(body[start:])
+
+    for part in parts:
+        name, sep, value = part.partition('=')
+        if sep:
+            params[name.strip()] = value.strip()
+    return params
+
+
+def render_template(match):
+    """{{Флаг|СССР}} -> СССР; {{СССР}} -> СССР; позиционные аргументы через разделитель"""
+    parts = [p.strip() for p in match.group(1).split('|')]
+    args = [p for p in parts[1:] if p and '=' not in p]
+    if not args:
+        return parts[0]
+    return SEPARATOR.join(args)
+
+
+def value_tokens(value):
+    """Текстовые токены значения параметра, как их показала бы отрисованная карточка"""
+    value = COMMENT_RE.sub('', value)
+    value = REF_RE.sub('', value)
+    value = BR_RE.sub(SEPARATOR, value)
+    value = value.replace('\n', SEPARATOR)
+    value = LINK_RE.sub(lambda m: SEPARATOR + (m.group(2) or m.group(1)) + SEPARATOR, value)
+    value = EXTERNAL_LINK_RE.sub(r'\1', value)
+    # Вложенные шаблоны раскрываем изнутри наружу
+    previous = None
+    while previous != value:
+        previous = value
+        value = INNER_TEMPLATE_RE.sub(lambda m: SEPARATOR + render_template(m) + SEPARATOR, value)
+    value = TAG_RE.sub(SEPARATOR, value)
+    tokens = []
+    for token in value.split(SEPARATOR):
+        token = token.strip().lstrip('*#').strip()
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+class WikitextInfobox:
+    """Тот же результат, что у InfoboxExtractor.extract, но по вики-разметке статьи"""
+
+    def __init__(self, fields=None):
+        self.fields = {name: list(headers) for name, headers in (fields or DEFAULT_FIELDS).items()}
+        self._lookup = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.getdict('INFOBOX_FIELDS') or None)
+
+    def param_fields(self, name):
+        fields = self._lookup.get(name)
+        if fields is None:
+            fields = tuple(field for field, needles in self.fields.items()
+                           if any(needle in name for needle in needles))
+            self._lookup[name] = fields
+        return fields
+
+    def extract(self, text, title):
+        """Словарь с title, списками сырых значений полей и imdb_link;
+        None, если в статье нет карточки фильма"""
+        body = find_template(text)
+        if body is None:
+            return None
+
+        result = {name: [] for name in self.fields}
+        result['title'] = title
+        result['imdb_link'] = None
+        for name, value in split_params(body).items():
+            if name.lower() == 'imdb_id':
+                match = IMDB_DIGITS_RE.search(value)
+                if match:
+                    result['imdb_link'] = 'https://www.imdb.com/title/tt%s/' % match.group(1)
+                continue
+            for field in self.param_fields(name):
+                result[field].extend(value_tokens(value))
+        return result
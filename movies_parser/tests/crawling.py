@@ -0,0 +1,56 @@
+# Real crawls for the tests. The Twisted reactor starts once per process, so
+# every crawl runs in a child interpreter (python -m tests.crawling) and
+# prints its stats as JSON; the stub servers stay in the test process.
+
+import json
+import os
+import subprocess
+import sys
+
+from scrapy import signals
+from scrapy.utils.misc import load_object
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start(settings, kwargs=None, spider='benchmarks.crawl.LocalMoviesSpider'):
+    """Запустить краул с настройками project_settings(**settings) в отдельном процессе; вернуть Popen"""
+    config = json.dumps({'settings': settings, 'kwargs': kwargs or {}, 'spider': spider})
+    return subprocess.Popen([sys.executable, '-m', 'tests.crawling', config], cwd=PROJECT_DIR,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def crawl(settings, kwargs=None, spider='benchmarks.crawl.LocalMoviesSpider', timeout=120):
+    """Прогнать краул в отдельном процессе; вернуть его stats"""
+    process = start(settings, kwargs, spider)
+    out, err = process.communicate(timeout=timeout)
+    assert process.returncode == 0, err
+    return json.loads(out.splitlines()[-1])
+
+
+class SlotStats:
+    """Расширение: concurrency слотов загрузчика на момент закрытия паука — в stats"""
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_closed(self, spider):
+        for key, slot in self.crawler.engine.downloader.slots.items():
+            self.crawler.stats.set_value('slot/%s/concurrency' % key, slot.concurrency)
+
+
+def main(config):
+    from benchmarks.crawl import project_settings, run_crawls
+
+    settings = project_settings(**config['settings'])
+    stats, = run_crawls([(settings, config['kwargs'], load_object(config['spider']))])
+    print(json.dumps(stats, default=str))
+
+
+if __name__ == '__main__':
+    main(json.loads(sys.argv[1]))
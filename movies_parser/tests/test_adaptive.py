@@ -0,0 +1,130 @@
+# AimdController decisions with explicit timestamps, and
+# AdaptiveConcurrencyMiddleware in a real crawl of a throttled stub wiki.
+
+from benchmarks.stub_throttle import Throttle
+from benchmarks.stub_wiki import StubWikiTree, serve
+from movies_parser.adaptive import AimdController, retry_after_seconds
+from tests.crawling import crawl
+
+KEY = 'ru.wikipedia.org'
+
+
+def test_window_grows_about_one_per_round_trip():
+    controller = AimdController(start=4, maximum=32)
+    for _ in range(4):
+        controller.on_success(KEY, None, 0, now=0.0)
+    assert controller.concurrency(KEY) == 4
+    assert 4.9 < controller.state(KEY).window < 5.0
+
+
+def test_window_is_capped_at_maximum():
+    controller = AimdController(start=8, maximum=10)
+    for _ in range(1000):
+        controller.on_success(KEY, None, 0, now=0.0)
+    assert controller.concurrency(KEY) == 10
+
+
+def test_congestion_halves_the_window_once_per_epoch():
+    controller = AimdController(start=16)
+    assert controller.on_congestion(KEY, 0, now=0.0)
+    assert controller.concurrency(KEY) == 8
+    # Ответы на запросы, отправленные до уменьшения, окно больше не трогают
+    assert not controller.on_congestion(KEY, 0, now=0.1)
+    assert controller.concurrency(KEY) == 8
+    assert controller.on_congestion(KEY, controller.epoch(KEY), now=0.2)
+    assert controller.concurrency(KEY) == 4
+
+
+def test_window_never_drops_below_minimum():
+    controller = AimdController(start=2, minimum=2)
+    for _ in range(5):
+        controller.on_congestion(KEY, controller.epoch(KEY), now=0.0)
+    assert controller.concurrency(KEY) == 2
+
+
+def test_ceiling_holds_until_probe_interval():
+    controller = AimdController(start=16, probe_interval=30.0)
+    controller.on_congestion(KEY, 0, now=0.0)
+    for _ in range(1000):
+        controller.on_success(KEY, None, 1, now=10.0)
+    assert controller.concurrency(KEY) == 15
+    for _ in range(1000):
+        controller.on_success(KEY, None, 1, now=31.0)
+    assert controller.concurrency(KEY) > 16
+
+
+def test_latency_growth_counts_as_congestion():
+    controller = AimdController(start=8, latency_factor=3.0, smoothing=1.0)
+    assert not controller.on_success(KEY, 0.2, 0, now=0.0)
+    assert controller.on_success(KEY, 1.0, 0, now=1.0)
+    assert controller.concurrency(KEY) == 4
+    # Рост задержки не ставит потолок
+    assert controller.state(KEY).ceiling is None
+
+
+def test_latency_level_shift_recovers():
+    # Обычная задержка домена выросла в 10 раз и больше не меняется: не перегрузка
+    controller = AimdController(start=8, maximum=32)
+    for i in range(30):
+        controller.on_success(KEY, 0.04, controller.epoch(KEY), now=i)
+    decreases = 0
+    for i in range(2000):
+        decreases += controller.on_success(KEY, 0.4, controller.epoch(KEY), now=30 + i)
+    assert decreases <= 2
+    assert controller.concurrency(KEY) == 32
+
+
+def test_latency_baseline_expires():
+    controller = AimdController(start=8, smoothing=1.0, latency_window=10)
+    controller.on_success(KEY, 0.05, 0, now=0.0)
+    for i in range(10):
+        controller.on_success(KEY, 0.12, 0, now=1.0 + i)
+    assert controller.state(KEY).best_latency == 0.12
+    # Рост от новой базы снова считается
+    assert controller.on_success(KEY, 0.5, 0, now=20.0)
+
+
+def test_small_latencies_never_count():
+    controller = AimdController(start=8, smoothing=1.0)
+    controller.on_success(KEY, 0.001, 0, now=0.0)
+    assert not controller.on_success(KEY, 0.09, 0, now=1.0)
+
+
+def test_domains_are_independent():
+    controller = AimdController(start=8)
+    controller.on_congestion(KEY, 0, now=0.0)
+    assert controller.concurrency('www.imdb.com') == 8
+
+
+def test_pause_keeps_the_latest_deadline():
+    controller = AimdController()
+    assert controller.pause(KEY, 10, now=100.0) == 110.0
+    assert controller.pause(KEY, 5, now=101.0) == 110.0
+
+
+def test_retry_after_formats():
+    assert retry_after_seconds('120') == 120.0
+    assert retry_after_seconds('Wed, 21 Oct 2015 07:28:30 GMT', now=1445412500.0) == 10.0
+    assert retry_after_seconds('soon') is None
+    assert retry_after_seconds(None) is None
+
+
+def test_middleware_against_throttled_stub():
+    throttle = Throttle(capacity=2, retry_after=1)
+    tree = StubWikiTree(years=range(1990, 1991), films_per_year=12, latency=0.02, throttle=throttle)
+    server, root_url = serve(tree)
+    try:
+        stats = crawl({'CONCURRENT_REQUESTS_PER_DOMAIN': 16, 'ADAPTIVE_START_CONCURRENCY': 16,
+                       'EXTENSIONS': {'tests.crawling.SlotStats': 0}}, {'start_url': root_url})
+    finally:
+        server.shutdown()
+    # 429 с Retry-After: слот стоял и снова пошёл, запросы повторены, ни один фильм не потерян
+    assert throttle.rejected > 0
+    assert stats['adaptive/retry_after'] > 0
+    assert stats['adaptive/resumed'] > 0
+    assert stats['adaptive/throttled_retries'] > 0
+    assert stats['adaptive/decrease/status'] > 0
+    assert stats['item_scraped_count'] == tree.total_films
+    assert stats['elapsed_time_seconds'] >= 1
+    # Окно регулятора стоит в слоте загрузчика
+    assert stats['slot/127.0.0.1/concurrency'] == stats['adaptive/concurrency/127.0.0.1'] < 16
@@ -0,0 +1,122 @@
+# Checkpoint log: replay, torn and uncommitted records, compaction, and a
+# crawl killed with SIGKILL and resumed from its log.
+
+import csv
+import os
+import signal
+import time
+
+from benchmarks import stub_imdb
+from benchmarks.stub_wiki import StubWikiTree, serve
+from movies_parser.checkpoint import Checkpoint, read_log
+from movies_parser.distributed import url_key
+from movies_parser.frontier import WikiRow
+from tests.crawling import crawl, start
+
+PAGES = ['https://ru.wikipedia.org/wiki/%d' % n for n in range(3)]
+
+
+def row(n):
+    return WikiRow('Фильм %d' % n, 'драма', 'Иван Петров', 'СССР', '1979', 'tt%07d' % n, n)
+
+
+def write_log(path):
+    """Лог с одним коммитом: три страницы (одна готова), две строки для IMDb (одна получена)"""
+    checkpoint = Checkpoint(path)
+    checkpoint.register('output', lambda: {'offset': 123})
+    checkpoint.open()
+    for n, url in enumerate(PAGES):
+        checkpoint.page_added(n, url)
+    checkpoint.page_done(url_key(PAGES[0]))
+    checkpoint.row_added(1, row(1), 'https://www.imdb.com/title/tt0000001/', 1)
+    checkpoint.row_added(2, row(2), 'https://www.imdb.com/title/tt0000002/', 2)
+    checkpoint.row_done(1)
+    checkpoint.sync()
+    return checkpoint
+
+
+def test_replay_restores_open_work(tmp_path):
+    path = str(tmp_path / 'checkpoint.log')
+    write_log(path).close(finished=False)
+    state = Checkpoint(path, resume=True).state
+    assert state.visited == {0, 1, 2}
+    assert list(state.pages.values()) == PAGES[1:]
+    assert list(state.rows) == [2]
+    assert state.rows[2] == (row(2), 'https://www.imdb.com/title/tt0000002/', 2)
+    assert state.states == {'output': {'offset': 123}}
+
+
+def test_uncommitted_group_and_torn_record_are_ignored(tmp_path):
+    path = str(tmp_path / 'checkpoint.log')
+    checkpoint = write_log(path)
+    committed = read_log(path)
+    # Группа без коммита и оборванная на середине запись: процесс умер при записи
+    checkpoint.page_done(url_key(PAGES[1]))
+    checkpoint.file.write(b''.join(checkpoint.buffer))
+    checkpoint.buffer = []
+    checkpoint.page_added(9, 'https://ru.wikipedia.org/wiki/9')
+    checkpoint.file.write(checkpoint.buffer[0][:-3])
+    checkpoint.close(finished=False)
+    assert read_log(path) == committed
+    assert list(Checkpoint(path, resume=True).state.pages.values()) == PAGES[1:]
+
+
+def test_resume_compacts_the_log(tmp_path):
+    path = str(tmp_path / 'checkpoint.log')
+    write_log(path).close(finished=False)
+    resumed = Checkpoint(path, resume=True)
+    resumed.open(resumed.state.visited)
+    resumed.close(finished=False)
+    state = Checkpoint(path, resume=True).state
+    # Готовая страница и полученная строка из сжатого лога пропали, открытая работа — нет
+    assert not any(kind == b'D' for kind, _ in read_log(path))
+    assert state.visited == {0, 1, 2}
+    assert state.states == {'output': {'offset': 123}}
+
+
+def test_finished_crawl_removes_the_log(tmp_path):
+    path = str(tmp_path / 'checkpoint.log')
+    write_log(path).close(finished=True)
+    assert not os.path.exists(path)
+
+
+def read_titles(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return [row['title'] for row in csv.DictReader(f)]
+
+
+def commits(path):
+    return sum(kind == b'S' for kind, _ in read_log(path)) if os.path.exists(path) else 0
+
+
+def test_killed_crawl_resumes_without_duplicates(tmp_path):
+    tree = StubWikiTree(years=range(1990, 1993), films_per_year=150, page_size=50, latency=0.01)
+    wiki, root_url = serve(tree)
+    imdb, imdb_url = stub_imdb.serve(stub_imdb.StubImdb(latency=0.01))
+    log = str(tmp_path / 'checkpoint.log')
+    output = str(tmp_path / 'movies.csv')
+    settings = {'IMDB_ENRICHMENT': 'chain', 'BENCH_HOST_MAP': {'https://www.imdb.com': imdb_url},
+                'ITEM_PIPELINES': {'movies_parser.pipelines.MoviesParserPipeline': 300},
+                'OUTPUT_PATH': output, 'OUTPUT_BATCH_SIZE': 20, 'CONCURRENT_REQUESTS_PER_DOMAIN': 4,
+                'CHECKPOINT_PATH': log, 'CHECKPOINT_INTERVAL': 0.3}
+    try:
+        process = start(settings, {'start_url': root_url})
+        deadline = time.monotonic() + 60
+        while commits(log) < 3 or not os.path.exists(output) or not read_titles(output):
+            assert process.poll() is None and time.monotonic() < deadline, 'crawl ended before the kill'
+            time.sleep(0.05)
+        process.send_signal(signal.SIGKILL)
+        process.communicate()
+        killed = read_titles(output)
+        assert 0 < len(killed) < tree.total_films
+
+        stats = crawl(dict(settings, CHECKPOINT_RESUME=True), {'start_url': root_url})
+    finally:
+        wiki.shutdown()
+        imdb.shutdown()
+    titles = read_titles(output)
+    assert len(titles) == len(set(titles)) == tree.total_films
+    assert stats['checkpoint/restored_pages'] > 0
+    # Страницы до последнего коммита заново не запрашивались
+    assert stats['downloader/request_count'] < 2 * tree.total_films
+    assert not os.path.exists(log)
@@ -0,0 +1,180 @@
+# movies_parser.cleaning against the original MoviesSpider.clean_* methods
+# (copied below from the baseline spider) on the raw values of the saved
+# articles, hand-picked junk tokens and random mixes of them.
+
+import ast
+import random
+import re
+
+import pytest
+
+from benchmarks.bench_infobox import load_fixtures
+from movies_parser import cleaning
+from movies_parser.infobox import InfoboxExtractor
+
+
+def legacy_clean_title(title):
+    title = title.strip().strip('"').strip()
+    return title
+
+
+def legacy_clean_year(year_input):
+    if isinstance(year_input, str):
+        try:
+            year_input = ast.literal_eval(year_input)
+        except (ValueError, SyntaxError):
+            pass
+    if isinstance(year_input, list):
+        year_input = ' '.join(map(str, year_input))
+    years = re.findall(r'\b\d{4}\b', year_input)
+    unique_years = sorted(set(years), reverse=True)
+    return ', '.join(unique_years)
+
+
+def legacy_clean_director(director_list):
+    cleaned_list = []
+    for c in director_list:
+        c = c.strip()
+        if not c:
+            continue
+        if not c.strip(','):
+            continue
+        c = re.sub(r'\s*\.\s*', '.', c)
+        c = re.sub(r'\s*-\s*', '-', c)
+        if re.fullmatch(r"[A-Za-zА-Яа-яЁё][-A-Za-zА-Яа-яЁё'\.\s]{2,}", c):
+            cleaned_list.append(c)
+    director = ', '.join(cleaned_list)
+    director = re.sub(r'\s*,\s*', ', ', director)
+    director = re.sub(r',+', ',', director)
+    director = director.strip(' ,')
+    return director
+
+
+def legacy_clean_country(country_list):
+    cleaned_list = []
+    for c in country_list:
+        c = c.strip()
+        if not c:
+            continue
+        c = re.sub(r'\[.*?\]', '', c)
+        c = c.strip()
+        if re.fullmatch(r'[\d~\-\+]+', c):
+            continue
+        if re.fullmatch(r'[\[\],\s]*', c):
+            continue
+        if re.match(r'\s*(ок\.?|ОК|~|≈)', c):
+            continue
+        if '/' in c:
+            parts = [part.strip() for part in c.split('/') if part.strip()]
+            cleaned_list.extend(parts)
+        else:
+            c = re.sub(r'^\s*\($', '', c)
+            c = re.sub(r'^\s*\)$', '', c)
+            if c:
+                cleaned_list.append(c)
+    country = ', '.join(cleaned_list)
+    country = re.sub(r'\s*,\s*', ', ', country)
+    country = re.sub(r',+', ',', country)
+    country = country.strip(' ,')
+    return country
+
+
+def legacy_clean_genre(genre_list):
+    cleaned_list = []
+    if isinstance(genre_list, str):
+        genre_list = [g.strip() for g in genre_list.split(',') if g.strip()]
+    for c in genre_list:
+        c = c.strip()
+        if not c:
+            continue
+        c = re.sub(r'\[.*?\]', '', c).strip()
+        if '/' in c:
+            parts = [part.strip() for part in c.split('/') if part.strip()]
+            cleaned_list.extend(parts)
+        else:
+            if c:
+                cleaned_list.append(c)
+    cleaned_list = [g for g in cleaned_list if g]
+    final_list = []
+    for genre in cleaned_list:
+        genre = genre.strip()
+        if not genre:
+            continue
+        non_letter_ratio = len(re.findall(r'[^A-Za-zА-Яа-яЁё\s-]', genre)) / max(len(genre), 1)
+        if non_letter_ratio > 0.3:
+            continue
+        if any(substr in genre for substr in ['mw-', '{', '}', 'background', 'padding', 'color:', 'output']):
+            continue
+        if len(genre) >= 3 and not genre.isdigit():
+            final_list.append(genre)
+    final_list = [g for g in final_list if g]
+    genre = ', '.join(final_list)
+    genre = re.sub(r',\s*,+', ', ', genre)
+    genre = genre.strip(' ,')
+    return genre
+
+
+LEGACY = {
+    'title': legacy_clean_title,
+    'genre': legacy_clean_genre,
+    'director': legacy_clean_director,
+    'country': legacy_clean_country,
+    'year': legacy_clean_year,
+}
+
+JUNK = [
+    '', ' ', ',', ', ,', '[1]', '[a]', '[]', '[ 2 ]', '~', '12', '-', '+3', 'ок. 5', 'ОК', '≈ 2', '(', ')', ' ( ',
+    'СССР[1]', ' США / Великобритания ', 'Франция/', '/', 'ФРГ [2][3]', 'Италия,', '(Италия)',
+    'Андрей Тарковский', 'А. А.  Тарковский', 'Жан - Люк Годар', "Д'Артаньян", 'Ли', 'Bob', '2001', 'x-y',
+    'драма', 'комедия / мюзикл', 'мелодрама[4]', 'mw-parser-output', '{color:red}', 'padding: 0', '1979',
+    'фэнтези', 'sci-fi', 'film noir', 'ужасы,триллер', '%%%abc', 'аб', '25 мая 1979', '1979—1980', '19790',
+    'премьера 12.05.1979 (СССР)', '"Сталкер"', ' «Солярис» ',
+]
+
+
+def raw_values():
+    """Сырые значения полей из инфобоксов сохранённых статей"""
+    extractor = InfoboxExtractor()
+    result = []
+    for response in load_fixtures():
+        infobox = extractor.extract(response.selector.root)
+        result.append({field: infobox[field] for field in LEGACY})
+    return result
+
+
+@pytest.mark.parametrize('raw', raw_values(), ids=lambda raw: raw['title'])
+def test_saved_articles_clean_like_the_baseline(raw):
+    for field, legacy in LEGACY.items():
+        assert cleaning.CLEANERS[field](raw[field]) == legacy(raw[field]), field
+
+
+@pytest.mark.parametrize('field', ['genre', 'director', 'country', 'year'])
+def test_random_token_lists_clean_like_the_baseline(field):
+    rng = random.Random(field)
+    lists = [[token] for token in JUNK] + [rng.sample(JUNK, rng.randint(0, 8)) for _ in range(500)]
+    for tokens in lists:
+        # Холодный и тёплый кэш токенов дают одно и то же
+        for _ in range(2):
+            assert cleaning.CLEANERS[field](tokens) == LEGACY[field](tokens), tokens
+
+
+@pytest.mark.parametrize('value', ['драма, комедия', ' ужасы ,, триллер[1] ', 'mw-output, фэнтези', ''])
+def test_genre_string_input(value):
+    assert cleaning.clean_genre(value) == legacy_clean_genre(value)
+
+
+@pytest.mark.parametrize('value', ["['1979', '25 мая 1980']", '1979 год, 1980', '[1979, 1981]', 'около 1990-х'])
+def test_year_string_input(value):
+    assert cleaning.clean_year(value) == legacy_clean_year(value)
+
+
+@pytest.mark.parametrize('title', JUNK)
+def test_title(title):
+    assert cleaning.clean_title(title) == legacy_clean_title(title)
+
+
+def test_clean_items_cleans_every_field_and_keeps_the_rest():
+    raw = raw_values()
+    items = cleaning.clean_items([dict(values, imdb_link='x') for values in raw])
+    for values, item in zip(raw, items):
+        assert item == dict({field: LEGACY[field](values[field]) for field in LEGACY}, imdb_link='x')
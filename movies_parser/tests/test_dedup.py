@@ -0,0 +1,109 @@
+# Identity keys and DedupPipeline on hand-made items; the output buffer of
+# MoviesParserPipeline is replaced by a set of buffered items.
+
+import pytest
+from scrapy.crawler import Crawler
+from scrapy.exceptions import DropItem
+from scrapy.statscollectors import MemoryStatsCollector
+
+from benchmarks.crawl import LocalMoviesSpider, project_settings
+from movies_parser.dedup import IdentityIndex, identity_keys, strong_ids
+from movies_parser.items import Movie
+from movies_parser.pipelines import DedupPipeline
+
+
+class Buffer:
+    """Заменяет MoviesParserPipeline.output_buffer: записи, ещё не ушедшие на диск"""
+
+    def __init__(self):
+        self.items = []
+
+    def buffered(self, item):
+        return any(item is buffered for buffered in self.items)
+
+
+class Spider:
+    def __init__(self):
+        self.output_buffer = Buffer()
+
+
+def movie(title, year='', imdb=None, imdb_id=None, page_id=None, director=''):
+    return Movie.from_cleaned(title, 'драма', director, 'Россия', year, imdb, imdb_id, page_id)
+
+
+@pytest.fixture
+def dedup():
+    crawler = Crawler(LocalMoviesSpider, project_settings())
+    crawler.stats = MemoryStatsCollector(crawler)
+    pipeline = DedupPipeline.from_crawler(crawler)
+    pipeline.open_spider(None)
+    return pipeline
+
+
+def run(pipeline, spider, items):
+    """Пропустить items через пайплайн; вернуть прошедшие"""
+    passed = []
+    for item in items:
+        try:
+            passed.append(pipeline.process_item(item, spider))
+        except DropItem:
+            continue
+        spider.output_buffer.items.append(item)
+    return passed
+
+
+def find(index, item):
+    flat = item.to_flat()
+    return index.find(identity_keys(flat), strong_ids(flat))
+
+
+def test_redirect_is_merged_into_the_first_copy(dedup):
+    spider = Spider()
+    first = movie('Сталкер (фильм)', '1979', page_id=42)
+    alias = movie('Сталкер', '1979', imdb=8.0, imdb_id='tt0079944', page_id=42, director='Андрей Тарковский')
+    assert run(dedup, spider, [first, alias]) == [first]
+    assert first.imdb == 8.0 and first.imdb_id == 'tt0079944'
+    assert first.director == ('Андрей Тарковский',)
+    assert dedup.stats.get_value('dedup/merged_fields') == 3
+
+
+def test_written_first_copy_is_not_merged(dedup):
+    spider = Spider()
+    first = movie('Сталкер', '1979', page_id=42)
+    assert run(dedup, spider, [first]) == [first]
+    # Пакет с первой записью уже ушёл на запись
+    spider.output_buffer.items = []
+    assert run(dedup, spider, [movie('Сталкер', '1979', imdb=8.0, page_id=42)]) == []
+    assert first.imdb is None
+    assert dedup.stats.get_value('dedup/dropped') == 1
+
+
+def test_same_title_without_year_is_kept(dedup):
+    items = [movie('Мама (фильм)'), movie('Мама')]
+    assert run(dedup, Spider(), items) == items
+
+
+def test_same_title_and_year_with_different_ids_is_kept(dedup):
+    items = [movie('Мама (фильм, 2013)', '2013', imdb_id='tt2023587', page_id=1),
+             movie('Мама (фильм, 2013, Россия)', '2013', imdb_id='tt2391950', page_id=2)]
+    assert run(dedup, Spider(), items) == items
+
+
+def test_same_title_and_year_without_conflict_is_merged(dedup):
+    spider = Spider()
+    first = movie('Мама (фильм, 2013)', '2013', page_id=1)
+    assert run(dedup, spider, [first, movie('Мама', '2013', imdb_id='tt2023587')]) == [first]
+    assert first.imdb_id == 'tt2023587'
+    # Уже заполненный tt-ID не даёт склеить тёзку с другим tt-ID
+    other = movie('Мама', '2013', imdb_id='tt2391950')
+    assert run(dedup, spider, [other]) == [other]
+
+
+def test_evicted_title_keys_drop_only_items_without_ids():
+    index = IdentityIndex(max_entries=1)
+    first = movie('Мама', '2013', page_id=1)
+    index.add(identity_keys(first.to_flat()), first)
+    index.add(identity_keys(movie('Другой', '2000').to_flat()), None)
+    assert find(index, movie('Мама', '2013')) == (True, None)
+    assert find(index, movie('Мама', '2013', page_id=2)) == (False, None)
+    assert find(index, movie('Мама', '2013', page_id=1)) == (True, None)
@@ -0,0 +1,94 @@
+# SqliteSharedFrontier with two connections standing in for two workers, and
+# the per-worker -s options of the launcher. The clock is patched, so lease
+# expiry needs no waiting.
+
+import pytest
+
+from benchmarks.crawl import project_settings
+from movies_parser import distributed
+from movies_parser.distributed import SqliteSharedFrontier, worker_overrides
+
+URLS = ['https://ru.wikipedia.org/wiki/%d' % n for n in range(5)]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(distributed.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def workers(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    first, second = SqliteSharedFrontier(path), SqliteSharedFrontier(path)
+    first.reset()
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_pages_are_added_once(workers):
+    first, second = workers
+    assert first.add([(n, url) for n, url in enumerate(URLS)]) == 5
+    # Те же ключи от другого воркера — уже в visited
+    assert second.add([(0, URLS[0]), (7, 'https://ru.wikipedia.org/wiki/7')]) == 1
+    assert first.pending() == 6
+
+
+def test_claims_are_fifo_and_exclusive(workers, clock):
+    first, second = workers
+    first.add([(n, url) for n, url in enumerate(URLS)])
+    a = first.claim('w0', 2)
+    b = second.claim('w1', 10)
+    assert [url for _, url in a] == URLS[:2]
+    assert [url for _, url in b] == URLS[2:]
+    assert first.claim('w0', 10) == []
+    # Выданные страницы в работе, пока воркер не отметит их готовыми
+    assert first.pending() == 5
+    first.done([row_id for row_id, _ in a])
+    assert second.pending() == 3
+
+
+def test_lease_expiry_hands_pages_of_a_dead_worker_to_another(workers, clock):
+    first, second = workers
+    first.add([(n, url) for n, url in enumerate(URLS)])
+    lost = first.claim('w0', 2)
+    first.close()
+    clock.now += 100
+    kept = second.claim('w1', 1)
+    # Срок аренды w0 ещё не вышел
+    assert second.requeue_stale(300) == 0
+    clock.now += 250
+    assert second.requeue_stale(300) == 2
+    reclaimed = second.claim('w1', 10)
+    # Страницы умершего воркера снова в голове очереди, под теми же id
+    assert reclaimed[:2] == lost
+    assert [url for _, url in reclaimed] == URLS[:2] + URLS[3:]
+    assert [url for _, url in kept] == [URLS[2]]
+    assert second.requeue_stale(300) == 0
+
+
+def test_reset_empties_the_frontier(workers):
+    first, second = workers
+    first.add([(0, URLS[0])])
+    second.reset()
+    assert first.pending() == 0
+    assert first.add([(0, URLS[0])]) == 1
+
+
+def test_worker_overrides():
+    settings = project_settings(FRONTIER_STORE_PATH='frontier.db', SEEN_STORE_PATH='seen.db',
+                                INCREMENTAL_STORE_PATH=None, RESPONSE_CACHE_PATH=None, METRICS_DUMP_PATH=None,
+                                METRICS_PORT=9400)
+    assert worker_overrides(settings, 'w2', 2) == ['-s', 'FRONTIER_STORE_PATH=frontier.w2.db',
+                                                   '-s', 'SEEN_STORE_PATH=seen.w2.db',
+                                                   '-s', 'METRICS_PORT=9402']
@@ -0,0 +1,71 @@
+# Dump parsing over a small synthetic multistream dump (benchmarks.stub_dump).
+
+import csv
+import os
+
+import pytest
+
+from benchmarks.crawl import project_settings
+from benchmarks.stub_dump import page_xml, write_dump
+from benchmarks.stub_wiki import StubWikiTree
+from movies_parser import dump
+from movies_parser.items import FIELDS
+
+FILM_TEXT = ('{{Фильм\n|РусНаз = Сталкер\n|Жанр = [[драма]]\n|Режиссёр = [[Андрей Тарковский]]\n'
+             '|Страна = {{Флагификация|СССР}}\n|Год = [[1979 год в кино|1979]]\n|imdb_id = 0079944\n}}\n'
+             '[[Категория:Фильмы 1979 года]]')
+
+
+@pytest.fixture(autouse=True)
+def worker():
+    dump.init_worker(None, dump.DEFAULT_CATEGORY_PATTERN)
+
+
+@pytest.fixture
+def stub_dump(tmp_path):
+    tree = StubWikiTree(years=range(1990, 1993), films_per_year=7)
+    path = str(tmp_path / 'ruwiki-test-pages-articles-multistream.xml.bz2')
+    index, pages, streams = write_dump(tree, path, noise_per_film=5, text_bytes=200, pages_per_stream=10)
+    return tree, path, index, pages, streams
+
+
+def test_film_page():
+    item = dump.extract_page(page_xml(42, 0, 'Сталкер (фильм)', FILM_TEXT))
+    assert item == {'title': 'Сталкер (фильм)', 'genre': 'драма', 'director': 'Андрей Тарковский',
+                    'country': 'СССР', 'year': '1979', 'imdb': None, 'imdb_id': 'tt0079944', 'page_id': 42}
+
+
+def test_non_film_pages_are_skipped():
+    assert dump.extract_page(page_xml(1, 0, 'Сталкер', FILM_TEXT, redirect='Сталкер (фильм)')) is None
+    assert dump.extract_page(page_xml(2, 14, 'Категория:Сталкер', FILM_TEXT)) is None
+    assert dump.extract_page(page_xml(3, 0, 'Город', FILM_TEXT.replace('Фильмы 1979 года', 'Города'))) is None
+
+
+def test_index_path():
+    assert dump.index_path('ruwiki-pages-articles-multistream.xml.bz2') == \
+        'ruwiki-pages-articles-multistream-index.txt.bz2'
+    with pytest.raises(ValueError):
+        dump.index_path('ruwiki-pages-articles.xml.bz2')
+
+
+def test_chunks_cover_the_whole_dump(stub_dump):
+    _, path, index, pages, streams = stub_dump
+    chunks = list(dump.iter_chunks(path, dump.read_offsets(index)))
+    # Поток заголовка + потоки страниц (закрывающий поток — в хвосте последнего куска)
+    assert len(chunks) == streams + 1
+    assert chunks[0][1] == 0 and chunks[-1][2] == os.path.getsize(path)
+    assert all(a[2] == b[1] for a, b in zip(chunks, chunks[1:]))
+    assert sum(dump.extract_chunk(chunk)[0] for chunk in chunks) == pages
+
+
+def test_ingest_writes_every_film(stub_dump, tmp_path):
+    tree, path, _, pages, _ = stub_dump
+    output = str(tmp_path / 'movies.csv')
+    settings = project_settings(ITEM_PIPELINES={'movies_parser.pipelines.MoviesParserPipeline': 300},
+                                OUTPUT_PATH=output, OUTPUT_FIELDS=list(FIELDS))
+    stats = dump.ingest(path, settings, workers=1)
+    assert stats['dump/pages'] == pages
+    with open(output, encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == tree.total_films
+    assert {row['year'] for row in rows} == {'1990', '1991', '1992'}
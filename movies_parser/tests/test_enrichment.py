@@ -0,0 +1,53 @@
+# RatingsIndex: lookup by tt-ID, the binary .idx cache next to the dataset
+# and its rebuild when a previous write was cut short.
+
+import gzip
+import os
+
+import pytest
+
+from movies_parser.enrichment import RatingsIndex
+
+ROWS = [('tt0000003', '6.5'), ('tt0282599', '7.9'), ('tt0000001', '5.7')]
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = str(tmp_path / 'title.ratings.tsv.gz')
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write('tconst\taverageRating\tnumVotes\n')
+        for tconst, rating in ROWS:
+            f.write('%s\t%s\t100\n' % (tconst, rating))
+    return path
+
+
+def check(index):
+    assert len(index) == len(ROWS)
+    for tconst, rating in ROWS:
+        assert index.get(tconst) == float(rating)
+    assert index.get('tt0000002') is None
+    assert index.get('') is None
+
+
+def test_load_writes_cache_and_reuses_it(dataset, monkeypatch):
+    check(RatingsIndex.load(dataset))
+    assert os.path.exists(dataset + '.idx')
+    assert not [name for name in os.listdir(os.path.dirname(dataset)) if name.endswith('.tmp')]
+
+    def no_tsv(cls, path):
+        raise AssertionError('dataset re-read despite a fresh cache')
+
+    monkeypatch.setattr(RatingsIndex, 'from_tsv', classmethod(no_tsv))
+    check(RatingsIndex.load(dataset))
+
+
+@pytest.mark.parametrize('keep', [0, 4, 8, 20])
+def test_truncated_cache_is_rebuilt(dataset, keep):
+    RatingsIndex.load(dataset)
+    cache = dataset + '.idx'
+    size = os.path.getsize(cache)
+    with open(cache, 'r+b') as f:
+        f.truncate(keep)
+    check(RatingsIndex.load(dataset))
+    assert os.path.getsize(cache) == size
+    check(RatingsIndex.from_cache(cache))
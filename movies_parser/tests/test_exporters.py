@@ -0,0 +1,127 @@
+# Batch writers of movies_parser.exporters: settings checks, part rotation,
+# and resume from a synced state after a crash.
+
+import csv
+import gzip
+import io
+import json
+import os
+
+import pytest
+from scrapy.settings import Settings
+
+from movies_parser.exporters import make_writer, output_path, pyarrow
+
+FIELDS = ['title', 'year', 'imdb']
+
+
+def rows(start, count):
+    return [['Фильм %d' % i, str(1950 + i % 50), '7.%d' % (i % 10)] for i in range(start, start + count)]
+
+
+def read_text(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def read_rows(fmt, paths):
+    """Строки всех частей вывода по порядку"""
+    result = []
+    for path in paths:
+        if fmt == 'csv':
+            reader = csv.reader(io.StringIO(read_text(path), newline=''))
+            assert next(reader) == FIELDS
+            result.extend(reader)
+        elif fmt == 'jsonl':
+            result.extend([row[field] for field in FIELDS]
+                          for row in map(json.loads, read_text(path).splitlines()))
+        else:
+            table = pyarrow.parquet.read_table(path)
+            result.extend(list(row.values()) for row in table.to_pylist())
+    return result
+
+
+def settings(**values):
+    result = Settings()
+    result.setmodule('movies_parser.settings', priority='project')
+    result.update(values, priority='cmdline')
+    return result
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+@pytest.mark.parametrize('compression', ['zstd', 'snappy', 'bz2'])
+def test_text_formats_reject_other_compression(tmp_path, fmt, compression):
+    with pytest.raises(ValueError, match='gzip'):
+        make_writer(fmt, str(tmp_path / 'out'), FIELDS, compression=compression)
+
+
+def test_empty_compression_means_none(tmp_path):
+    writer = make_writer('csv', str(tmp_path / 'out.csv'), FIELDS, compression='')
+    writer.write_batch(rows(0, 3))
+    writer.close()
+    assert writer.paths == [str(tmp_path / 'out.csv')]
+    assert read_rows('csv', writer.paths) == rows(0, 3)
+
+
+@pytest.mark.parametrize('values, expected', [
+    ({}, 'movies_output.csv'),
+    ({'OUTPUT_FORMAT': 'parquet'}, 'movies_output.parquet'),
+    ({'OUTPUT_FORMAT': 'jsonl'}, 'movies_output.jsonl'),
+    ({'OUTPUT_FORMAT': 'csv', 'OUTPUT_PATH': 'out/films.parquet'}, 'out/films.csv'),
+    ({'OUTPUT_FORMAT': 'parquet', 'OUTPUT_PATH': 'films.pq'}, 'films.pq'),
+    ({'OUTPUT_FORMAT': 'jsonl', 'OUTPUT_PATH': 'films'}, 'films'),
+])
+def test_output_path_follows_format(values, expected):
+    assert output_path(settings(**values)) == expected
+
+
+def test_default_fields_are_the_baseline_columns():
+    assert settings().getlist('OUTPUT_FIELDS') == ['title', 'genre', 'director', 'country', 'year', 'imdb']
+
+
+FORMATS = [('csv', None), ('csv', 'gzip'), ('jsonl', None), ('jsonl', 'gzip'),
+           pytest.param('parquet', None, marks=pytest.mark.skipif(pyarrow is None, reason='needs pyarrow'))]
+
+
+@pytest.mark.parametrize('fmt, compression', FORMATS)
+def test_rotation_splits_into_numbered_parts(tmp_path, fmt, compression):
+    path = str(tmp_path / ('movies_output.' + fmt))
+    # Размер gzip-части растёт блоками сжатого потока: строк нужно больше
+    total = 6000 if compression else 600
+    writer = make_writer(fmt, path, FIELDS, compression=compression, rotate_bytes=2000)
+    for start in range(0, total, 50):
+        writer.write_batch(rows(start, 50))
+    writer.close()
+
+    assert len(writer.paths) > 1
+    suffix = '.' + fmt + ('.gz' if compression else '')
+    assert writer.paths == [str(tmp_path / ('movies_output.%05d%s' % (i, suffix)))
+                            for i in range(len(writer.paths))]
+    # Часть закрывается на первом пакете после порога, дальше — новая
+    assert all(os.path.getsize(part) >= 2000 for part in writer.paths[:-1])
+    assert read_rows(fmt, writer.paths) == rows(0, total)
+
+
+@pytest.mark.parametrize('fmt, compression', FORMATS)
+@pytest.mark.parametrize('rotate_bytes', [0, 3000])
+def test_resume_continues_from_the_synced_state(tmp_path, fmt, compression, rotate_bytes):
+    path = str(tmp_path / ('movies_output.' + fmt))
+    writer = make_writer(fmt, path, FIELDS, compression=compression, rotate_bytes=rotate_bytes)
+    writer.write_batch(rows(0, 100))
+    writer.write_batch(rows(100, 100))
+    state = writer.sync()
+    # Записанное после sync() теряется вместе с процессом: файл не закрыт, gzip member не завершён
+    writer.write_batch(rows(200, 100))
+    if writer.file is not None and fmt != 'parquet':
+        writer.file.flush()
+    state = json.loads(json.dumps(state))
+
+    resumed = make_writer(fmt, path, FIELDS, compression=compression, rotate_bytes=rotate_bytes)
+    resumed.resume(state)
+    resumed.write_batch(rows(200, 100))
+    resumed.write_batch(rows(300, 100))
+    resumed.close()
+
+    assert resumed.paths[:len(state['paths'])] == state['paths']
+    assert read_rows(fmt, resumed.paths) == rows(0, 400)
@@ -0,0 +1,112 @@
+# Disk-backed frontier structures over a temporary SQLite file, and the
+# MemoryGovernor thresholds with a patched RSS and clock.
+
+import sqlite3
+
+import pytest
+from scrapy.crawler import Crawler
+from scrapy.statscollectors import MemoryStatsCollector
+
+from benchmarks.crawl import LocalMoviesSpider, project_settings
+from movies_parser import frontier
+from movies_parser.frontier import DiskKeySet, DiskQueue, MemoryGovernor, PendingRows, WikiRow, open_store
+
+MB = 2 ** 20
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / 'frontier.db')
+    db = open_store(path)
+    yield path, db
+    db.close()
+
+
+def test_queue_is_fifo_across_chunks(store):
+    _, db = store
+    queue = DiskQueue(db, chunk=3)
+    popped = []
+    for n in range(10):
+        queue.append((n, 'url %d' % n))
+        if n % 4 == 3:
+            popped.append(queue.popleft())
+    while queue:
+        popped.append(queue.popleft())
+    assert popped == [(n, 'url %d' % n) for n in range(10)]
+    with pytest.raises(IndexError):
+        queue.popleft()
+
+
+def test_queue_is_fifo_across_reopen(store):
+    path, db = store
+    queue = DiskQueue(db, chunk=4)
+    for n in range(10):
+        queue.append(n)
+    queue.flush()
+    db.close()
+    reopened = DiskQueue(sqlite3.connect(path), chunk=4)
+    assert len(reopened) == 10
+    assert [reopened.popleft() for _ in range(10)] == list(range(10))
+
+
+def test_open_store_starts_empty(store):
+    path, db = store
+    DiskQueue(db).append('url')
+    DiskQueue(db).flush()
+    keys = DiskKeySet(db)
+    keys.add(1)
+    db.commit()
+    # Очередь прошлого краула восстанавливает чекпоинт, а не файл фронтира
+    db = open_store(path)
+    assert len(DiskQueue(db)) == 0 and len(DiskKeySet(db)) == 0
+    db.close()
+
+
+def test_key_set_membership(store):
+    path, db = store
+    keys = DiskKeySet(db, commit_every=2)
+    for key in (1, 2, 2 ** 64 - 1, 2):
+        keys.add(key)
+    assert len(keys) == 3
+    assert 2 ** 64 - 1 in keys and 2 in keys
+    assert 3 not in keys
+    db.commit()
+    assert len(DiskKeySet(sqlite3.connect(path))) == 3
+    keys.clear()
+    assert len(keys) == 0 and 1 not in keys
+
+
+@pytest.mark.parametrize('on_disk', [False, True])
+def test_pending_rows(store, on_disk):
+    _, db = store
+    rows = PendingRows(db if on_disk else None)
+    row = WikiRow('Сталкер', 'драма', 'Андрей Тарковский', 'СССР', '1979', 'tt0079944', 42)
+    row_id = rows.put(row)
+    assert len(rows) == 1
+    assert rows.pop(row_id) == row
+    assert rows.pop(row_id) is None
+    assert len(rows) == 0
+
+
+def test_memory_governor_thresholds(monkeypatch):
+    rss = {'value': 0}
+    clock = {'now': 100.0}
+    monkeypatch.setattr(frontier, 'current_rss', lambda: rss['value'])
+    monkeypatch.setattr(frontier.time, 'monotonic', lambda: clock['now'])
+    crawler = Crawler(LocalMoviesSpider, project_settings())
+    governor = MemoryGovernor(100 * MB, maximum=64, minimum=8, interval=1.0, crawler=crawler)
+    # stats появляются у crawler после создания губернатора, как в from_crawler паука
+    crawler.stats = MemoryStatsCollector(crawler)
+
+    def limit(rss_mb, seconds=1.0):
+        clock['now'] += seconds
+        rss['value'] = rss_mb * MB
+        return governor.limit()
+
+    assert [limit(120) for _ in range(4)] == [32, 16, 8, 8]
+    # Между 80% и 100% цели лимит не меняется, чаще interval RSS не смотрим
+    assert limit(90) == 8
+    assert limit(50, seconds=0.5) == 8
+    assert [limit(70) for _ in range(5)] == [16, 32, 64, 64, 64]
+    assert crawler.stats.get_value('memory/rss_max_mb') == 120
+    assert crawler.stats.get_value('memory/in_flight_limit_min') == 8
@@ -0,0 +1,71 @@
+# InfoboxExtractor against the per-row CSS selector loop it replaced
+# (benchmarks.bench_infobox.legacy_extract) on the saved articles, the stub
+# film pages and hand-made infoboxes.
+
+import pytest
+from scrapy.http import HtmlResponse
+
+from benchmarks.bench_infobox import legacy_extract, load_fixtures
+from benchmarks.stub_wiki import StubWikiTree, render_film
+from movies_parser.infobox import InfoboxExtractor
+
+EXTRACTOR = InfoboxExtractor()
+
+
+def response(body, name='Фильм'):
+    return HtmlResponse('https://ru.wikipedia.org/wiki/' + name, body=body.encode('utf-8'), encoding='utf-8')
+
+
+def page(rows, heading='<h1 id="firstHeading"><span>Фильм</span></h1>', extra=''):
+    return response('<html><body>%s<table class="infobox"><tbody>%s</tbody></table>%s</body></html>'
+                    % (heading, ''.join(rows), extra))
+
+
+CASES = {
+    'link header genre': page([
+        '<tr><th><a href="/wiki/Жанр">Жанр</a></th><td><a>драма</a> / <a>мелодрама</a></td></tr>']),
+    'genre without links': page(['<tr><th>Жанры</th><td>комедия, <i>мюзикл</i></td></tr>']),
+    'several year rows': page([
+        '<tr><th>Год</th><td>1979</td></tr>',
+        '<tr><th>Дата выхода</th><td><span>25 мая 1979</span> <sup>[1]</sup></td></tr>',
+        '<tr><th>Премьера</th><td>1980</td></tr>']),
+    'country with footnotes': page([
+        '<tr><th>Страны</th><td><span><span><a>СССР</a></span></span><sup>[2]</sup><br>ФРГ</td></tr>']),
+    'nested director markup': page([
+        '<tr><th>Режиссёр</th><td><ul><li><a>Андрей Тарковский</a></li><li>Георгий  Калатозов</li></ul></td></tr>']),
+    'imdb row without link': page([
+        '<tr><th><a title="Internet Movie Database">IMDb</a></th><td>ID 0079944</td></tr>']),
+    'imdb link outside the row': page(
+        ['<tr><th><a title="Internet Movie Database">IMDb</a></th><td>—</td></tr>'],
+        extra='<table><tr><td><a href="https://www.imdb.com/title/tt0079944/">IMDb</a></td></tr></table>'),
+    'link without imdb row': page(
+        ['<tr><th>Год</th><td>1979</td></tr>',
+         '<tr><th>Ссылки</th><td><a href="https://www.imdb.com/title/tt0079944/">IMDb</a></td></tr>']),
+    'second infobox ignored': page(
+        ['<tr><th>Режиссёр</th><td>Первый Режиссёр</td></tr>'],
+        extra='<table class="infobox"><tr><th>Режиссёр</th><td>Второй Режиссёр</td></tr></table>'),
+    'no heading': page(['<tr><th>Год</th><td>2001</td></tr>'], heading=''),
+    'row without header': page(['<tr><td colspan="2">Постер</td></tr>', '<tr><th></th><td>1999</td></tr>']),
+    'no infobox': response('<html><body><h1 id="firstHeading">Список</h1><p>Текст</p></body></html>'),
+}
+
+
+@pytest.mark.parametrize('fixture', load_fixtures(), ids=lambda r: r.url.rsplit('/', 1)[-1])
+def test_saved_articles_match_selector_loop(fixture):
+    result = EXTRACTOR.extract(fixture.selector.root)
+    assert result == legacy_extract(fixture)
+    assert result['title'] and result['year'] and result['director']
+
+
+def test_stub_film_pages_match_selector_loop():
+    tree = StubWikiTree(years=[1990, 1991], films_per_year=3)
+    for year in tree.years:
+        for n in range(1, 4):
+            fixture = response(render_film(tree, 'Фильм_%d_%d' % (year, n)))
+            assert EXTRACTOR.extract(fixture.selector.root) == legacy_extract(fixture)
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_edge_cases_match_selector_loop(name):
+    fixture = CASES[name]
+    assert EXTRACTOR.extract(fixture.selector.root) == legacy_extract(fixture)
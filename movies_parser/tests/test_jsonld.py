@@ -0,0 +1,176 @@
+# IMDb JSON-LD: rating() on the fixture pages, Scan over bodies split into
+# chunks, JsonLdCutoff on pages with and without the block, and partial
+# (cut-off) bodies in the response cache.
+
+import glob
+import gzip
+import json
+import os
+
+import pytest
+from scrapy import Request
+from scrapy.crawler import Crawler
+from scrapy.exceptions import IgnoreRequest, StopDownload
+from scrapy.http import HtmlResponse
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.request import RequestFingerprinter
+
+from benchmarks.crawl import LocalMoviesSpider, project_settings
+from movies_parser.httpcache import ResponseCache
+from movies_parser.jsonld import JsonLdCutoff, Scan, jsonld_block, rating
+from movies_parser.middlewares import MoviesParserDownloaderMiddleware
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'fixtures', 'imdb', '*.html')))
+URL = 'https://www.imdb.com/title/tt0282599/'
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def make_crawler(**settings):
+    crawler = Crawler(LocalMoviesSpider, project_settings(**settings))
+    crawler.stats = MemoryStatsCollector(crawler)
+    return crawler
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('path', FIXTURES)
+def test_rating_matches_full_json_decode(path):
+    block = jsonld_block(read(path))
+    assert block is not None
+    expected = json.loads(block)['aggregateRating']['ratingValue']
+    assert rating(block) == expected
+
+
+def test_rating_without_aggregate_rating():
+    assert rating(b'{"@type": "Movie", "name": "x"}') is None
+
+
+@pytest.mark.parametrize('path', FIXTURES)
+@pytest.mark.parametrize('compressed', [False, True])
+@pytest.mark.parametrize('size', [1, 7, 19, 100, 4096])
+def test_scan_finds_block_split_across_chunks(path, compressed, size):
+    body = read(path)
+    expected = jsonld_block(body)
+    end = body.find(b'</script>', body.find(b'application/ld+json')) + len(b'</script>')
+    data = gzip.compress(body) if compressed else body
+    scan = Scan(b'gzip' if compressed else None, len(data))
+    for chunk in chunks(data, size):
+        block = scan.feed(chunk)
+        if block is not None:
+            break
+    assert block == expected
+    if not compressed:
+        # Блок отдан на том куске, где закрылся </script>, не раньше и не позже
+        assert end <= scan.received < end + size
+
+
+def page_without_jsonld(size):
+    filler = b'<div class="x">' + b'y' * 1000 + b'</div>\n'
+    return b'<html><head><title>IMDb</title></head><body>' + filler * (size // len(filler)) + b'</body></html>'
+
+
+def feed(cutoff, request, data, size):
+    """Прогнать куски через bytes_received; вернуть номер куска со StopDownload или None"""
+    for i, chunk in enumerate(chunks(data, size)):
+        try:
+            cutoff.bytes_received(chunk, request, None)
+        except StopDownload as e:
+            assert not e.fail
+            return i
+    return None
+
+
+def test_page_without_jsonld_is_not_cut_off():
+    crawler = make_crawler(IMDB_CUTOFF_MAX_BYTES=64 * 1024)
+    cutoff = JsonLdCutoff.from_crawler(crawler)
+    body = page_without_jsonld(300 * 1024)
+    request = Request(URL, meta={'jsonld_cutoff': True})
+    cutoff.headers_received({}, len(body), request, None)
+    assert feed(cutoff, request, body, 8192) is None
+    assert 'jsonld' not in request.meta
+    # Поиск брошен после IMDB_CUTOFF_MAX_BYTES, а не ведётся до конца страницы
+    assert request not in cutoff.scans
+    assert 'imdb_cutoff/stopped' not in crawler.stats.get_stats()
+
+
+@pytest.mark.parametrize('encoding', [None, b'gzip'])
+def test_page_with_jsonld_is_cut_off(encoding):
+    crawler = make_crawler()
+    cutoff = JsonLdCutoff.from_crawler(crawler)
+    body = read(FIXTURES[0])
+    data = gzip.compress(body) if encoding else body
+    request = Request(URL, meta={'jsonld_cutoff': True})
+    cutoff.headers_received({b'Content-Encoding': encoding} if encoding else {}, len(data), request, None)
+    stopped = feed(cutoff, request, data, 1024)
+    if encoding:
+        # Сжатая страница меньше IMDB_CUTOFF_MIN_BYTES: её дают докачать
+        assert stopped is None
+        assert crawler.stats.get_value('imdb_cutoff/finished') == 1
+    else:
+        assert stopped is not None and stopped < 4
+        assert crawler.stats.get_value('imdb_cutoff/stopped') == 1
+        assert crawler.stats.get_value('imdb_cutoff/bytes_skipped') > 90000
+    assert request.meta['jsonld'] == jsonld_block(body)
+
+
+def test_requests_without_cutoff_meta_and_other_encodings_are_ignored():
+    cutoff = JsonLdCutoff.from_crawler(make_crawler())
+    body = read(FIXTURES[0])
+    plain = Request(URL)
+    cutoff.headers_received({}, len(body), plain, None)
+    brotli = Request(URL, meta={'jsonld_cutoff': True})
+    cutoff.headers_received({b'Content-Encoding': b'br'}, len(body), brotli, None)
+    assert feed(cutoff, plain, body, 1024) is None
+    assert feed(cutoff, brotli, body, 1024) is None
+    assert not cutoff.scans
+
+
+@pytest.fixture
+def middleware(tmp_path):
+    crawler = make_crawler()
+    cache = ResponseCache(str(tmp_path / 'cache.db'))
+    mw = MoviesParserDownloaderMiddleware(cache, stats=crawler.stats)
+    mw.fingerprinter = RequestFingerprinter()
+    yield mw
+    cache.close()
+
+
+def store(middleware, request, body, flags=()):
+    response = HtmlResponse(request.url, body=body, request=request, flags=list(flags))
+    middleware.process_response(request, response, None)
+
+
+def test_partial_entry_is_served_only_to_cutoff_requests(middleware):
+    body = read(FIXTURES[0])
+    head = body[:4096]
+    store(middleware, Request(URL, meta={'jsonld_cutoff': True}), head, flags=['download_stopped'])
+    assert middleware.stats.get_value('response_cache/store_partial') == 1
+
+    # Запросу без обрезки нужна вся страница — частичная запись для него промах
+    assert middleware.process_request(Request(URL), None) is None
+    assert middleware.stats.get_value('response_cache/miss') == 1
+
+    cached = middleware.process_request(Request(URL, meta={'jsonld_cutoff': True}), None)
+    assert cached.body == head
+    assert 'download_stopped' in cached.flags
+
+    # Полный ответ заменяет частичную запись и подходит всем
+    store(middleware, Request(URL), body)
+    for meta in ({}, {'jsonld_cutoff': True}):
+        cached = middleware.process_request(Request(URL, meta=meta), None)
+        assert cached.body == body
+        assert 'download_stopped' not in cached.flags
+
+
+def test_partial_entry_in_replay_only_mode(middleware):
+    middleware.replay_only = True
+    store(middleware, Request(URL, meta={'jsonld_cutoff': True}), b'<html><head>', flags=['download_stopped'])
+    with pytest.raises(IgnoreRequest):
+        middleware.process_request(Request(URL), None)
+    assert middleware.process_request(Request(URL, meta={'jsonld_cutoff': True}), None).body == b'<html><head>'
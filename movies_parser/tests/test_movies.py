@@ -0,0 +1,87 @@
+# MoviesSpider.parse_movie and MoviesApiSpider without the Scrapy engine: a
+# film is emitted in every IMDB_ENRICHMENT mode whether or not its infobox
+# has an IMDb link; only chain mode turns the link into an IMDb request.
+
+import json
+
+import pytest
+import scrapy
+from scrapy.crawler import Crawler
+from scrapy.http import HtmlResponse, TextResponse
+from scrapy.statscollectors import MemoryStatsCollector
+
+from benchmarks import stub_api
+from benchmarks.crawl import LocalMoviesApiSpider, LocalMoviesSpider, project_settings
+from benchmarks.stub_wiki import StubWikiTree, render_film
+from movies_parser.seen import page_key
+
+TITLE = 'Фильм_1990_1'
+IMDB_ROW = ('<tr><th><a title="Internet Movie Database">IMDb</a></th>'
+            '<td><a class="external text" href="https://www.imdb.com/title/')
+
+
+def make_spider(spider_cls, mode, **kwargs):
+    crawler = Crawler(spider_cls, project_settings(IMDB_ENRICHMENT=mode))
+    crawler.stats = MemoryStatsCollector(crawler)
+    return spider_cls.from_crawler(crawler, **kwargs)
+
+
+def film_page(imdb_row):
+    """Статья стаба: с полной строкой IMDb, со строкой без ссылки или без строки вовсе"""
+    html = render_film(StubWikiTree(years=[1990], films_per_year=1), TITLE)
+    head, row = html.split(IMDB_ROW)
+    row, tail = row.split('</tr>', 1)
+    if imdb_row == 'no link':
+        html = head + '<tr><th><a title="Internet Movie Database">IMDb</a></th><td>—</td></tr>' + tail
+    elif imdb_row == 'none':
+        html = head + tail
+    url = 'http://stub.test/wiki/' + TITLE
+    return HtmlResponse(url, body=html.encode('utf-8'), encoding='utf-8', request=scrapy.Request(url))
+
+
+@pytest.mark.parametrize('mode', ['chain', 'dataset', 'off'])
+@pytest.mark.parametrize('imdb_row', ['no link', 'none'])
+def test_film_without_imdb_link_is_emitted_in_every_mode(mode, imdb_row):
+    spider = make_spider(LocalMoviesSpider, mode)
+    results = list(spider.parse_movie(film_page(imdb_row)))
+    assert len(results) == 1
+    item, = results
+    assert not isinstance(item, scrapy.Request)
+    assert item.title == 'Фильм 1990 1'
+    assert item.imdb is None and item.imdb_id is None
+
+
+@pytest.mark.parametrize('mode', ['chain', 'dataset', 'off'])
+def test_imdb_link_is_followed_only_in_chain_mode(mode):
+    spider = make_spider(LocalMoviesSpider, mode)
+    result, = spider.parse_movie(film_page('full'))
+    if mode == 'chain':
+        assert isinstance(result, scrapy.Request)
+        assert '/title/tt' in result.url
+    else:
+        assert result.imdb_id.startswith('tt')
+
+
+@pytest.mark.parametrize('mode', ['chain', 'off'])
+def test_api_spider_emits_film_without_imdb_id(mode):
+    spider = make_spider(LocalMoviesApiSpider, mode, api_url='http://stub.test/w/api.php')
+    pageid = 1990001
+    head, tail = stub_api.film_wikitext(StubWikiTree(years=[1990], films_per_year=1), pageid).split('|imdb_id')
+    content = head + tail.split('\n', 1)[1]
+    page = {'pageid': pageid, 'title': 'Фильм 1990 1',
+            'revisions': [{'revid': 1, 'slots': {'main': {'content': content}}}]}
+    body = json.dumps({'query': {'pages': [page]}}, ensure_ascii=False).encode('utf-8')
+    request = scrapy.Request('http://stub.test/w/api.php',
+                             meta={'page_keys': {pageid: page_key('http://stub.test/wiki/' + TITLE)}, 'pageids': [pageid]})
+    spider.in_flight = 1
+    results = [result for result in spider.parse_pages(TextResponse(request.url, body=body, encoding='utf-8',
+                                                                    request=request))
+               if not isinstance(result, scrapy.Request)]
+    assert [item.title for item in results] == ['Фильм 1990 1']
+    assert results[0].imdb_id is None
+
+
+def test_start_requests_send_user_agent():
+    spider = make_spider(LocalMoviesSpider, 'off', start_url='http://stub.test/wiki/Категория:Фильмы_по_годам')
+    requests = list(spider.start_requests())
+    assert requests and all(r.headers.get('User-Agent') == b'Mozilla/5.0' for r in requests)
@@ -0,0 +1,68 @@
+# MoviesApiSpider against benchmarks.stub_api without the Scrapy engine: the
+# requests the spider yields are answered by stub_api.query() directly.
+
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import scrapy
+from scrapy.crawler import Crawler
+from scrapy.http import TextResponse
+from scrapy.statscollectors import MemoryStatsCollector
+
+from benchmarks import stub_api
+from benchmarks.crawl import LocalMoviesApiSpider, project_settings
+from benchmarks.stub_wiki import StubWikiTree
+
+API_URL = 'http://stub.test/w/api.php'
+
+
+def make_spider():
+    crawler = Crawler(LocalMoviesApiSpider, project_settings(IMDB_ENRICHMENT='off'))
+    crawler.stats = MemoryStatsCollector(crawler)
+    return LocalMoviesApiSpider.from_crawler(crawler, api_url=API_URL)
+
+
+def answer(tree, request, content_limit=None):
+    """Ответ стаба API на запрос паука"""
+    params = {name: values[0] for name, values in parse_qs(urlsplit(request.url).query).items()}
+    body = json.dumps(stub_api.query(tree, params, content_limit), ensure_ascii=False).encode('utf-8')
+    return TextResponse(request.url, body=body, encoding='utf-8', request=request)
+
+
+def crawl(tree, content_limit=None):
+    """Прогнать паука по стабу API; вернуть (названия фильмов, stats)"""
+    spider = make_spider()
+    requests = list(spider.start_requests())
+    items = []
+    while requests:
+        request = requests.pop(0)
+        for result in request.callback(answer(tree, request, content_limit)) or ():
+            if isinstance(result, scrapy.Request):
+                requests.append(result)
+            else:
+                items.append(result)
+    return sorted(item.title for item in items), spider.crawler.stats.get_stats()
+
+
+def test_all_films_without_truncation():
+    tree = StubWikiTree(years=range(1990, 1993), films_per_year=30)
+    titles, stats = crawl(tree)
+    assert len(titles) == tree.total_films
+    assert 'api/continued_batches' not in stats
+
+
+def test_truncated_batches_follow_continue():
+    tree = StubWikiTree(years=range(1990, 1993), films_per_year=30)
+    titles, stats = crawl(tree, content_limit=7)
+    assert titles == crawl(tree)[0]
+    assert stats['api/continued_batches'] > 0
+    assert 'api/missing_pages' not in stats
+
+
+def test_missing_pages_are_counted():
+    tree = StubWikiTree(years=range(1990, 1991), films_per_year=5)
+    spider = make_spider()
+    request = spider.pages_request({1990000: 1, 1990099: 2}, '1990000|1990099')
+    items = list(spider.parse_pages(answer(tree, request)))
+    assert [item.title for item in items] == ['Фильм 1990 0']
+    assert spider.crawler.stats.get_value('api/missing_pages') == 1
@@ -0,0 +1,42 @@
+# ParsePool with more than one worker process returns the same pages as
+# parsing them in this process.
+
+import asyncio
+
+from scrapy.http import HtmlResponse
+
+from benchmarks.stub_wiki import StubWikiTree, render_category, render_film
+from movies_parser import offload
+
+TREE = StubWikiTree(years=[1990, 1991], films_per_year=6, page_size=4)
+
+
+def responses():
+    result = []
+    for year in TREE.years:
+        for page in (0, 1):
+            url = 'http://stub.test/wiki/Категория:Фильмы_%d_года?page=%d' % (year, page)
+            result.append(HtmlResponse(url, body=render_category(TREE, year, page).encode('utf-8'), encoding='utf-8'))
+        for n in range(TREE.films_per_year):
+            url = 'http://stub.test/wiki/Фильм_%d_%d' % (year, n)
+            body = render_film(TREE, 'Фильм_%d_%d' % (year, n)).encode('utf-8')
+            result.append(HtmlResponse(url, body=body, encoding='utf-8'))
+    return result
+
+
+def test_pool_of_two_matches_in_process_parse():
+    pages = responses()
+    offload.init_worker(None)
+    expected = [offload.parse_page(r.body, r.url, r.encoding) for r in pages]
+
+    pool = offload.ParsePool(size=2, max_pending=4)
+
+    async def parse_all():
+        return await asyncio.gather(*(pool.parse(r) for r in pages))
+
+    try:
+        results = asyncio.run(parse_all())
+    finally:
+        pool.close()
+    assert results == expected
+    assert sum(page['movie'] is not None for page in results) == len(TREE.years) * TREE.films_per_year
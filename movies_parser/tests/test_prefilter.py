@@ -0,0 +1,125 @@
+# The prefilter must never cost a film: every page on which the selectors
+# find an infobox passes prefilter.scan(), the spider yields the same with
+# and without PREFILTER_ENABLED, and the example PREFILTER_SKIP_TITLES from
+# settings.py skips no film article.
+
+import ast
+import os
+
+import pytest
+import scrapy
+from scrapy.crawler import Crawler
+from scrapy.http import HtmlResponse
+from scrapy.statscollectors import MemoryStatsCollector
+
+from benchmarks.bench_infobox import load_fixtures
+from benchmarks.crawl import LocalMoviesSpider, project_settings
+from benchmarks.stub_wiki import StubWikiTree, render_category, render_film, render_root
+from movies_parser import prefilter, settings as project_module
+from movies_parser.prefilter import TitleFilter, url_title
+
+CATEGORY = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'fixtures', 'categories',
+                        'filmy_1979_goda.html')
+TREE = StubWikiTree(years=[1990], films_per_year=5, page_size=3)
+
+
+def response(url, body, request=None):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return HtmlResponse(url, body=body, encoding='utf-8', request=request or scrapy.Request(url))
+
+
+def film_variants():
+    """Статьи с инфобоксом в разной разметке"""
+    film = render_film(TREE, 'Фильм_1990_1')
+    return {
+        'plain': film,
+        'several classes': film.replace('class="infobox"', 'class="infobox infobox-film vevent"'),
+        'upper-case body': film.replace('<body>', '<BODY class="page">'),
+        '<body in head': film.replace('<head>', '<head><script>var s = "<body";</script>'),
+        'no body tag': film.replace('<body>', '').replace('</body>', ''),
+        'infobox word in head only': film.replace('<head>', '<head><meta name="x" content="infobox">'),
+    }
+
+
+def pages():
+    result = [(r.url, r.body) for r in load_fixtures()]
+    with open(CATEGORY, 'rb') as f:
+        result.append(('https://ru.wikipedia.org/wiki/Категория:Фильмы_1979_года', f.read()))
+    result += [('https://ru.wikipedia.org/wiki/' + name, body) for name, body in sorted(film_variants().items())]
+    result.append(('http://stub.test/wiki/Категория:Фильмы_1990_года', render_category(TREE, 1990, 0)))
+    result.append(('http://stub.test/wiki/Категория:Фильмы_1990_года?page=1', render_category(TREE, 1990, 1)))
+    result.append(('http://stub.test/wiki/Категория:Фильмы_по_годам', render_root(TREE)))
+    result.append(('http://stub.test/wiki/Пусто', '<html><body><p>Статья без инфобокса</p></body></html>'))
+    return result
+
+
+@pytest.mark.parametrize('url, body', pages())
+def test_scan_never_rejects_what_the_selectors_find(url, body):
+    page = response(url, body)
+    infobox, listing = prefilter.scan(page.body)
+    if page.css('.infobox'):
+        assert infobox
+    if page.css('.mw-category-group a') or page.css('#mw-pages a'):
+        assert listing
+
+
+def make_spider(enabled):
+    crawler = Crawler(LocalMoviesSpider, project_settings(IMDB_ENRICHMENT='off', PREFILTER_ENABLED=enabled))
+    crawler.stats = MemoryStatsCollector(crawler)
+    return LocalMoviesSpider.from_crawler(crawler)
+
+
+def results(spider, url, body):
+    # Запрос — такой же, какой паук отдал бы планировщику из очереди
+    request = spider.frontier_request(url)
+    spider.in_flight += 1
+    out = []
+    for result in spider.parse_bfs(response(url, body, request)):
+        out.append(('request', result.url) if isinstance(result, scrapy.Request) else ('item', result.to_flat()))
+    return out
+
+
+@pytest.mark.parametrize('url, body', pages())
+def test_spider_yields_the_same_with_and_without_prefilter(url, body):
+    expected = results(make_spider(False), url, body)
+    assert results(make_spider(True), url, body) == expected
+    if response(url, body).css('.infobox'):
+        assert any(kind == 'item' for kind, _ in expected)
+
+
+def example_skip_titles():
+    """Закомментированный пример PREFILTER_SKIP_TITLES из settings.py"""
+    with open(project_module.__file__, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    start = lines.index('#PREFILTER_SKIP_TITLES = [')
+    end = lines.index('#]', start)
+    return ast.literal_eval('[%s]' % '\n'.join(line[1:] for line in lines[start + 1:end]))
+
+
+def test_example_skip_titles_keep_every_film_link():
+    title_filter = TitleFilter(example_skip_titles())
+    with open(CATEGORY, 'rb') as f:
+        category = response('https://ru.wikipedia.org/wiki/Категория:Фильмы_1979_года', f.read())
+    links = [category.urljoin(href) for href in category.css('.mw-category-group a::attr(href)').getall()]
+    films = [r.url for r in load_fixtures()] + [link for link in links if '/wiki/Категория:' not in link]
+    assert films
+    assert not [url for url in films if title_filter.skip(url)]
+    # Подкатегории фильмов тоже обходятся
+    assert not [url for url in links if title_filter.skip(url)]
+
+
+@pytest.mark.parametrize('url', [
+    'https://ru.wikipedia.org/wiki/Шаблон:Фильмы_Тарковского',
+    'https://ru.wikipedia.org/wiki/Обсуждение_участника:Пример',
+    'https://ru.wikipedia.org/wiki/Список_фильмов_СССР_1979_года',
+    'https://ru.wikipedia.org/wiki/Категория:Персоналии_по_алфавиту',
+])
+def test_example_skip_titles_skip_non_film_pages(url):
+    assert TitleFilter(example_skip_titles()).skip(url)
+
+
+def test_empty_filter_skips_nothing():
+    title_filter = TitleFilter.from_settings(project_settings())
+    assert not title_filter.skip('https://ru.wikipedia.org/wiki/Шаблон:Фильм')
+    assert url_title('https://ru.wikipedia.org/wiki/Сталкер_(фильм)') == 'Сталкер (фильм)'
@@ -0,0 +1,114 @@
+# movies_parser.reextract over stub article pages saved as a directory, a
+# tar archive and a WARC file, and the error it reports when the output
+# writer fails.
+
+import csv
+import gzip
+import io
+import os
+import tarfile
+
+import pytest
+from scrapy.settings import Settings
+
+from benchmarks.stub_wiki import StubWikiTree, render_film
+from movies_parser import pipelines
+from movies_parser.reextract import reextract
+
+TREE = StubWikiTree(years=[1990, 1991], films_per_year=5)
+TITLES = ['Фильм_%d_%d' % (year, n) for year in TREE.years for n in range(1, 6)]
+FIELDS = ['title', 'year', 'imdb_id', 'page_id']
+
+
+def make_settings(output, **overrides):
+    settings = Settings()
+    settings.setmodule('movies_parser.settings', priority='project')
+    settings.update(dict(OUTPUT_PATH=output, OUTPUT_FIELDS=FIELDS, LOG_ENABLED=False, **overrides),
+                    priority='cmdline')
+    return settings
+
+
+def page(title):
+    return render_film(TREE, title).encode('utf-8')
+
+
+def read_rows(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return sorted(tuple(row[field] for field in FIELDS) for row in csv.DictReader(f))
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Одни и те же статьи в трёх видах: каталог (с .html.gz), tar.gz и WARC.gz"""
+    directory = tmp_path / 'pages'
+    directory.mkdir()
+    for i, title in enumerate(TITLES):
+        if i % 2:
+            with gzip.open(str(directory / (title + '.html.gz')), 'wb') as f:
+                f.write(page(title))
+        else:
+            (directory / (title + '.html')).write_bytes(page(title))
+    (directory / 'notes.txt').write_text('не статья')
+
+    archive = str(tmp_path / 'pages.tar.gz')
+    with tarfile.open(archive, 'w:gz') as tar:
+        for title in TITLES:
+            body = page(title)
+            info = tarfile.TarInfo('wiki/%s.html' % title)
+            info.size = len(body)
+            tar.addfile(info, io.BytesIO(body))
+
+    warc = str(tmp_path / 'crawl.warc.gz')
+    with gzip.open(warc, 'wb') as f:
+        for title in TITLES:
+            body = page(title)
+            chunked = b'%x\r\n%s\r\n0\r\n\r\n' % (len(body), body)
+            block = (b'HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=UTF-8\r\n'
+                     b'Transfer-Encoding: chunked\r\n\r\n' + chunked)
+            f.write(b'WARC/1.0\r\nWARC-Type: response\r\nWARC-Target-URI: https://ru.wikipedia.org/wiki/%s\r\n'
+                    b'Content-Length: %d\r\n\r\n%s\r\n\r\n' % (title.encode('utf-8'), len(block), block))
+        # Ответ не 200 и запрос пропускаются
+        block = b'HTTP/1.1 404 Not Found\r\n\r\n'
+        f.write(b'WARC/1.0\r\nWARC-Type: response\r\nContent-Length: %d\r\n\r\n%s\r\n\r\n' % (len(block), block))
+        f.write(b'WARC/1.0\r\nWARC-Type: request\r\nContent-Length: 0\r\n\r\n\r\n\r\n')
+    return str(directory), archive, warc
+
+
+def test_all_source_kinds_give_the_same_films(corpus, tmp_path):
+    outputs = []
+    for source in corpus:
+        output = str(tmp_path / (os.path.basename(source) + '.csv'))
+        stats = reextract([source], make_settings(output, DEDUP_ENABLED=False), workers=2)
+        assert stats['item_scraped_count'] == len(TITLES)
+        outputs.append(read_rows(output))
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert len(outputs[0]) == len(TITLES)
+    assert all(imdb.startswith('tt') and page_id for _, _, imdb, page_id in outputs[0])
+
+
+def test_duplicates_across_sources_are_dropped(corpus, tmp_path):
+    output = str(tmp_path / 'all.csv')
+    stats = reextract(list(corpus), make_settings(output, DEDUP_ENABLED=True), workers=2)
+    assert stats['pages'] == 3 * len(TITLES)
+    assert stats['item_scraped_count'] == len(TITLES)
+    assert stats['item_dropped_count'] == 2 * len(TITLES)
+    assert len(read_rows(output)) == len(TITLES)
+
+
+class FailingWriter:
+    paths = ['broken.csv']
+
+    def write_batch(self, rows):
+        raise OSError('disk full')
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize('batch_size', [1, 1000])
+def test_writer_error_is_reported(corpus, tmp_path, monkeypatch, batch_size):
+    # Ошибка в середине прогона (пакет по одной строке) и при записи последнего пакета в close
+    monkeypatch.setattr(pipelines, 'make_writer', lambda *args, **kwargs: FailingWriter())
+    settings = make_settings(str(tmp_path / 'out.csv'), OUTPUT_BATCH_SIZE=batch_size)
+    with pytest.raises(RuntimeError, match='output writer failed: disk full'):
+        reextract([corpus[0]], settings, workers=1)
@@ -0,0 +1,123 @@
+# Seen-page stores: canonical page keys, the Bloom filter file header across
+# reopen, and refusing a file built with other parameters.
+
+import os
+
+import pytest
+
+from movies_parser.seen import BloomSeenStore, SqliteSeenStore, canonical_page_id, page_key
+
+KEYS = [page_key('https://ru.wikipedia.org/wiki/Фильм_%d' % i) for i in range(2000)]
+OTHER = [page_key('https://ru.wikipedia.org/wiki/Другой_%d' % i) for i in range(2000)]
+
+
+@pytest.mark.parametrize('url', [
+    'https://ru.wikipedia.org/wiki/%D0%A1%D1%82%D0%B0%D0%BB%D0%BA%D0%B5%D1%80_(%D1%84%D0%B8%D0%BB%D1%8C%D0%BC)',
+    'https://ru.wikipedia.org/wiki/Сталкер (фильм)',
+    'https://ru.m.wikipedia.org/wiki/Сталкер_(фильм)',
+    'https://RU.wikipedia.org/wiki/сталкер_(фильм)',
+])
+def test_spellings_of_one_article_share_a_key(url):
+    assert canonical_page_id(url) == 'ru.wikipedia.org/Сталкер_(фильм)'
+    assert page_key(url) == page_key('https://ru.wikipedia.org/wiki/Сталкер_(фильм)')
+
+
+def test_category_continuations_keep_their_query():
+    first = 'https://ru.wikipedia.org/w/index.php?title=Категория:Фильмы_1979_года'
+    next_page = first + '&pagefrom=Б'
+    assert page_key(first) != page_key(next_page)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        header = f.read(BloomSeenStore.HEADER)
+    return int.from_bytes(header[:8], 'little'), int.from_bytes(header[8:15], 'little'), header[15]
+
+
+def test_bloom_header_round_trip_and_reopen(tmp_path):
+    path = str(tmp_path / 'seen.bloom')
+    store = BloomSeenStore(path, capacity=10000, error_rate=0.001)
+    for key in KEYS:
+        store.add(key)
+    count = len(store)
+    store.close()
+
+    assert read_header(path) == (count, store.num_bits, store.num_hashes)
+    assert os.path.getsize(path) == BloomSeenStore.HEADER + (store.num_bits + 7) // 8
+
+    reopened = BloomSeenStore(path, capacity=10000, error_rate=0.001)
+    assert len(reopened) == count
+    assert all(key in reopened for key in KEYS)
+    false_positives = sum(key in reopened for key in OTHER)
+    assert false_positives <= len(OTHER) * 0.01
+    # Повторное добавление не меняет счётчик
+    reopened.add(KEYS[0])
+    assert len(reopened) == count
+    reopened.close()
+    assert read_header(path)[0] == count
+
+
+def test_bloom_in_memory_matches_file(tmp_path):
+    memory = BloomSeenStore(None, capacity=10000)
+    disk = BloomSeenStore(str(tmp_path / 'seen.bloom'), capacity=10000)
+    for key in KEYS:
+        memory.add(key)
+        disk.add(key)
+    assert len(memory) == len(disk)
+    assert bytes(memory.bits[BloomSeenStore.HEADER:]) == disk.bits[BloomSeenStore.HEADER:]
+    disk.close()
+
+
+@pytest.mark.parametrize('capacity, error_rate', [(20000, 0.001), (10000, 0.01)])
+def test_bloom_file_with_other_parameters_is_refused(tmp_path, capacity, error_rate):
+    path = str(tmp_path / 'seen.bloom')
+    store = BloomSeenStore(path, capacity=10000, error_rate=0.001)
+    for key in KEYS:
+        store.add(key)
+    store.close()
+    with open(path, 'rb') as f:
+        before = f.read()
+
+    with pytest.raises(ValueError, match='SEEN_STORE_CAPACITY'):
+        BloomSeenStore(path, capacity=capacity, error_rate=error_rate)
+    with open(path, 'rb') as f:
+        assert f.read() == before
+
+
+def test_bloom_file_without_parameters_is_checked_by_size(tmp_path):
+    # Файлы старого формата: в заголовке только число ключей
+    path = str(tmp_path / 'seen.bloom')
+    store = BloomSeenStore(path, capacity=10000)
+    for key in KEYS:
+        store.add(key)
+    store.close()
+    with open(path, 'r+b') as f:
+        f.seek(8)
+        f.write(bytes(8))
+
+    reopened = BloomSeenStore(path, capacity=10000)
+    assert all(key in reopened for key in KEYS)
+    reopened.close()
+    # Параметры дописаны в заголовок при открытии
+    assert read_header(path)[1:] == (store.num_bits, store.num_hashes)
+
+    with open(path, 'r+b') as f:
+        f.seek(8)
+        f.write(bytes(8))
+    with pytest.raises(ValueError):
+        BloomSeenStore(path, capacity=50000)
+
+
+def test_sqlite_store_survives_reopen(tmp_path):
+    path = str(tmp_path / 'seen.db')
+    store = SqliteSeenStore(path, commit_every=7)
+    for key in KEYS + KEYS[:10]:
+        store.add(key)
+    assert len(store) == len(KEYS)
+    store.close()
+
+    reopened = SqliteSeenStore(path)
+    assert len(reopened) == len(KEYS)
+    assert all(key in reopened for key in KEYS)
+    assert not any(key in reopened for key in OTHER)
+    reopened.close()
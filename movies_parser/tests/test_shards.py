@@ -0,0 +1,126 @@
+# Year shards: grouping, root category pagination, the external sort of a
+# partition, the k-way merge and the launcher with fake shard processes.
+
+import csv
+import os
+
+import pytest
+
+from benchmarks.crawl import project_settings
+from movies_parser import shards
+from movies_parser.distributed import merge_runs, run_path, shard_files, shard_path, sort_partition
+
+FIELDS = ['title', 'year', 'imdb', 'page_id']
+
+
+def write_partition(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(rows)
+
+
+def read_output(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return [(row['title'], row['year'], row['imdb']) for row in csv.DictReader(f)]
+
+
+def test_group_years_newest_first():
+    categories = [(1979, 'u1979'), (1985, 'u1985'), (1989, 'u1989'), (2001, 'u2001')]
+    assert shards.group_years(categories) == [('y2000-2009', ['u2001']),
+                                              ('y1980-1989', ['u1985', 'u1989']),
+                                              ('y1970-1979', ['u1979'])]
+    assert [name for name, _ in shards.group_years(categories, by='year')] == ['y2001', 'y1989', 'y1985', 'y1979']
+
+
+def test_year_categories_follow_next_page(monkeypatch):
+    def page(years, next_href=''):
+        links = ''.join('<li><a href="/wiki/Категория:Фильмы_%d_года">%d</a></li>' % (y, y) for y in years)
+        more = '<a href="%s">Следующая страница</a>' % next_href if next_href else ''
+        return ('<div id="mw-subcategories">%s<div class="mw-category-group"><ul>%s</ul></div></div>'
+                % (more, links))
+
+    pages = {'https://wiki.test/wiki/Root': page([1990, 1991], '/wiki/Root?from=1992'),
+             'https://wiki.test/wiki/Root?from=1992': page([1992, 1991])}
+    monkeypatch.setattr(shards, 'fetch', lambda url, user_agent: pages[url])
+    assert shards.year_categories('https://wiki.test/wiki/Root') == [
+        (1990, 'https://wiki.test/wiki/Категория:Фильмы_1990_года'),
+        (1991, 'https://wiki.test/wiki/Категория:Фильмы_1991_года'),
+        (1992, 'https://wiki.test/wiki/Категория:Фильмы_1992_года')]
+
+
+def test_sort_partition_in_chunks(tmp_path):
+    partition = str(tmp_path / 'out.y1990-1999.csv')
+    write_partition(partition, [('Фильм %d' % n, 1999 - n % 10, '', n) for n in range(25)])
+    whole = str(tmp_path / 'whole.jsonl')
+    chunked = str(tmp_path / 'chunked.jsonl')
+    assert sort_partition([partition], whole) == 25
+    assert sort_partition([partition], chunked, chunk_rows=4) == 25
+    with open(whole, encoding='utf-8') as a, open(chunked, encoding='utf-8') as b:
+        assert a.read() == b.read()
+    assert sorted(os.listdir(tmp_path)) == ['chunked.jsonl', 'out.y1990-1999.csv', 'whole.jsonl']
+
+
+def test_merge_runs_orders_and_drops_duplicates(tmp_path):
+    output = str(tmp_path / 'out.csv')
+    write_partition(shard_path(output, 'y2000'), [('Б', 2000, '', 7), ('А', 2000, '7.5', 8)])
+    write_partition(shard_path(output, 'y1990'), [('В', 1999, '', 9), ('Б', 2000, '6.1', 7)])
+    names = ['y2000', 'y1990']
+    for name in names:
+        sort_partition(shard_files(output, [name]), run_path(output, name))
+    runs = [run_path(output, name) for name in names]
+    assert merge_runs(runs, output, 'csv', ['title', 'year', 'imdb']) == (3, 1)
+    # Год, затем название; рейтинг повтора дописан в первую запись
+    assert read_output(output) == [('В', '1999', ''), ('А', '2000', '7.5'), ('Б', '2000', '6.1')]
+    # Первая запись уже записана — дописывать некуда, повтор всё равно отброшен
+    assert merge_runs(runs, output, 'csv', ['title', 'year', 'imdb'], batch_size=1) == (3, 1)
+    assert read_output(output)[2] == ('Б', '2000', '')
+
+
+class FakeShard:
+    """Процесс-шард: пишет свою партицию сразу и завершается с кодом code"""
+
+    def __init__(self, command, code):
+        options = dict(value.split('=', 1) for flag, value in zip(command, command[1:]) if flag == '-s')
+        rows = [('Фильм %s' % url[-4:], url[-4:], '', int(url[-4:])) for url in options['SHARD_START_URLS'].split(',')]
+        write_partition(options['OUTPUT_PATH'], rows)
+        self.returncode = code
+
+    def poll(self):
+        return self.returncode
+
+
+@pytest.fixture
+def launch(monkeypatch, tmp_path):
+    """shards run по годам 1989-2001 без сети; failing — шарды, которые упадут"""
+    output = str(tmp_path / 'out.csv')
+    categories = [(year, 'https://wiki.test/%d' % year) for year in (1989, 1995, 2001)]
+    monkeypatch.setattr(shards, 'year_categories', lambda root, user_agent: categories)
+    monkeypatch.setattr(shards, 'get_project_settings',
+                        lambda: project_settings(OUTPUT_PATH=output, OUTPUT_FIELDS=['title', 'year', 'imdb']))
+
+    def run(failing=()):
+        def popen(command):
+            urls = command[command.index('-s') + 1]
+            return FakeShard(command, 1 if any(year in urls for year in failing) else 0)
+        monkeypatch.setattr(shards.subprocess, 'Popen', popen)
+        return shards.main(['run', '-w', '2', '--root', 'https://wiki.test/root'])
+    return output, run
+
+
+def test_run_merges_and_removes_partitions(launch):
+    output, run = launch
+    assert run() == 0
+    assert read_output(output) == [('Фильм 1989', '1989', ''), ('Фильм 1995', '1995', ''), ('Фильм 2001', '2001', '')]
+    assert os.listdir(os.path.dirname(output)) == ['out.csv']
+
+
+def test_failed_shard_keeps_partitions(launch, capsys):
+    output, run = launch
+    assert run(failing=['1995']) == 1
+    out = capsys.readouterr().out
+    assert 'shards failed: y1990-1999' in out
+    assert 'SHARD_START_URLS=https://wiki.test/1995' in out
+    assert sorted(os.listdir(os.path.dirname(output))) == [
+        'out.csv', 'out.y1980-1989.csv', 'out.y1980-1989.sorted.jsonl', 'out.y1990-1999.csv',
+        'out.y1990-1999.sorted.jsonl', 'out.y2000-2009.csv', 'out.y2000-2009.sorted.jsonl']